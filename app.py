@@ -3,16 +3,27 @@ School Bell Management System - VPS Version
 Enhanced dengan WebSocket dan CORS untuk client remote
 """
 
-from flask import Flask, render_template, request, jsonify, send_from_directory
+from flask import Flask, render_template, request, jsonify, send_from_directory, Response, stream_with_context
 from flask_cors import CORS
 from flask_socketio import SocketIO, emit
 from werkzeug.utils import secure_filename
 import os
+import sqlite3
 import database
 import audio_player
+import audio_meta
+import clock
+import conflicts
 import scheduler
-from datetime import datetime
+import latency
+import leader
+import playback
+import simulate
+import timeline
+from datetime import datetime, timedelta
 import json
+import csv
+import io
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -26,6 +37,17 @@ CORS(app, resources={r"/api/*": {"origins": "*"}})
 # Initialize SocketIO for real-time communication
 socketio = SocketIO(app, cors_allowed_origins="*")
 
+# Kembalikan koneksi database ke pool setiap request/event selesai
+app.teardown_appcontext(database.release_db_connection)
+
+# Volume player mengikuti perubahan setting tanpa polling database
+database.subscribe_setting(
+    'volume', lambda key, value: audio_player.set_volume(int(value))
+)
+database.subscribe_setting(
+    'audio_cache_mb', lambda key, value: audio_player.set_cache_size(int(value))
+)
+
 ALLOWED_EXTENSIONS = {'mp3', 'wav', 'ogg'}
 
 def allowed_file(filename):
@@ -58,9 +80,13 @@ def index():
 @app.route('/schedules')
 def schedules_page():
     """Schedule management page"""
-    schedules = database.get_all_schedules()
+    active_profile = database.get_active_profile_id()
+    profile_id = request.args.get('profile_id', active_profile, type=int)
+    schedules = database.get_all_schedules(profile_id)
     audio_files = database.get_all_audio_files()
-    return render_template('schedules.html', schedules=schedules, audio_files=audio_files)
+    return render_template('schedules.html', schedules=schedules, audio_files=audio_files,
+                           day_names=database.DAY_NAMES, profiles=database.get_profiles(),
+                           profile_id=profile_id, active_profile=active_profile)
 
 @app.route('/audio')
 def audio_page():
@@ -77,8 +103,8 @@ def announcements_page():
 @app.route('/logs')
 def logs_page():
     """Play logs page"""
-    logs = database.get_recent_logs(100)
-    return render_template('logs.html', logs=logs)
+    logs, next_cursor = database.get_logs_page(100)
+    return render_template('logs.html', logs=logs, next_cursor=next_cursor)
 
 # ==================== PUBLIC CLIENT PLAYER ====================
 
@@ -97,32 +123,22 @@ def serve_client(filename):
 @app.route('/api/client/status', methods=['GET'])
 def get_client_status():
     """API for client to get current status"""
-    is_playing = audio_player.is_playing()
+    is_playing = audio_is_playing()
     current_file = None
     
     if is_playing:
         # Get current playing file info
         pass  # Will be implemented with audio_player tracking
     
-    # Get today's schedules
-    today = datetime.now()
-    day_name = today.strftime('%A')
-    schedules = database.get_schedules_by_day(day_name)
-    
-    # Find next schedule
-    current_time = today.strftime('%H:%M')
-    next_schedule = None
+    # Cari jadwal berikutnya dari timeline yang sudah dikompilasi
+    today = clock.now()
+    day_name = database.DAY_NAMES[today.weekday()]
     holiday_mode = database.get_setting('holiday_mode') == '1'
     
-    for schedule in schedules:
-        if schedule['is_active'] and schedule['time'] > current_time:
-            next_schedule = {
-                'name': schedule['name'],
-                'time': schedule['time'],
-                'audio_file': schedule['audio_file'],
-                'in_seconds': calculate_seconds_until(schedule['time'])
-            }
-            break
+    next_schedule = None
+    upcoming = timeline.get_timeline().next_after(today)
+    if upcoming:
+        next_schedule = format_upcoming_bell(*upcoming, now=today)
     
     return jsonify({
         'success': True,
@@ -139,27 +155,40 @@ def get_client_status():
 @app.route('/api/client/schedules/today', methods=['GET'])
 def get_today_schedules():
     """API to get all schedules for today"""
-    today = datetime.now()
-    day_name = today.strftime('%A')
-    schedules = database.get_schedules_by_day(day_name)
-    
-    # Filter only active schedules
-    active_schedules = [s for s in schedules if s['is_active']]
-    
-    # Add status (past, current, upcoming)
-    current_time = today.strftime('%H:%M')
-    for schedule in active_schedules:
-        if schedule['time'] < current_time:
-            schedule['status'] = 'past'
-        else:
-            schedule['status'] = 'upcoming'
-            schedule['countdown'] = calculate_seconds_until(schedule['time'])
+    today = clock.now()
+    day_index = today.weekday()
+    compiled = timeline.get_timeline()
+    second = timeline.second_of_day(today)
+    
+    # Bel hari ini (tanpa libur, termasuk bel tambahan) dengan status dan countdown
+    schedules = []
+    for schedule in compiled.schedules_on(today.date()):
+        if schedule['second'] < second:
+            schedules.append(dict(schedule, status='past'))
+            continue
+        item = dict(schedule, status='upcoming')
+        item['countdown'] = timeline.seconds_until(schedule['second'], today)
+        schedules.append(item)
     
     return jsonify({
         'success': True,
-        'day': day_name,
+        'day': database.DAY_NAMES[day_index],
         'date': today.strftime('%Y-%m-%d'),
-        'schedules': [dict(s) for s in active_schedules]
+        'is_holiday': compiled.is_holiday(today.date()),
+        'schedules': schedules
+    })
+
+@app.route('/api/client/schedules/next', methods=['GET'])
+def get_next_schedules():
+    """API to get the next N bells across days (count=1..50)"""
+    now = clock.now()
+    count = max(1, min(50, request.args.get('count', 5, type=int)))
+    upcoming = timeline.get_timeline().upcoming(now, count)
+    
+    return jsonify({
+        'success': True,
+        'server_time': now.isoformat(),
+        'schedules': [format_upcoming_bell(at, schedule, now) for at, schedule in upcoming]
     })
 
 @app.route('/api/client/audio/<filename>', methods=['GET'])
@@ -198,12 +227,39 @@ def handle_status_request():
     status = get_client_status().get_json()
     emit('status_update', status)
 
+def play_on_leader(filepaths, priority='announcement', label=None):
+    """
+    Masukkan audio ke antrian playback di proses leader (langsung jika
+    proses ini leader)
+    Returns:
+        str: state request ('queued', 'playing', 'dropped', ...) atau
+             'submitted' jika diteruskan ke leader
+    """
+    if leader.is_follower():
+        leader.submit('play', audio_paths=filepaths, priority=priority, label=label)
+        return 'submitted'
+    return playback.play(filepaths, priority, label).state
+
+def invalidate_on_leader(filepath):
+    """Buang file dari cache audio di proses leader"""
+    if leader.is_follower():
+        leader.submit('invalidate_audio', audio_path=filepath)
+        return
+    audio_player.invalidate_audio(filepath)
+
+def audio_is_playing():
+    """Status audio; follower membaca state yang dipublikasikan leader"""
+    if leader.is_follower():
+        state = leader.get_leader_state() or {}
+        return bool(state.get('is_playing'))
+    return audio_player.is_playing()
+
 def broadcast_bell_event(schedule_name, audio_file):
     """Broadcast bell event to all connected clients"""
     socketio.emit('bell_triggered', {
         'schedule_name': schedule_name,
         'audio_file': audio_file,
-        'time': datetime.now().isoformat()
+        'time': clock.now().isoformat()
     })
     print(f"📡 Broadcasted bell event: {schedule_name}")
 
@@ -216,50 +272,172 @@ def broadcast_status_update():
 
 @app.route('/api/schedules', methods=['GET'])
 def get_schedules():
-    """Get all schedules"""
-    schedules = database.get_all_schedules()
+    """Get all schedules (optionally only one profile via ?profile_id=)"""
+    schedules = database.get_all_schedules(request.args.get('profile_id', type=int))
     return jsonify([dict(s) for s in schedules])
 
 @app.route('/api/schedules', methods=['POST'])
 def add_schedule():
-    """Add new schedule"""
-    data = request.json
+    """
+    Add new schedule (days: list of day indexes 0=Senin, or day names)
+    Overlapping bells are returned as 'conflicts'; with conflict_policy=reject
+    the schedule is not saved (409) unless the request sets force=true
+    """
+    data = request.json or {}
+    schedule, errors = database.validate_schedule(data)
+    if errors:
+        return jsonify({'success': False, 'error': '; '.join(errors)}), 400
+    
+    overlaps = conflicts.check_schedule(schedule)
+    if overlaps and conflicts.get_policy() == 'reject' and not data.get('force'):
+        return conflict_response(overlaps)
     
     schedule_id = database.add_schedule(
-        name=data['name'],
-        day_of_week=data['day_of_week'],
-        time=data['time'],
-        audio_file=data['audio_file']
+        name=schedule['name'],
+        days=schedule['days'],
+        time=schedule['time'],
+        audio_file=schedule['audio_file'],
+        profile_id=schedule['profile_id']
+    )
+    
+    scheduler.sync_schedule(schedule_id)
+    conflicts.sync_schedule(schedule_id)
+    broadcast_status_update()
+    
+    return jsonify({'success': True, 'id': schedule_id, 'conflicts': overlaps})
+
+def conflict_response(overlaps):
+    """409 response listing the schedules a new/edited schedule would cut off"""
+    names = ', '.join(f"{c['name']} ({c['time']})" for c in overlaps)
+    return jsonify({
+        'success': False,
+        'error': f'Jadwal bentrok dengan: {names}',
+        'conflicts': overlaps
+    }), 409
+
+@app.route('/api/schedules/conflicts', methods=['GET'])
+def get_schedule_conflicts():
+    """Overlapping bells (time + audio duration) across the timetable (optional profile_id=)"""
+    profile_id = request.args.get('profile_id', type=int)
+    overlaps = conflicts.find_all_conflicts(profile_id)
+    return jsonify({'success': True, 'total': len(overlaps), 'conflicts': overlaps})
+
+@app.route('/api/schedules/export', methods=['GET'])
+def export_schedules():
+    """Export one profile's schedules as JSON or CSV (format=json|csv, profile_id=)"""
+    export_format = request.args.get('format', 'json')
+    profile_id = request.args.get('profile_id', database.get_active_profile_id(), type=int)
+    schedules = []
+    for s in database.get_all_schedules(profile_id):
+        row = {field: s[field] for field in database.SCHEDULE_FIELDS}
+        row['days'] = ','.join(database.DAY_NAMES[day] for day in s['days'])
+        schedules.append(row)
+    
+    if export_format == 'json':
+        return jsonify({'success': True, 'schedules': schedules})
+    if export_format != 'csv':
+        return jsonify({'success': False, 'error': 'Invalid format'}), 400
+    
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=database.SCHEDULE_FIELDS)
+    writer.writeheader()
+    writer.writerows(schedules)
+    return Response(
+        buffer.getvalue(),
+        mimetype='text/csv',
+        headers={'Content-Disposition': 'attachment; filename=schedules.csv'}
     )
+
+@app.route('/api/schedules/import', methods=['POST'])
+def import_schedules():
+    """
+    Import many schedules in one transaction
+    Accepts JSON {"schedules": [...], "mode": "append"|"replace", "profile_id": n},
+    a CSV upload in field 'file', or a raw text/csv body (mode via ?mode=)
+    Rows without profile_id go to profile_id (default: active profile);
+    replace only clears the profiles being imported
+    All rows are validated first; nothing is written if any row is invalid
+    """
+    mode = request.args.get('mode') or request.form.get('mode') or 'append'
+    profile_id = request.args.get('profile_id') or request.form.get('profile_id')
+    
+    if 'file' in request.files:
+        text = request.files['file'].read().decode('utf-8-sig')
+        rows = list(csv.DictReader(io.StringIO(text)))
+    elif request.mimetype == 'text/csv':
+        rows = list(csv.DictReader(io.StringIO(request.get_data(as_text=True))))
+    else:
+        data = request.get_json(silent=True)
+        if isinstance(data, dict):
+            mode = data.get('mode', mode)
+            profile_id = data.get('profile_id', profile_id)
+            rows = data.get('schedules')
+        else:
+            rows = data
+    
+    if not isinstance(rows, list) or not rows:
+        return jsonify({'success': False, 'error': 'No schedules provided'}), 400
+    if mode not in ('append', 'replace'):
+        return jsonify({'success': False, 'error': 'Invalid mode'}), 400
+    
+    schedules = []
+    errors = []
+    for index, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            errors.append({'row': index, 'errors': ['Baris harus berupa object']})
+            continue
+        if profile_id and not row.get('profile_id'):
+            row = dict(row, profile_id=profile_id)
+        schedule, row_errors = database.validate_schedule(row)
+        if row_errors:
+            errors.append({'row': index, 'errors': row_errors})
+        schedules.append(schedule)
+    
+    if errors:
+        return jsonify({'success': False, 'error': 'Validation failed', 'rows': errors}), 400
+    
+    count = database.bulk_import_schedules(schedules, replace=(mode == 'replace'))
     
     scheduler.reload_schedules()
     broadcast_status_update()
     
-    return jsonify({'success': True, 'id': schedule_id})
+    return jsonify({'success': True, 'imported': count, 'mode': mode})
 
 @app.route('/api/schedules/<int:schedule_id>', methods=['PUT'])
 def update_schedule(schedule_id):
-    """Update schedule"""
-    data = request.json
+    """Update schedule (conflicts handled as in add_schedule)"""
+    current = database.get_schedule(schedule_id)
+    if current is None:
+        return jsonify({'success': False, 'error': 'Schedule not found'}), 404
+    data = request.json or {}
+    schedule, errors = database.validate_schedule(dict(data, profile_id=current['profile_id']))
+    if errors:
+        return jsonify({'success': False, 'error': '; '.join(errors)}), 400
+    
+    overlaps = conflicts.check_schedule(schedule, exclude_id=schedule_id)
+    if overlaps and conflicts.get_policy() == 'reject' and not data.get('force'):
+        return conflict_response(overlaps)
     
     database.update_schedule(
         schedule_id=schedule_id,
-        name=data['name'],
-        day_of_week=data['day_of_week'],
-        time=data['time'],
-        audio_file=data['audio_file']
+        name=schedule['name'],
+        days=schedule['days'],
+        time=schedule['time'],
+        audio_file=schedule['audio_file']
     )
     
-    scheduler.reload_schedules()
+    scheduler.sync_schedule(schedule_id)
+    conflicts.sync_schedule(schedule_id)
     broadcast_status_update()
     
-    return jsonify({'success': True})
+    return jsonify({'success': True, 'conflicts': overlaps})
 
 @app.route('/api/schedules/<int:schedule_id>', methods=['DELETE'])
 def delete_schedule(schedule_id):
     """Delete schedule"""
     database.delete_schedule(schedule_id)
-    scheduler.reload_schedules()
+    scheduler.sync_schedule(schedule_id)
+    conflicts.sync_schedule(schedule_id)
     broadcast_status_update()
     
     return jsonify({'success': True})
@@ -268,7 +446,8 @@ def delete_schedule(schedule_id):
 def toggle_schedule(schedule_id):
     """Toggle schedule active status"""
     database.toggle_schedule(schedule_id)
-    scheduler.reload_schedules()
+    scheduler.sync_schedule(schedule_id)
+    conflicts.sync_schedule(schedule_id)
     broadcast_status_update()
     
     return jsonify({'success': True})
@@ -304,21 +483,19 @@ def upload_audio():
     filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
     file.save(filepath)
     
-    # Get audio duration
-    try:
-        duration = audio_player.get_duration(filepath)
-    except:
-        duration = 0
+    # Probe metadata sekali (header saja); listing dan cek konflik membaca database
+    metadata = audio_meta.probe(filepath)
     
     # Save to database
     audio_id = database.add_audio_file(
         filename=filename,
         display_name=display_name or original_name,
         file_path=filepath,
-        duration=duration
+        metadata=metadata
     )
     
-    return jsonify({'success': True, 'id': audio_id, 'filename': filename})
+    return jsonify({'success': True, 'id': audio_id, 'filename': filename,
+                    'duration': metadata['duration']})
 
 @app.route('/api/audio/<int:audio_id>', methods=['DELETE'])
 def delete_audio(audio_id):
@@ -334,6 +511,7 @@ def delete_audio(audio_id):
         
         # Delete from database
         database.delete_audio_file(audio_id)
+        invalidate_on_leader(audio['file_path'])
         
         return jsonify({'success': True})
     
@@ -341,62 +519,78 @@ def delete_audio(audio_id):
 
 @app.route('/api/play', methods=['POST'])
 def play_audio():
-    """Play audio manually"""
+    """
+    Play audio manually through the priority playback queue
+    Body: audio_file or audio_files (list, played back to back, e.g.
+    chime/message/chime) and optional priority (default announcement)
+    """
     data = request.json
-    audio_file = data.get('audio_file')
+    audio_files = data.get('audio_files') or ([data['audio_file']] if data.get('audio_file') else [])
+    priority = data.get('priority', 'announcement')
     
-    if not audio_file:
+    if not audio_files:
         return jsonify({'success': False, 'error': 'No audio file specified'}), 400
     
-    filepath = os.path.join(app.config['UPLOAD_FOLDER'], audio_file)
+    if priority not in playback.PRIORITIES:
+        return jsonify({'success': False, 'error': 'Invalid priority'}), 400
     
-    if not os.path.exists(filepath):
+    filepaths = [os.path.join(app.config['UPLOAD_FOLDER'], audio_file) for audio_file in audio_files]
+    
+    if not all(os.path.exists(filepath) for filepath in filepaths):
         return jsonify({'success': False, 'error': 'Audio file not found'}), 404
     
-    audio_player.play_audio(filepath)
-    database.add_play_log(None, audio_file, 'manual_play')
+    state = play_on_leader(filepaths, priority, data.get('label') or 'Manual Play')
+    if state == 'dropped':
+        return jsonify({'success': False, 'state': state,
+                        'error': 'Audio lain sedang diputar (policy drop)'}), 409
+    
+    for audio_file in audio_files:
+        database.add_play_log(None, audio_file, 'manual_play')
     
     # Broadcast to all clients
-    broadcast_bell_event('Manual Play', audio_file)
+    broadcast_bell_event('Manual Play', audio_files[0])
     broadcast_status_update()
     
-    return jsonify({'success': True})
+    return jsonify({'success': True, 'state': state})
 
 @app.route('/api/stop', methods=['POST'])
 def stop_audio():
-    """Stop audio playback"""
-    audio_player.stop()
+    """Stop audio playback and clear the playback queue"""
+    if leader.is_follower():
+        leader.submit('stop')
+    else:
+        playback.stop()
     return jsonify({'success': True})
 
 @app.route('/api/status', methods=['GET'])
 def get_status():
     """Get system status"""
-    is_playing = audio_player.is_playing()
-    holiday_mode = database.get_setting('holiday_mode') == '1'
-    volume = int(database.get_setting('volume') or 80)
+    is_playing = audio_is_playing()
+    settings = database.get_all_settings()
+    holiday_mode = settings.get('holiday_mode') == '1'
+    volume = int(settings.get('volume') or 80)
     
     # Get next schedule
-    now = datetime.now()
-    day_name = now.strftime('%A')
-    current_time = now.strftime('%H:%M')
+    now = clock.now()
+    day_name = database.DAY_NAMES[now.weekday()]
     
-    schedules = database.get_schedules_by_day(day_name)
     next_schedule = None
+    upcoming = timeline.get_timeline().next_after(now)
+    if upcoming:
+        next_schedule = format_upcoming_bell(*upcoming, now=now)
     
-    for schedule in schedules:
-        if schedule['is_active'] and schedule['time'] > current_time:
-            next_schedule = {
-                'name': schedule['name'],
-                'time': schedule['time'],
-                'audio_file': schedule['audio_file']
-            }
-            break
+    if leader.is_follower():
+        prewarm = (leader.get_leader_state() or {}).get('prewarm')
+    else:
+        bell_scheduler = scheduler.get_scheduler()
+        prewarm = bell_scheduler.prewarm if bell_scheduler else None
     
     return jsonify({
         'is_playing': is_playing,
         'holiday_mode': holiday_mode,
         'volume': volume,
         'next_schedule': next_schedule,
+        'prewarm': prewarm,
         'current_time': now.strftime('%H:%M:%S'),
         'current_day': day_name
     })
@@ -404,10 +598,13 @@ def get_status():
 @app.route('/api/settings', methods=['GET'])
 def get_settings():
     """Get settings"""
+    settings = database.get_all_settings()
     return jsonify({
-        'volume': int(database.get_setting('volume') or 80),
-        'holiday_mode': database.get_setting('holiday_mode') == '1',
-        'auto_start': database.get_setting('auto_start') == '1'
+        'volume': int(settings.get('volume') or 80),
+        'holiday_mode': settings.get('holiday_mode') == '1',
+        'auto_start': settings.get('auto_start') == '1',
+        'conflict_policy': conflicts.get_policy(),
+        'playback_policies': {p: playback.get_policy(p) for p in playback.PRIORITIES}
     })
 
 @app.route('/api/settings', methods=['POST'])
@@ -415,10 +612,17 @@ def update_settings():
     """Update settings"""
     data = request.json
     
+    if data.get('conflict_policy', 'warn') not in conflicts.CONFLICT_POLICIES:
+        return jsonify({'success': False, 'error': 'Invalid conflict_policy'}), 400
+    
+    playback_policies = data.get('playback_policies') or {}
+    for priority, policy in playback_policies.items():
+        if priority not in playback.PRIORITIES or policy not in playback.PLAYBACK_POLICIES:
+            return jsonify({'success': False, 'error': f'Invalid playback policy for {priority}'}), 400
+    
     if 'volume' in data:
         volume = max(0, min(100, int(data['volume'])))
         database.update_setting('volume', str(volume))
-        audio_player.set_volume(volume)
     
     if 'holiday_mode' in data:
         database.update_setting('holiday_mode', '1' if data['holiday_mode'] else '0')
@@ -426,47 +630,376 @@ def update_settings():
     if 'auto_start' in data:
         database.update_setting('auto_start', '1' if data['auto_start'] else '0')
     
+    if 'conflict_policy' in data:
+        database.update_setting('conflict_policy', data['conflict_policy'])
+    
+    for priority, policy in playback_policies.items():
+        database.update_setting(f'playback_policy_{priority}', policy)
+    
+    broadcast_status_update()
+    return jsonify({'success': True})
+
+def parse_log_filters(args):
+    """
+    Ambil filter log dari query string
+    Raises:
+        ValueError: jika format tanggal tidak valid
+    """
+    filters = {
+        'status': args.get('status') or None,
+        'schedule_id': args.get('schedule_id', type=int),
+        'date_from': args.get('date_from') or None,
+        'date_to': args.get('date_to') or None
+    }
+    for key in ('date_from', 'date_to'):
+        if filters[key]:
+            datetime.strptime(filters[key], '%Y-%m-%d')
+    return filters
+
+@app.route('/api/profiles', methods=['GET'])
+def get_profiles():
+    """Get schedule profiles with schedule counts and which one is in effect"""
+    compiled = timeline.get_timeline()
+    today = clock.now().date()
+    return jsonify({
+        'default_profile': database.get_active_profile_id(),
+        'today_profile': compiled.profile_for(today),
+        'profiles': database.get_profiles()
+    })
+
+@app.route('/api/profiles', methods=['POST'])
+def add_profile():
+    """Add profile (optionally copy_from another profile's schedules)"""
+    data = request.json or {}
+    name = str(data.get('name') or '').strip()
+    if not name:
+        return jsonify({'success': False, 'error': 'name wajib diisi'}), 400
+    copy_from = data.get('copy_from')
+    if copy_from and database.get_profile(copy_from) is None:
+        return jsonify({'success': False, 'error': 'Profil sumber tidak ditemukan'}), 404
+    
+    try:
+        profile_id = database.add_profile(name, data.get('description', ''), copy_from)
+    except sqlite3.IntegrityError:
+        return jsonify({'success': False, 'error': f"Profil '{name}' sudah ada"}), 400
+    
+    return jsonify({'success': True, 'id': profile_id})
+
+@app.route('/api/profiles/<int:profile_id>', methods=['PUT'])
+def update_profile(profile_id):
+    """Rename profile"""
+    data = request.json or {}
+    name = str(data.get('name') or '').strip()
+    if not name:
+        return jsonify({'success': False, 'error': 'name wajib diisi'}), 400
+    if database.get_profile(profile_id) is None:
+        return jsonify({'success': False, 'error': 'Profil tidak ditemukan'}), 404
+    
+    try:
+        database.update_profile(profile_id, name, data.get('description', ''))
+    except sqlite3.IntegrityError:
+        return jsonify({'success': False, 'error': f"Profil '{name}' sudah ada"}), 400
+    
+    return jsonify({'success': True})
+
+@app.route('/api/profiles/<int:profile_id>', methods=['DELETE'])
+def delete_profile(profile_id):
+    """Delete profile with its schedules and calendar entries"""
+    if database.get_profile(profile_id) is None:
+        return jsonify({'success': False, 'error': 'Profil tidak ditemukan'}), 404
+    try:
+        database.delete_profile(profile_id)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    scheduler.sync_calendar()
+    broadcast_status_update()
+    
+    return jsonify({'success': True})
+
+@app.route('/api/profiles/<int:profile_id>/activate', methods=['POST'])
+def activate_profile(profile_id):
+    """Make profile the default; takes effect now unless a date rule applies today"""
+    if database.get_profile(profile_id) is None:
+        return jsonify({'success': False, 'error': 'Profil tidak ditemukan'}), 404
+    
+    scheduler.activate_profile(profile_id)
+    broadcast_status_update()
+    
+    return jsonify({
+        'success': True,
+        'today_profile': timeline.get_timeline().profile_for(clock.now().date())
+    })
+
+@app.route('/api/exceptions', methods=['GET'])
+def get_exceptions():
+    """Get schedule exceptions (optionally from=YYYY-MM-DD)"""
+    exceptions = database.get_schedule_exceptions(request.args.get('from'))
+    return jsonify([dict(e) for e in exceptions])
+
+@app.route('/api/exceptions', methods=['POST'])
+def add_exception():
+    """
+    Add a calendar entry:
+    - kind=skip (default): holiday for all schedules, or one schedule via
+      schedule_id, from date to end_date (inclusive)
+    - kind=extra: one-off extra bell (time, audio_file, name) on each date
+    """
+    exception, errors = database.validate_exception(request.json or {})
+    if errors:
+        return jsonify({'success': False, 'error': '; '.join(errors)}), 400
+    
+    exception_id = database.add_schedule_exception(**exception)
+    scheduler.sync_calendar()
+    broadcast_status_update()
+    
+    return jsonify({'success': True, 'id': exception_id})
+
+@app.route('/api/exceptions/import', methods=['POST'])
+def import_exceptions():
+    """
+    Import a whole term calendar in one transaction
+    Accepts JSON {"exceptions": [...], "mode": "append"|"replace"},
+    a CSV upload in field 'file', or a raw text/csv body (mode via ?mode=)
+    """
+    mode = request.args.get('mode') or request.form.get('mode') or 'append'
+    
+    if 'file' in request.files:
+        text = request.files['file'].read().decode('utf-8-sig')
+        rows = list(csv.DictReader(io.StringIO(text)))
+    elif request.mimetype == 'text/csv':
+        rows = list(csv.DictReader(io.StringIO(request.get_data(as_text=True))))
+    else:
+        data = request.get_json(silent=True)
+        if isinstance(data, dict):
+            mode = data.get('mode', mode)
+            rows = data.get('exceptions')
+        else:
+            rows = data
+    
+    if not isinstance(rows, list) or not rows:
+        return jsonify({'success': False, 'error': 'No exceptions provided'}), 400
+    if mode not in ('append', 'replace'):
+        return jsonify({'success': False, 'error': 'Invalid mode'}), 400
+    
+    exceptions = []
+    errors = []
+    for index, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            errors.append({'row': index, 'errors': ['Baris harus berupa object']})
+            continue
+        exception, row_errors = database.validate_exception(row)
+        if row_errors:
+            errors.append({'row': index, 'errors': row_errors})
+        exceptions.append(exception)
+    
+    if errors:
+        return jsonify({'success': False, 'error': 'Validation failed', 'rows': errors}), 400
+    
+    count = database.bulk_add_schedule_exceptions(exceptions, replace=(mode == 'replace'))
+    
+    scheduler.sync_calendar()
+    broadcast_status_update()
+    
+    return jsonify({'success': True, 'imported': count, 'mode': mode})
+
+@app.route('/api/exceptions/<int:exception_id>', methods=['DELETE'])
+def delete_exception(exception_id):
+    """Delete calendar entry"""
+    database.delete_schedule_exception(exception_id)
+    scheduler.sync_calendar()
     broadcast_status_update()
+    
     return jsonify({'success': True})
 
+@app.route('/api/simulate', methods=['GET'])
+def simulate_schedules():
+    """
+    Dry-run the timetable over a date range (no scheduler jobs touched)
+    Query: from, to (YYYY-MM-DD, default: next 7 days), profile_id
+    (force one profile), max_gap (minutes), events=1 (include every bell)
+    """
+    today = clock.now().date()
+    try:
+        date_from = simulate.parse_date(request.args.get('from') or today.isoformat())
+        date_to = simulate.parse_date(
+            request.args.get('to') or (date_from + timedelta(days=6)).isoformat()
+        )
+        result = simulate.simulate(
+            date_from, date_to,
+            profile_id=request.args.get('profile_id', type=int),
+            max_gap_minutes=request.args.get('max_gap', simulate.DEFAULT_MAX_GAP_MINUTES, type=int),
+            include_events=request.args.get('events') in ('1', 'true')
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    return jsonify(result)
+
 @app.route('/api/logs', methods=['GET'])
 def get_logs():
-    """Get play logs"""
-    limit = request.args.get('limit', 50, type=int)
-    logs = database.get_recent_logs(limit)
-    return jsonify([dict(log) for log in logs])
+    """
+    Get play logs (newest first)
+    Query: limit, cursor, status, schedule_id, date_from, date_to
+    Cursor halaman berikutnya dikirim lewat header X-Next-Cursor
+    """
+    limit = max(1, min(500, request.args.get('limit', 50, type=int)))
+    try:
+        filters = parse_log_filters(request.args)
+        logs, next_cursor = database.get_logs_page(
+            limit, cursor=request.args.get('cursor'), **filters
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    response = jsonify([dict(log) for log in logs])
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
+@app.route('/api/logs/export', methods=['GET'])
+def export_logs():
+    """Stream play logs as CSV or NDJSON (format=csv|ndjson)"""
+    export_format = request.args.get('format', 'csv')
+    if export_format not in ('csv', 'ndjson'):
+        return jsonify({'success': False, 'error': 'Invalid format'}), 400
+    try:
+        filters = parse_log_filters(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    columns = ['id', 'played_at', 'schedule_id', 'schedule_name',
+               'audio_file', 'status', 'notes',
+               'scheduled_at', 'callback_at', 'audio_start_at', 'latency_ms', 'backend']
+    
+    def generate():
+        if export_format == 'ndjson':
+            for log in database.iter_logs(**filters):
+                yield json.dumps({col: log[col] for col in columns}) + '\n'
+            return
+        
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        for log in database.iter_logs(**filters):
+            writer.writerow([log[col] for col in columns])
+            if buffer.tell() > 8192:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+    
+    mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    filename = f"play_logs_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{export_format}"
+    return Response(
+        stream_with_context(generate()),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
 
-# ==================== HELPER FUNCTIONS ====================
+@app.route('/api/metrics/latency', methods=['GET'])
+def get_latency_metrics():
+    """
+    Get rolling bell latency percentiles (ms) per audio backend, plus the
+    heap dispatcher's fire offsets and detected clock steps (heap engine only),
+    from the leader process
+    """
+    if leader.is_follower():
+        state = leader.get_leader_state() or {}
+        return jsonify({
+            'backend': state.get('backend'),
+            'backends': state.get('latency') or {},
+            'dispatcher': state.get('dispatcher')
+        })
+    bell_scheduler = scheduler.get_scheduler()
+    dispatcher = bell_scheduler.dispatcher if bell_scheduler else None
+    return jsonify({
+        'backend': audio_player.audio_player.backend,
+        'backends': latency.get_stats(),
+        'dispatcher': dispatcher.get_stats() if dispatcher else None
+    })
 
-def calculate_seconds_until(time_str):
-    """Calculate seconds until specified time (HH:MM format)"""
-    now = datetime.now()
-    target_time = datetime.strptime(f"{now.date()} {time_str}", "%Y-%m-%d %H:%M")
-    
-    if target_time < now:
-        return 0
+@app.route('/api/metrics/audio-cache', methods=['GET'])
+def get_audio_cache_metrics():
+    """Decoded audio cache hit/miss counters and memory use (from the leader process)"""
+    if leader.is_follower():
+        state = leader.get_leader_state() or {}
+        return jsonify({'success': True, 'cache': state.get('audio_cache')})
+    return jsonify({'success': True, 'cache': audio_player.get_cache_stats()})
+
+@app.route('/api/metrics/playback', methods=['GET'])
+def get_playback_metrics():
+    """Playback queue depth, per-priority counters and wait-time percentiles (from the leader)"""
+    if leader.is_follower():
+        state = leader.get_leader_state() or {}
+        return jsonify({'success': True, 'playback': state.get('playback')})
+    return jsonify({'success': True, 'playback': playback.get_stats()})
+
+@app.route('/api/logs/daily', methods=['GET'])
+def get_daily_log_stats():
+    """Get per-day play counts from the rollup table (default: last 30 days)"""
+    days = max(1, min(366, request.args.get('days', 30, type=int)))
+    date_to = datetime.now().date()
+    date_from = date_to - timedelta(days=days - 1)
+    stats = database.get_daily_stats(date_from.isoformat(), date_to.isoformat())
+    
+    totals = {}
+    for row in stats:
+        totals[row['status']] = totals.get(row['status'], 0) + row['count']
     
-    delta = target_time - now
-    return int(delta.total_seconds())
+    return jsonify({
+        'success': True,
+        'date_from': date_from.isoformat(),
+        'date_to': date_to.isoformat(),
+        'totals': totals,
+        'days': stats
+    })
+
+@app.route('/api/logs/writer', methods=['GET'])
+def get_log_writer_stats():
+    """Get background log writer queue metrics"""
+    return jsonify({
+        'success': True,
+        'stats': database.play_log_writer.get_stats()
+    })
+
+# ==================== HELPER FUNCTIONS ====================
+
+def format_upcoming_bell(at, schedule, now):
+    """Format one upcoming bell occurrence for API responses"""
+    return {
+        'id': schedule['id'],
+        'name': schedule['name'],
+        'time': schedule['time'],
+        'audio_file': schedule['audio_file'],
+        'date': at.strftime('%Y-%m-%d'),
+        'day': database.DAY_NAMES[at.weekday()],
+        'at': at.isoformat(),
+        'in_seconds': max(0, int((at - now).total_seconds()))
+    }
 
 # ==================== MAIN ====================
 
+def start_services():
+    """
+    Initialize database, log writer and leader election
+    Scheduler dan audio hanya berjalan di proses yang menjadi leader,
+    jadi aman dijalankan oleh setiap worker gunicorn (lihat wsgi.py)
+    """
+    print("\n📁 Initializing database...")
+    database.init_db()
+    database.start_log_writer()
+    audio_meta.refresh_library()
+    
+    print("\n⏰ Starting scheduler (leader election)...")
+    scheduler.start_leader_election()
+
 if __name__ == '__main__':
     print("\n" + "="*60)
     print("🔔 SCHOOL BELL MANAGEMENT SYSTEM - VPS VERSION")
     print("="*60)
     
-    # Initialize database
-    print("\n📁 Initializing database...")
-    database.init_db()
-    
-    # Initialize scheduler
-    print("\n⏰ Starting scheduler...")
-    scheduler.init_scheduler()
-    
-    # Set volume from settings
-    volume = int(database.get_setting('volume') or 80)
-    audio_player.set_volume(volume)
+    start_services()
     
     print("\n" + "="*60)
     print("✅ Server ready!")
@@ -0,0 +1,114 @@
+"""
+Audio Cache Module untuk School Bell System
+LRU cache audio yang sudah di-decode (pygame.mixer.Sound / AudioSegment),
+dibatasi total byte PCM dan di-key dengan path + mtime, supaya bel yang
+sama sepanjang hari tidak dibaca dan di-decode ulang dari disk
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAX_MB = 128
+
+
+class AudioCache:
+    """
+    OrderedDict path absolut -> (mtime, audio, size); entri paling lama tidak
+    dipakai dibuang sampai total size <= max_bytes. File yang berubah
+    (mtime beda) atau hilang dianggap miss dan entrinya dibuang
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, path):
+        """Audio ter-decode untuk path, atau None (miss)"""
+        path = os.path.abspath(path)
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            mtime = None
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == mtime:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                self._remove(path)
+            self.misses += 1
+            return None
+
+    def contains(self, path):
+        """Cek isi cache tanpa mengubah urutan LRU atau counter"""
+        with self._lock:
+            return os.path.abspath(path) in self._entries
+
+    def put(self, path, mtime, audio, size):
+        """
+        Simpan audio ter-decode; audio yang lebih besar dari seluruh
+        kapasitas cache tidak disimpan
+        Returns:
+            bool: True jika disimpan
+        """
+        path = os.path.abspath(path)
+        with self._lock:
+            if path in self._entries:
+                self._remove(path)
+            if size > self.max_bytes:
+                return False
+            self._entries[path] = (mtime, audio, size)
+            self._bytes += size
+            self._evict()
+            return True
+
+    def invalidate(self, path):
+        """Buang satu file dari cache (mis. file audio dihapus)"""
+        with self._lock:
+            return self._remove(os.path.abspath(path))
+
+    def resize(self, max_bytes):
+        """Ubah kapasitas cache; entri berlebih langsung dibuang"""
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def get_stats(self):
+        """Counter hit/miss/eviction dan pemakaian memori"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+                'files': list(self._entries)
+            }
+
+    def _remove(self, path):
+        entry = self._entries.pop(path, None)
+        if entry is None:
+            return False
+        self._bytes -= entry[2]
+        return True
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and self._entries:
+            _, (_, _, size) = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
@@ -0,0 +1,92 @@
+"""
+Audio Metadata Module untuk School Bell System
+Probe durasi, sample rate, channel dan bitrate file MP3/WAV/OGG hanya dari
+header (mutagen, tanpa decode audio). Hasilnya disimpan di tabel
+audio_files dengan key ukuran file + mtime, jadi listing, cek konflik dan
+daftar preload client cukup membaca database
+"""
+
+import os
+import mutagen
+import database
+
+# Folder audio yang dipakai scheduler; file_path di database bisa berisi
+# path Windows dari instalasi lama, jadi lokasi file dihitung dari filename
+AUDIO_FOLDER = 'static/audio'
+
+
+def probe(path):
+    """
+    Baca metadata dari header file audio
+    Returns:
+        dict: format, duration (detik), sample_rate, channels, bitrate (bps),
+              file_size, file_mtime; field audio 0/None jika format tidak dikenal
+    """
+    stat = os.stat(path)
+    meta = {
+        'format': None,
+        'duration': 0,
+        'sample_rate': None,
+        'channels': None,
+        'bitrate': None,
+        'file_size': stat.st_size,
+        'file_mtime': stat.st_mtime
+    }
+    try:
+        audio = mutagen.File(path)
+    except mutagen.MutagenError as e:
+        print(f"⚠️  Metadata audio tidak terbaca ({os.path.basename(path)}): {e}")
+        return meta
+    if audio is None:
+        return meta
+
+    info = audio.info
+    meta['format'] = type(audio).__name__.lower()
+    meta['duration'] = round(getattr(info, 'length', 0) or 0, 3)
+    meta['sample_rate'] = getattr(info, 'sample_rate', None)
+    meta['channels'] = getattr(info, 'channels', None)
+    meta['bitrate'] = getattr(info, 'bitrate', None) or None
+    return meta
+
+
+def get_duration(path):
+    """Durasi audio dalam detik (0 jika tidak diketahui)"""
+    try:
+        return probe(path)['duration']
+    except OSError:
+        return 0
+
+
+def audio_path(row):
+    """Lokasi file untuk baris audio_files"""
+    return os.path.join(AUDIO_FOLDER, row['filename'])
+
+
+def is_current(row, stat):
+    """True jika metadata tersimpan masih cocok dengan ukuran dan mtime file"""
+    return (row['file_size'] == stat.st_size
+            and row['file_mtime'] == stat.st_mtime)
+
+
+def refresh_library(force=False):
+    """
+    Probe ulang file yang belum punya metadata atau berubah sejak terakhir
+    di-probe (hanya os.stat untuk file yang tidak berubah)
+    Returns:
+        dict: jumlah file probed, unchanged, missing
+    """
+    result = {'probed': 0, 'unchanged': 0, 'missing': 0}
+    for row in database.get_all_audio_files():
+        try:
+            stat = os.stat(audio_path(row))
+        except OSError:
+            result['missing'] += 1
+            continue
+        if not force and is_current(row, stat):
+            result['unchanged'] += 1
+            continue
+        database.update_audio_metadata(row['id'], probe(audio_path(row)))
+        result['probed'] += 1
+    if result['probed']:
+        print(f"🎵 Metadata audio diperbarui: {result['probed']} file")
+    return result
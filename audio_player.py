@@ -5,15 +5,17 @@ Alternatif untuk pygame yang sering error di Windows
 
 import os
 import threading
-from mutagen.mp3 import MP3
+import audio_cache
+import audio_meta
 
 # Try multiple audio backends
 AUDIO_BACKEND = None
 
 # Try importing pygame first
+# Mixer (device audio) baru dibuka oleh proses leader lewat init_mixer(),
+# jadi worker follower tidak ikut memegang sound card
 try:
     import pygame
-    pygame.mixer.init()
     AUDIO_BACKEND = 'pygame'
     print("Audio backend: pygame")
 except ImportError:
@@ -59,12 +61,125 @@ class AudioPlayer:
         self.volume = 0.8
         self.backend = AUDIO_BACKEND
         self._stop_flag = False
+        self._lock = threading.Lock()
+        # Audio yang sudah di-decode (LRU, lihat prepare() dan _decode())
+        self.cache = audio_cache.AudioCache()
+        self._uncacheable = {}  # path -> mtime file yang lebih besar dari kapasitas cache
+        self._channel = None
+        self._queued_file = None  # file yang diantrekan lewat queue_next()
         
+    def init_mixer(self):
+        """
+        Buka mixer pygame jika belum (dipanggil saat proses menjadi leader
+        dan sebelum audio pertama diputar/di-decode)
+        Returns:
+            bool: False jika device audio tidak bisa dibuka
+        """
+        if self.backend != 'pygame' or self._mixer_ready():
+            return True
+        try:
+            pygame.mixer.init()
+            pygame.mixer.music.set_volume(self.volume)
+            print("🔊 Mixer pygame dibuka")
+            return True
+        except pygame.error as e:
+            print(f"❌ Gagal membuka mixer pygame: {e}")
+            return False
+    
+    def close_mixer(self):
+        """Tutup mixer (proses tidak lagi leader); Sound di cache ikut dibuang"""
+        if not self._mixer_ready():
+            return
+        self.stop()
+        self.cache.clear()
+        pygame.mixer.quit()
+        print("🔇 Mixer pygame ditutup")
+    
+    def _mixer_ready(self):
+        return self.backend == 'pygame' and pygame.mixer.get_init() is not None
+    
     def set_volume(self, volume):
         """Set volume (0.0 - 1.0)"""
         self.volume = max(0.0, min(1.0, volume))
-        if self.backend == 'pygame':
+        if self._mixer_ready():
             pygame.mixer.music.set_volume(self.volume)
+            if self._channel:
+                self._channel.set_volume(self.volume)
+    
+    def set_cache_size(self, megabytes):
+        """Batas memori cache audio ter-decode (MB)"""
+        self.cache.resize(max(0, int(megabytes)) * 1024 * 1024)
+        self._uncacheable = {}
+    
+    def prepare(self, audio_path):
+        """
+        Pre-warm: baca dan decode file audio ke cache sebelum bel berbunyi
+        sehingga play() hanya perlu memulai pemutaran
+        Returns:
+            bool: False jika file tidak ditemukan atau gagal di-decode
+        """
+        if not os.path.exists(audio_path):
+            print(f"File tidak ditemukan: {audio_path}")
+            return False
+        if not self.init_mixer():
+            return False
+        if self.backend not in ('pygame', 'pydub'):
+            # Backend lain membaca sendiri dari disk, cukup panaskan page cache
+            try:
+                with open(audio_path, 'rb') as f:
+                    while f.read(1024 * 1024):
+                        pass
+                return True
+            except OSError as e:
+                print(f"Error pre-warm audio: {e}")
+                return False
+        
+        if self.cache.get(audio_path) is not None:
+            return True
+        try:
+            self._decode(audio_path)
+            return True
+        except Exception as e:
+            print(f"Error pre-warm audio: {e}")
+            return False
+    
+    def is_prepared(self, audio_path):
+        """Cek apakah file audio sudah ada di cache"""
+        return self.cache.contains(audio_path)
+    
+    def _decode(self, audio_path):
+        """Decode file audio penuh ke memori lalu simpan di cache"""
+        mtime = os.path.getmtime(audio_path)
+        if self.backend == 'pygame':
+            # Sound di-decode penuh ke memori, beda dengan mixer.music yang streaming
+            audio = pygame.mixer.Sound(audio_path)
+            frequency, size, channels = pygame.mixer.get_init()
+            nbytes = int(audio.get_length() * frequency * channels * abs(size) // 8)
+        else:
+            from pydub import AudioSegment
+            audio = AudioSegment.from_file(audio_path)
+            nbytes = len(audio.raw_data)
+        if not self.cache.put(audio_path, mtime, audio, nbytes):
+            self._uncacheable[audio_path] = mtime
+        return audio
+    
+    def _decode_in_background(self, audio_path):
+        """Isi cache setelah pemutaran streaming supaya bel berikutnya tinggal play"""
+        try:
+            if self._uncacheable.get(audio_path) == os.path.getmtime(audio_path):
+                return
+        except OSError:
+            return
+        
+        def decode():
+            try:
+                self._decode(audio_path)
+            except Exception as e:
+                print(f"Error cache audio: {e}")
+        
+        thread = threading.Thread(target=decode, name='audio-cache')
+        thread.daemon = True
+        thread.start()
     
     def play(self, audio_path, callback=None):
         """Memutar file audio"""
@@ -72,6 +187,9 @@ class AudioPlayer:
             print(f"File tidak ditemukan: {audio_path}")
             return False
         
+        if not self.init_mixer():
+            return False
+        
         if self.is_playing:
             self.stop()
         
@@ -90,11 +208,16 @@ class AudioPlayer:
             return False
     
     def _play_pygame(self, audio_path, callback):
-        """Play using pygame"""
+        """Play using pygame (dari cache jika ada, selain itu streaming)"""
+        cached = self.cache.get(audio_path)
+        if cached is not None:
+            return self._play_pygame_sound(cached, audio_path, callback)
+        
         try:
             pygame.mixer.music.load(audio_path)
             pygame.mixer.music.set_volume(self.volume)
             pygame.mixer.music.play()
+            self._decode_in_background(audio_path)
             
             self.is_playing = True
             self.current_file = audio_path
@@ -113,6 +236,62 @@ class AudioPlayer:
             print(f"Error pygame: {e}")
             return False
     
+    def _play_pygame_sound(self, sound, audio_path, callback):
+        """Play audio yang sudah di-decode (cache) lewat channel mixer"""
+        try:
+            self._channel = sound.play()
+            if self._channel is None:
+                print("Error pygame: tidak ada channel mixer yang kosong")
+                return False
+            self._channel.set_volume(self.volume)
+            
+            self.is_playing = True
+            self.current_file = audio_path
+            
+            if callback:
+                monitor_thread = threading.Thread(
+                    target=self._monitor_pygame_playback, 
+                    args=(callback,)
+                )
+                monitor_thread.daemon = True
+                monitor_thread.start()
+            
+            print(f"Memutar (pygame, cache): {audio_path}")
+            return True
+        except Exception as e:
+            print(f"Error pygame: {e}")
+            return False
+    
+    def queue_next(self, audio_path):
+        """
+        Antrekan audio berikutnya di channel yang sedang diputar supaya mulai
+        tepat saat audio sekarang selesai (tanpa jeda)
+        Hanya untuk pygame dengan audio yang sudah ada di cache
+        Returns:
+            bool: False jika tidak bisa diantrekan (putar biasa setelah selesai)
+        """
+        if self.backend != 'pygame' or not self._channel or not self._channel.get_busy():
+            return False
+        if self._queued_file is not None:
+            return False
+        sound = self.cache.get(audio_path)
+        if sound is None:
+            return False
+        self._channel.queue(sound)
+        self._queued_file = audio_path
+        return True
+    
+    def has_queued(self):
+        """True selama audio dari queue_next() belum mulai diputar"""
+        if self._queued_file is None:
+            return False
+        if self._channel and self._channel.get_queue() is not None:
+            return True
+        # Audio antrean sudah mulai (Channel.queue kosong lagi)
+        self.current_file = self._queued_file
+        self._queued_file = None
+        return False
+    
     def _play_playsound(self, audio_path, callback):
         """Play using playsound"""
         try:
@@ -178,7 +357,6 @@ class AudioPlayer:
     def _play_pydub(self, audio_path, callback):
         """Play using pydub"""
         try:
-            from pydub import AudioSegment
             from pydub.playback import play
             
             self.is_playing = True
@@ -186,7 +364,9 @@ class AudioPlayer:
             
             def play_thread():
                 try:
-                    audio = AudioSegment.from_mp3(audio_path)
+                    audio = self.cache.get(audio_path)
+                    if audio is None:
+                        audio = self._decode(audio_path)
                     play(audio)
                     self.is_playing = False
                     self.current_file = None
@@ -208,7 +388,7 @@ class AudioPlayer:
     
     def _monitor_pygame_playback(self, callback):
         """Monitor pygame playback"""
-        while pygame.mixer.music.get_busy() and not self._stop_flag:
+        while self._pygame_busy() and not self._stop_flag:
             pygame.time.Clock().tick(10)
         
         self.is_playing = False
@@ -220,9 +400,13 @@ class AudioPlayer:
     def stop(self):
         """Stop pemutaran audio"""
         self._stop_flag = True
+        self._queued_file = None
         
-        if self.backend == 'pygame':
+        if self._mixer_ready():
             pygame.mixer.music.stop()
+            if self._channel:
+                self._channel.stop()
+                self._channel = None
         
         self.is_playing = False
         self.current_file = None
@@ -230,27 +414,35 @@ class AudioPlayer:
     
     def pause(self):
         """Pause audio (pygame only)"""
-        if self.backend == 'pygame' and self.is_playing:
+        if self._mixer_ready() and self.is_playing:
             pygame.mixer.music.pause()
+            if self._channel:
+                self._channel.pause()
     
     def unpause(self):
         """Resume audio (pygame only)"""
-        if self.backend == 'pygame' and self.is_playing:
+        if self._mixer_ready() and self.is_playing:
             pygame.mixer.music.unpause()
+            if self._channel:
+                self._channel.unpause()
     
     def get_audio_duration(self, audio_path):
-        """Mendapatkan durasi audio dalam detik"""
-        try:
-            audio = MP3(audio_path)
-            return audio.info.length
-        except:
-            return 0
+        """Mendapatkan durasi audio dalam detik (MP3/WAV/OGG, dari header)"""
+        return audio_meta.get_duration(audio_path)
     
     def is_audio_playing(self):
         """Cek apakah sedang ada audio yang diputar"""
         if self.backend == 'pygame':
-            return self.is_playing and pygame.mixer.music.get_busy()
+            return self.is_playing and self._pygame_busy()
         return self.is_playing
+    
+    def _pygame_busy(self):
+        """Status pygame: streaming (mixer.music) atau channel pre-warm"""
+        if not self._mixer_ready():
+            return False
+        if self._channel and self._channel.get_busy():
+            return True
+        return pygame.mixer.music.get_busy()
 
 
 # Global audio player instance
@@ -260,6 +452,34 @@ def play_audio(audio_path, callback=None):
     """Helper function untuk play audio"""
     return audio_player.play(audio_path, callback)
 
+def get_duration(audio_path):
+    """Helper function untuk durasi audio (detik)"""
+    return audio_player.get_audio_duration(audio_path)
+
+def prepare_audio(audio_path):
+    """Helper function untuk pre-warm audio sebelum diputar"""
+    return audio_player.prepare(audio_path)
+
+def invalidate_audio(audio_path):
+    """Helper function untuk membuang file dari cache audio"""
+    return audio_player.cache.invalidate(audio_path)
+
+def set_cache_size(megabytes):
+    """Helper function untuk batas cache audio (MB)"""
+    audio_player.set_cache_size(megabytes)
+
+def get_cache_stats():
+    """Helper function untuk counter cache audio"""
+    return audio_player.cache.get_stats()
+
+def init_mixer():
+    """Helper function untuk membuka device audio (proses leader)"""
+    return audio_player.init_mixer()
+
+def close_mixer():
+    """Helper function untuk melepas device audio"""
+    audio_player.close_mixer()
+
 def stop_audio():
     """Helper function untuk stop audio"""
     audio_player.stop()
@@ -0,0 +1,93 @@
+"""
+Clock Module untuk School Bell System
+Sumber waktu tunggal untuk scheduler, API status dan pipeline audio.
+Default memakai jam sistem; VirtualClock dipasang oleh harness
+fastforward.py supaya satu minggu jadwal bisa dijalankan dalam hitungan detik
+"""
+
+import threading
+import time as _time
+from datetime import datetime, timedelta
+
+
+class SystemClock:
+    """Jam sistem (wall clock dan monotonic)"""
+
+    virtual = False
+
+    def now(self):
+        return datetime.now()
+
+    def timestamp(self):
+        return _time.time()
+
+    def monotonic(self):
+        return _time.monotonic()
+
+
+class VirtualClock:
+    """
+    Jam virtual: waktu hanya maju lewat set()/advance(), tidak pernah
+    sendiri. Monotonic ikut maju sebesar langkah yang sama, tapi tidak
+    pernah mundur walau set() dipanggil dengan waktu lebih awal
+    """
+
+    virtual = True
+
+    def __init__(self, start=None):
+        self._lock = threading.Lock()
+        self._ts = (start or datetime.now()).timestamp()
+        self._mono = 0.0
+
+    def now(self):
+        return datetime.fromtimestamp(self.timestamp())
+
+    def timestamp(self):
+        with self._lock:
+            return self._ts
+
+    def monotonic(self):
+        with self._lock:
+            return self._mono
+
+    def set(self, when):
+        """Pindahkan jam ke datetime tertentu"""
+        with self._lock:
+            ts = when.timestamp()
+            self._mono += max(0.0, ts - self._ts)
+            self._ts = ts
+
+    def advance(self, seconds):
+        """Majukan jam sebanyak detik tertentu"""
+        self.set(self.now() + timedelta(seconds=seconds))
+
+
+# Global clock instance
+active_clock = SystemClock()
+
+def set_clock(new_clock):
+    """
+    Ganti sumber waktu (mis. VirtualClock untuk harness)
+    Returns:
+        jam sebelumnya, supaya bisa dikembalikan
+    """
+    global active_clock
+    previous = active_clock
+    active_clock = new_clock
+    return previous
+
+def now():
+    """Helper function: datetime lokal sekarang"""
+    return active_clock.now()
+
+def timestamp():
+    """Helper function: epoch detik sekarang"""
+    return active_clock.timestamp()
+
+def monotonic():
+    """Helper function: detik monotonic (untuk mengukur selang waktu)"""
+    return active_clock.monotonic()
+
+def is_virtual():
+    """True jika jam virtual sedang dipakai (dispatcher tidak memakai thread timer)"""
+    return active_clock.virtual
@@ -0,0 +1,210 @@
+"""
+Conflict Module untuk School Bell System
+Deteksi bel yang tumpang tindih: setiap jadwal memutar audio selama
+[waktu, waktu + durasi audio) di tiap harinya. Bel yang mulai sebelum
+bel lain selesai akan memotong audio tersebut (kebijakan playback default
+untuk kelas 'scheduled' adalah preempt, lihat playback.py)
+"""
+
+import math
+import threading
+from collections import defaultdict
+import database
+import timeline
+
+CONFLICT_POLICIES = ('warn', 'reject')
+MIN_DURATION = 1  # detik; audio tanpa durasi tetap dianggap bentrok di waktu yang sama
+
+
+def bell_duration(durations, audio_file):
+    """Durasi audio dalam detik dari dict {filename: durasi} (minimal MIN_DURATION)"""
+    return max(durations.get(audio_file) or 0, MIN_DURATION)
+
+
+def schedule_start(schedule):
+    """Detik sejak tengah malam saat jadwal berbunyi"""
+    return timeline.parse_seconds(schedule['time'])
+
+
+class ConflictIndex:
+    """
+    Interval bunyi per (profil, hari, menit): setiap jadwal dimasukkan ke
+    semua bucket menit yang dilalui [waktu, waktu + durasi audio). check()
+    hanya membaca bucket menit milik jadwal kandidat, dan add()/remove()
+    memperbarui index tanpa membangun ulang seluruh timetable
+    """
+
+    def __init__(self, schedules, durations, version=None, audio_version=None):
+        self.durations = dict(durations)
+        self.version = version           # versi data jadwal saat index dibuat
+        self.audio_version = audio_version  # versi metadata audio (durasi)
+        self._buckets = defaultdict(list)  # (profil, hari, menit) -> list (start, end, schedule)
+        self._items = {}                   # schedule_id -> (start, end, schedule)
+        for schedule in schedules:
+            self.add(schedule)
+
+    def interval(self, schedule):
+        audio_file = schedule['audio_file']
+        if audio_file not in self.durations:
+            # Audio yang diupload setelah index dibuat
+            self.durations[audio_file] = database.get_audio_duration(audio_file)
+        start = schedule_start(schedule)
+        return start, start + bell_duration(self.durations, audio_file)
+
+    def add(self, schedule):
+        """Tambah atau ganti satu jadwal (jadwal nonaktif hanya dibuang)"""
+        self.remove(schedule['id'])
+        if not schedule['is_active']:
+            return
+        start, end = self.interval(schedule)
+        item = (start, end, schedule)
+        self._items[schedule['id']] = item
+        for key in self._bucket_keys(schedule, start, end):
+            self._buckets[key].append(item)
+
+    def remove(self, schedule_id):
+        """Buang satu jadwal dari index"""
+        item = self._items.pop(schedule_id, None)
+        if item is None:
+            return
+        for key in self._bucket_keys(item[2], item[0], item[1]):
+            items = [other for other in self._buckets[key] if other[2]['id'] != schedule_id]
+            if items:
+                self._buckets[key] = items
+            else:
+                del self._buckets[key]
+
+    @staticmethod
+    def _bucket_keys(schedule, start, end):
+        minutes = range(int(start // 60), int(math.ceil(end / 60)))
+        return [(schedule['profile_id'], day, minute)
+                for day in schedule['days'] for minute in minutes]
+
+    def check(self, schedule, exclude_id=None):
+        """
+        Cari jadwal yang bentrok dengan satu jadwal (baru atau yang diedit)
+        Returns:
+            list: satu entri per jadwal lain, dengan hari-hari bentroknya
+        """
+        start, end = self.interval(schedule)
+        minutes = range(int(start // 60), int(math.ceil(end / 60)))
+        found = {}
+        for day in schedule['days']:
+            seen = set()
+            for minute in minutes:
+                for other_start, other_end, other in \
+                        self._buckets.get((schedule['profile_id'], day, minute), ()):
+                    if other['id'] in seen or other['id'] == exclude_id:
+                        continue
+                    seen.add(other['id'])
+                    if other_end <= start or other_start >= end:
+                        continue
+                    entry = found.get(other['id'])
+                    if entry is None:
+                        entry = _conflict(schedule, other, start, end, other_start, other_end)
+                        found[other['id']] = entry
+                    entry['days'].append(database.DAY_NAMES[day])
+        return sorted(found.values(), key=lambda entry: entry['time'])
+
+    def all_conflicts(self):
+        """
+        Semua pasangan jadwal yang bentrok di seluruh timetable (sweep line)
+        Returns:
+            list: per (profil, hari) pasangan (first, second) urut waktu
+        """
+        per_day = defaultdict(list)
+        for item in self._items.values():
+            for day in item[2]['days']:
+                per_day[(item[2]['profile_id'], day)].append(item)
+
+        conflicts = []
+        for (profile_id, day), items in sorted(per_day.items()):
+            items.sort(key=lambda item: (item[0], item[2]['id']))
+            active = []
+            for start, end, schedule in items:
+                active = [item for item in active if item[1] > start]
+                for other_start, other_end, other in active:
+                    conflicts.append({
+                        'profile_id': profile_id,
+                        'day': database.DAY_NAMES[day],
+                        'first': _summary(other, other_start, other_end),
+                        'second': _summary(schedule, start, end),
+                        'overlap_seconds': round(min(end, other_end) - start, 1)
+                    })
+                active.append((start, end, schedule))
+        return conflicts
+
+
+def _summary(schedule, start, end):
+    return {
+        'schedule_id': schedule.get('id'),
+        'name': schedule['name'],
+        'time': schedule['time'],
+        'audio_file': schedule['audio_file'],
+        'duration': round(end - start, 1)
+    }
+
+
+def _conflict(schedule, other, start, end, other_start, other_end):
+    entry = _summary(other, other_start, other_end)
+    entry['overlap_seconds'] = round(min(end, other_end) - max(start, other_start), 1)
+    entry['days'] = []
+    return entry
+
+
+# Index per profil (None = semua profil), dipakai ulang antar request
+_indexes = {}
+_indexes_lock = threading.RLock()
+
+
+def get_index(profile_id=None):
+    """
+    ConflictIndex untuk profil; dibangun dari database hanya jika versi
+    data jadwal berubah di luar sync_schedule() (mis. import atau worker lain)
+    atau durasi audio berubah (upload, hapus, probe ulang)
+    """
+    version = database.get_schedules_version()
+    audio_version = database.get_audio_version()
+    with _indexes_lock:
+        index = _indexes.get(profile_id)
+        if index is None or index.version != version or index.audio_version != audio_version:
+            index = ConflictIndex(database.get_all_schedules(profile_id),
+                                  database.get_audio_durations(), version, audio_version)
+            _indexes[profile_id] = index
+        return index
+
+
+def sync_schedule(schedule_id):
+    """
+    Perbarui index yang sudah ada setelah satu jadwal ditambah, diubah,
+    dihapus atau di-toggle (panggil setelah write ke database). Index yang
+    tertinggal lebih dari satu versi dibiarkan dan dibangun ulang saat dipakai
+    """
+    version = database.get_schedules_version()
+    schedule = database.get_schedule(schedule_id)
+    with _indexes_lock:
+        for profile_id, index in _indexes.items():
+            if index.version != (version[0] - 1, version[1]):
+                continue
+            index.remove(schedule_id)
+            if schedule and profile_id in (None, schedule['profile_id']):
+                index.add(schedule)
+            index.version = version
+
+
+def check_schedule(schedule, exclude_id=None):
+    """Helper function: bentrok untuk satu jadwal terhadap jadwal lain di profilnya"""
+    with _indexes_lock:
+        return get_index(schedule['profile_id']).check(schedule, exclude_id)
+
+
+def find_all_conflicts(profile_id=None):
+    """Helper function: semua pasangan bentrok (opsional hanya satu profil)"""
+    with _indexes_lock:
+        return get_index(profile_id).all_conflicts()
+
+
+def get_policy():
+    """Kebijakan saat menyimpan jadwal yang bentrok: 'warn' atau 'reject'"""
+    policy = database.get_setting('conflict_policy')
+    return policy if policy in CONFLICT_POLICIES else 'warn'
@@ -5,16 +5,92 @@ Menggunakan SQLite untuk menyimpan jadwal, audio files, dan logs
 
 import sqlite3
 import os
-from datetime import datetime
+import queue
+import threading
+import time
+import atexit
+import base64
+import gzip
+import json
+from datetime import datetime, timedelta, timezone
 
 DATABASE_PATH = 'database/school_bell.db'
 
-def get_db_connection():
-    """Membuat koneksi ke database"""
-    conn = sqlite3.connect(DATABASE_PATH)
+# Jumlah maksimal koneksi idle yang disimpan di pool
+POOL_SIZE = 8
+
+# PRAGMA yang dijalankan sekali per koneksi baru
+CONNECTION_PRAGMAS = (
+    'PRAGMA journal_mode = WAL',        # Reader tidak diblok oleh writer
+    'PRAGMA synchronous = NORMAL',      # Aman untuk WAL, fsync lebih sedikit
+    'PRAGMA cache_size = -8000',        # 8 MB page cache per koneksi
+    'PRAGMA mmap_size = 67108864',      # 64 MB memory-mapped I/O
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA busy_timeout = 5000',       # Tunggu lock maks 5 detik
+)
+
+_pool = queue.LifoQueue(maxsize=POOL_SIZE)
+_local = threading.local()
+
+# Naik saat invalidate_schedules() dipanggil di proses ini; versi data
+# jadwal yang sebenarnya ada di tabel data_versions (lintas proses)
+_schedules_version = 0
+_schedules_version_lock = threading.Lock()
+
+# Cache settings di memori (write-through), diisi saat init_db()
+_settings_cache = None
+_settings_lock = threading.RLock()
+_settings_listeners = {}
+
+def _create_connection():
+    """Membuka koneksi baru dan menerapkan PRAGMA"""
+    conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False)
     conn.row_factory = sqlite3.Row  # Agar hasil query bisa diakses seperti dictionary
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+def get_db_connection():
+    """
+    Mengambil koneksi database untuk thread saat ini
+    Koneksi dipinjam dari pool dan dipakai ulang selama thread yang sama
+    memanggilnya, sampai release_db_connection() dipanggil
+    (Flask teardown / akhir job scheduler)
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        try:
+            conn = _pool.get_nowait()
+        except queue.Empty:
+            conn = _create_connection()
+        _local.conn = conn
     return conn
 
+def release_db_connection(exc=None):
+    """
+    Mengembalikan koneksi thread saat ini ke pool
+    Bisa langsung didaftarkan sebagai app.teardown_appcontext
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        return
+    _local.conn = None
+    try:
+        if conn.in_transaction:
+            conn.rollback()
+        _pool.put_nowait(conn)
+    except (queue.Full, sqlite3.Error):
+        conn.close()
+
+def close_all_connections():
+    """Menutup semua koneksi di pool (dipanggil saat shutdown)"""
+    release_db_connection()
+    while True:
+        try:
+            _pool.get_nowait().close()
+        except queue.Empty:
+            break
+
 def init_db():
     """
     Inisialisasi database dan membuat tabel-tabel yang dibutuhkan
@@ -75,64 +151,571 @@ def init_db():
         INSERT OR IGNORE INTO settings (key, value) VALUES 
         ('volume', '80'),
         ('holiday_mode', '0'),
-        ('auto_start', '1')
+        ('auto_start', '1'),
+        ('log_retention_days', '90'),
+        ('log_archive', '0'),
+        ('log_rollup_through', ''),
+        ('scheduler_engine', 'apscheduler'),
+        ('prewarm_lead_seconds', '30'),
+        ('catchup_grace_seconds', '60'),
+        ('active_profile', '1'),
+        ('conflict_policy', 'warn'),
+        ('audio_cache_mb', '128'),
+        ('playback_policy_emergency', 'preempt'),
+        ('playback_policy_scheduled', 'preempt'),
+        ('playback_policy_announcement', 'queue'),
+        ('playback_policy_music', 'drop')
     ''')
     
     conn.commit()
-    conn.close()
+    run_migrations()
+    load_settings_cache()
     print("✅ Database berhasil diinisialisasi!")
     print(f"📁 Database location: {os.path.abspath(DATABASE_PATH)}")
 
+# ===== SCHEMA MIGRATIONS =====
+
+# Profil yang dibuat migrasi 8, tidak bisa dihapus
+DEFAULT_PROFILE_ID = 1
+
+def _migration_001_indexes(conn):
+    """Index untuk lookup jadwal per hari dan urutan log"""
+    # get_active_schedules_by_day: WHERE day_of_week, is_active ORDER BY time
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_schedules_day_active_time
+        ON schedules (day_of_week, is_active, time)
+    ''')
+    # get_recent_logs: ORDER BY played_at DESC, id DESC
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_play_logs_played_at
+        ON play_logs (played_at, id)
+    ''')
+    # Log per jadwal (JOIN dan filter schedule_id)
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_play_logs_schedule
+        ON play_logs (schedule_id, played_at)
+    ''')
+
+def _migration_002_play_log_daily(conn):
+    """Tabel rollup harian untuk play_logs"""
+    # schedule_id 0 = pemutaran manual (NULL tidak bisa jadi bagian PRIMARY KEY)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS play_log_daily (
+            day TEXT NOT NULL,
+            schedule_id INTEGER NOT NULL DEFAULT 0,
+            audio_file TEXT NOT NULL,
+            status TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, schedule_id, audio_file, status)
+        )
+    ''')
+
+def _migration_003_schedule_exceptions(conn):
+    """Pengecualian jadwal per tanggal (bel tidak berbunyi di tanggal itu)"""
+    # schedule_id NULL = berlaku untuk semua jadwal di tanggal tersebut
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schedule_exceptions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date TEXT NOT NULL,
+            schedule_id INTEGER,
+            note TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_schedule_exceptions_date
+        ON schedule_exceptions (date)
+    ''')
+
+def _migration_004_days_mask(conn):
+    """
+    Ganti kolom teks day_of_week dengan bitmask hari (days_mask)
+    Tabel dibangun ulang karena SQLite lama belum mendukung DROP COLUMN
+    """
+    cases = ' '.join(
+        f"WHEN '{name}' THEN {1 << index}" for name, index in DAY_ALIASES.items()
+    )
+    # Simpan nilai AUTOINCREMENT supaya ID jadwal yang sudah dihapus tidak
+    # dipakai ulang (play_logs lama masih mereferensikannya)
+    sequence = conn.execute(
+        "SELECT seq FROM sqlite_sequence WHERE name = 'schedules'"
+    ).fetchone()
+    conn.execute('''
+        CREATE TABLE schedules_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            days_mask INTEGER NOT NULL DEFAULT 0,
+            time TEXT NOT NULL,
+            audio_file TEXT NOT NULL,
+            is_active INTEGER DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute(f'''
+        INSERT INTO schedules_new (id, name, days_mask, time, audio_file, is_active, created_at)
+        SELECT id, name,
+               CASE lower(trim(day_of_week)) {cases} ELSE 0 END,
+               time, audio_file, is_active, created_at
+        FROM schedules
+    ''')
+    conn.execute('DROP TABLE schedules')
+    conn.execute('ALTER TABLE schedules_new RENAME TO schedules')
+    if sequence:
+        conn.execute(
+            "UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'schedules'",
+            (sequence['seq'],)
+        )
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_schedules_active_time
+        ON schedules (is_active, time)
+    ''')
+
+def _migration_005_play_log_timing(conn):
+    """Kolom timing bel di play_logs (waktu jadwal, callback, audio mulai)"""
+    columns = {row['name'] for row in conn.execute('PRAGMA table_info(play_logs)')}
+    for column, column_type in PLAY_LOG_TIMING_COLUMNS:
+        if column not in columns:
+            conn.execute(f'ALTER TABLE play_logs ADD COLUMN {column} {column_type}')
+
+def _migration_006_bell_ledger(conn):
+    """Ledger bel: satu baris per (jadwal, waktu bunyi) yang sudah ditangani"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS bell_ledger (
+            schedule_id INTEGER NOT NULL,
+            fire_at TEXT NOT NULL,
+            status TEXT NOT NULL,
+            recorded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (schedule_id, fire_at)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_bell_ledger_fire_at
+        ON bell_ledger (fire_at)
+    ''')
+
+def _migration_007_exception_calendar(conn):
+    """
+    schedule_exceptions menjadi kalender: rentang tanggal (end_date) dan
+    jenis 'skip' (libur) atau 'extra' (bel tambahan satu kali)
+    """
+    columns = {row['name'] for row in conn.execute('PRAGMA table_info(schedule_exceptions)')}
+    for column, column_type in [
+        ('end_date', 'TEXT'),
+        ('kind', "TEXT NOT NULL DEFAULT 'skip'"),
+        ('time', 'TEXT'),
+        ('audio_file', 'TEXT'),
+        ('name', 'TEXT'),
+    ]:
+        if column not in columns:
+            conn.execute(f'ALTER TABLE schedule_exceptions ADD COLUMN {column} {column_type}')
+    conn.execute('UPDATE schedule_exceptions SET end_date = date WHERE end_date IS NULL')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_schedule_exceptions_end_date
+        ON schedule_exceptions (end_date)
+    ''')
+
+def _migration_008_schedule_profiles(conn):
+    """
+    Profil jadwal (reguler, ujian, Ramadan, ...): setiap jadwal milik satu
+    profil, jadwal lama masuk ke profil default
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schedule_profiles (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            description TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('''
+        INSERT OR IGNORE INTO schedule_profiles (id, name, description)
+        VALUES (?, 'Reguler', 'Jadwal reguler')
+    ''', (DEFAULT_PROFILE_ID,))
+    for table in ('schedules', 'schedule_exceptions'):
+        columns = {row['name'] for row in conn.execute(f'PRAGMA table_info({table})')}
+        if 'profile_id' in columns:
+            continue
+        if table == 'schedules':
+            conn.execute(f'ALTER TABLE schedules ADD COLUMN profile_id INTEGER NOT NULL '
+                         f'DEFAULT {DEFAULT_PROFILE_ID}')
+        else:
+            # NULL = berlaku untuk semua profil
+            conn.execute('ALTER TABLE schedule_exceptions ADD COLUMN profile_id INTEGER')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_schedules_profile
+        ON schedules (profile_id, is_active, time)
+    ''')
+
+def _migration_009_leader_election(conn):
+    """Lease leader (satu proses pemilik scheduler/audio) dan antrian perintah ke leader"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS leader_lease (
+            name TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            expires_at REAL NOT NULL,
+            acquired_at REAL NOT NULL,
+            state TEXT
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS leader_commands (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            command TEXT NOT NULL,
+            payload TEXT,
+            created_at REAL NOT NULL
+        )
+    ''')
+
+# Metadata audio (migrasi 10); file_size + file_mtime menjadi key cache probe
+AUDIO_METADATA_COLUMNS = [
+    ('format', 'TEXT'),
+    ('sample_rate', 'INTEGER'),
+    ('channels', 'INTEGER'),
+    ('bitrate', 'INTEGER'),
+    ('file_size', 'INTEGER'),
+    ('file_mtime', 'REAL'),
+]
+
+def _migration_010_audio_metadata(conn):
+    """Kolom metadata audio (format, sample rate, channel, bitrate, ukuran, mtime)"""
+    columns = {row['name'] for row in conn.execute('PRAGMA table_info(audio_files)')}
+    for column, column_type in AUDIO_METADATA_COLUMNS:
+        if column not in columns:
+            conn.execute(f'ALTER TABLE audio_files ADD COLUMN {column} {column_type}')
+
+def _migration_011_data_versions(conn):
+    """Versi data jadwal yang terlihat oleh semua proses (cache timeline di worker)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS data_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    conn.execute("INSERT OR IGNORE INTO data_versions (name, version) VALUES ('schedules', 0)")
+
+def _migration_012_audio_version(conn):
+    """Versi metadata audio (durasi) untuk cache index konflik"""
+    conn.execute("INSERT OR IGNORE INTO data_versions (name, version) VALUES ('audio', 0)")
+
+# Daftar migrasi berurutan: (versi, deskripsi, fungsi)
+# Tambahkan migrasi baru di akhir list, jangan ubah migrasi yang sudah ada
+MIGRATIONS = [
+    (1, 'Index schedules dan play_logs', _migration_001_indexes),
+    (2, 'Tabel rollup play_log_daily', _migration_002_play_log_daily),
+    (3, 'Tabel schedule_exceptions', _migration_003_schedule_exceptions),
+    (4, 'Hari jadwal sebagai bitmask (days_mask)', _migration_004_days_mask),
+    (5, 'Kolom timing bel di play_logs', _migration_005_play_log_timing),
+    (6, 'Tabel bell_ledger', _migration_006_bell_ledger),
+    (7, 'Kalender libur dan bel tambahan di schedule_exceptions', _migration_007_exception_calendar),
+    (8, 'Profil jadwal', _migration_008_schedule_profiles),
+    (9, 'Leader election (lease dan antrian perintah)', _migration_009_leader_election),
+    (10, 'Metadata audio di audio_files', _migration_010_audio_metadata),
+    (11, 'Versi data lintas proses (data_versions)', _migration_011_data_versions),
+    (12, 'Versi metadata audio di data_versions', _migration_012_audio_version),
+]
+
+def get_schema_version(conn=None):
+    """Versi schema yang sudah diterapkan (0 jika belum ada migrasi)"""
+    conn = conn or get_db_connection()
+    row = conn.execute('SELECT MAX(version) AS version FROM schema_version').fetchone()
+    return row['version'] or 0
+
+def run_migrations():
+    """
+    Menjalankan migrasi yang belum diterapkan secara berurutan
+    Setiap migrasi berjalan dalam satu transaksi (BEGIN IMMEDIATE),
+    jadi aman jika beberapa proses start bersamaan
+    """
+    conn = get_db_connection()
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    for version, description, migrate in MIGRATIONS:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Cek ulang di dalam transaksi, proses lain mungkin sudah menjalankannya
+            if version <= get_schema_version(conn):
+                conn.rollback()
+                continue
+            migrate(conn)
+            conn.execute(
+                'INSERT INTO schema_version (version, description) VALUES (?, ?)',
+                (version, description)
+            )
+            conn.commit()
+            print(f"  🔧 Migrasi {version}: {description}")
+        except Exception:
+            conn.rollback()
+            print(f"❌ Migrasi {version} gagal: {description}")
+            raise
+
 # ===== FUNGSI UNTUK SCHEDULES =====
 
-def add_schedule(name, day_of_week, time, audio_file):
-    """Menambah jadwal bel baru"""
+def _bump_schedules_version(conn):
+    """
+    Tandai bahwa jadwal/profil/kalender berubah; dipanggil sebelum commit
+    supaya versi naik dalam transaksi yang sama dengan perubahannya
+    """
+    conn.execute("UPDATE data_versions SET version = version + 1 WHERE name = 'schedules'")
+
+def invalidate_schedules():
+    """Paksa timeline dikompilasi ulang di proses ini"""
+    global _schedules_version
+    with _schedules_version_lock:
+        _schedules_version += 1
+
+def get_schedules_version():
+    """
+    Versi data jadwal: (versi di database, versi lokal)
+    Versi database dibaca setiap kali (satu lookup primary key), jadi
+    perubahan dari worker lain langsung terlihat
+    """
+    conn = get_db_connection()
+    row = conn.execute("SELECT version FROM data_versions WHERE name = 'schedules'").fetchone()
+    return (row['version'] if row else 0, _schedules_version)
+
+def _bump_audio_version(conn):
+    """Tandai bahwa file/durasi audio berubah; dipanggil sebelum commit"""
+    conn.execute("UPDATE data_versions SET version = version + 1 WHERE name = 'audio'")
+
+def get_audio_version():
+    """Versi metadata audio di database (naik saat file ditambah, di-probe ulang atau dihapus)"""
+    conn = get_db_connection()
+    row = conn.execute("SELECT version FROM data_versions WHERE name = 'audio'").fetchone()
+    return row['version'] if row else 0
+
+# Nama hari sesuai urutan datetime.weekday() (0 = Senin), hanya untuk tampilan
+DAY_NAMES = ['Senin', 'Selasa', 'Rabu', 'Kamis', 'Jumat', 'Sabtu', 'Minggu']
+
+# Nama hari yang diterima sebagai input (Indonesia dan Inggris)
+DAY_ALIASES = {name.lower(): index for index, name in enumerate(DAY_NAMES)}
+DAY_ALIASES.update({
+    name.lower(): index for index, name in enumerate(
+        ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+    )
+})
+
+# Bitmask hari: bit 0 = Senin ... bit 6 = Minggu
+ALL_DAYS_MASK = 0b1111111
+
+SCHEDULE_FIELDS = ['name', 'days', 'time', 'audio_file', 'is_active']
+
+def normalize_time(value):
+    """
+    Normalisasi jam bel 'HH:MM' atau 'HH:MM:SS' (detik untuk bel yang
+    dibuat berselang beberapa detik antar gedung); detik 0 ditulis 'HH:MM'
+    Raises:
+        ValueError: jika format tidak valid
+    """
+    for fmt in ('%H:%M', '%H:%M:%S'):
+        try:
+            parsed = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        return parsed.strftime('%H:%M:%S' if parsed.second else '%H:%M')
+    raise ValueError(f"time harus format HH:MM atau HH:MM:SS: '{value}'")
+
+def days_to_mask(days):
+    """
+    Konversi hari ke bitmask
+    Args:
+        days: int/nama hari, string dipisah koma ('Senin,Rabu'), atau list
+    Raises:
+        ValueError: jika ada hari yang tidak dikenal
+    """
+    if isinstance(days, str):
+        days = [part for part in days.split(',') if part.strip()]
+    elif isinstance(days, int):
+        days = [days]
+    
+    mask = 0
+    for day in days:
+        if isinstance(day, str):
+            key = day.strip().lower()
+            if key.isdigit():
+                day = int(key)
+            elif key in DAY_ALIASES:
+                day = DAY_ALIASES[key]
+            else:
+                raise ValueError(f"Hari tidak dikenal: '{day.strip()}'")
+        if not isinstance(day, int) or not 0 <= day <= 6:
+            raise ValueError(f"Index hari harus 0-6: {day}")
+        mask |= 1 << day
+    return mask
+
+def mask_to_days(mask):
+    """Bitmask ke list index hari (0 = Senin)"""
+    return [day for day in range(7) if mask & (1 << day)]
+
+def format_days(mask):
+    """Label hari untuk tampilan, mis. 'Senin', 'Senin - Jumat', 'Senin, Rabu'"""
+    days = mask_to_days(mask)
+    if not days:
+        return '-'
+    if mask == ALL_DAYS_MASK:
+        return 'Setiap hari'
+    if len(days) > 2 and days == list(range(days[0], days[-1] + 1)):
+        return f"{DAY_NAMES[days[0]]} - {DAY_NAMES[days[-1]]}"
+    return ', '.join(DAY_NAMES[day] for day in days)
+
+def _schedule_dict(row):
+    """Row jadwal ke dict, ditambah list hari dan label hari"""
+    schedule = dict(row)
+    schedule['days'] = mask_to_days(schedule['days_mask'])
+    schedule['day_of_week'] = format_days(schedule['days_mask'])
+    return schedule
+
+def validate_schedule(data):
+    """
+    Validasi dan normalisasi satu baris jadwal
+    Hari dibaca dari 'days' (atau 'day_of_week' untuk format lama)
+    Returns:
+        tuple: (schedule dict yang sudah dinormalisasi, list error)
+    """
+    errors = []
+    name = str(data.get('name') or '').strip()
+    days = data.get('days', data.get('day_of_week'))
+    time_str = str(data.get('time') or '').strip()
+    audio_file = str(data.get('audio_file') or '').strip()
+    
+    if not name:
+        errors.append('name wajib diisi')
+    days_mask = 0
+    try:
+        days_mask = days_to_mask(days if days is not None else [])
+    except (ValueError, TypeError) as e:
+        errors.append(str(e))
+    if not days_mask and not errors:
+        errors.append('days wajib diisi minimal satu hari')
+    try:
+        time_str = normalize_time(time_str)
+    except ValueError as e:
+        errors.append(str(e))
+    if not audio_file:
+        errors.append('audio_file wajib diisi')
+    
+    is_active = data.get('is_active', 1)
+    if isinstance(is_active, str):
+        is_active = is_active.strip().lower() not in ('0', 'false', 'no', '')
+    
+    # Tanpa profile_id jadwal masuk ke profil yang sedang aktif
+    profile_id = data.get('profile_id')
+    if profile_id in ('', None):
+        profile_id = get_active_profile_id()
+    else:
+        try:
+            profile_id = int(profile_id)
+        except (ValueError, TypeError):
+            errors.append(f"profile_id tidak valid: '{profile_id}'")
+            profile_id = None
+        else:
+            if get_profile(profile_id) is None:
+                errors.append(f"Profil tidak ditemukan: {profile_id}")
+    
+    return {
+        'name': name,
+        'days_mask': days_mask,
+        'days': mask_to_days(days_mask),
+        'time': time_str,
+        'audio_file': audio_file,
+        'is_active': 1 if is_active else 0,
+        'profile_id': profile_id
+    }, errors
+
+def bulk_import_schedules(schedules, replace=False):
+    """
+    Menyimpan banyak jadwal dalam satu transaksi
+    Args:
+        schedules: list dict yang sudah divalidasi (lihat validate_schedule)
+        replace: True untuk menghapus jadwal lama di profil yang diimport
+    Returns:
+        int: jumlah jadwal yang disimpan
+    """
+    conn = get_db_connection()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        if replace:
+            profile_ids = {s['profile_id'] for s in schedules}
+            conn.executemany('DELETE FROM schedules WHERE profile_id = ?',
+                             [(profile_id,) for profile_id in profile_ids])
+        conn.executemany('''
+            INSERT INTO schedules (name, days_mask, time, audio_file, is_active, profile_id)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', [
+            (s['name'], s['days_mask'], s['time'], s['audio_file'], s['is_active'],
+             s['profile_id'])
+            for s in schedules
+        ])
+        _bump_schedules_version(conn)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return len(schedules)
+
+def add_schedule(name, days, time, audio_file, profile_id=None):
+    """
+    Menambah jadwal bel baru
+    Args:
+        days: hari dalam format apapun yang diterima days_to_mask()
+        profile_id: profil jadwal (default: profil yang sedang aktif)
+    """
     conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute('''
-        INSERT INTO schedules (name, day_of_week, time, audio_file)
-        VALUES (?, ?, ?, ?)
-    ''', (name, day_of_week, time, audio_file))
+        INSERT INTO schedules (name, days_mask, time, audio_file, profile_id)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (name, days_to_mask(days), time, audio_file,
+          profile_id or get_active_profile_id()))
+    _bump_schedules_version(conn)
     conn.commit()
     schedule_id = cursor.lastrowid
-    conn.close()
     return schedule_id
 
-def get_all_schedules():
-    """Mengambil semua jadwal"""
+def get_all_schedules(profile_id=None):
+    """Mengambil semua jadwal (opsional hanya satu profil)"""
     conn = get_db_connection()
-    schedules = conn.execute('SELECT * FROM schedules ORDER BY day_of_week, time').fetchall()
-    conn.close()
-    return schedules
+    # (days_mask & -days_mask) = bit hari pertama, jadi urut per hari lalu waktu
+    if profile_id is not None:
+        schedules = conn.execute('''
+            SELECT * FROM schedules WHERE profile_id = ?
+            ORDER BY (days_mask & -days_mask), time, id
+        ''', (profile_id,)).fetchall()
+    else:
+        schedules = conn.execute('''
+            SELECT * FROM schedules
+            ORDER BY (days_mask & -days_mask), time, id
+        ''').fetchall()
+    return [_schedule_dict(s) for s in schedules]
 
-def get_active_schedules_by_day(day_of_week):
-    """Mengambil jadwal aktif berdasarkan hari"""
+def get_schedule(schedule_id):
+    """Mengambil satu jadwal berdasarkan ID (None jika tidak ada)"""
     conn = get_db_connection()
-    schedules = conn.execute('''
-        SELECT * FROM schedules 
-        WHERE day_of_week = ? AND is_active = 1
-        ORDER BY time
-    ''', (day_of_week,)).fetchall()
-    conn.close()
-    return schedules
+    schedule = conn.execute('SELECT * FROM schedules WHERE id = ?', (schedule_id,)).fetchone()
+    return _schedule_dict(schedule) if schedule else None
 
-def update_schedule(schedule_id, name, day_of_week, time, audio_file):
+def update_schedule(schedule_id, name, days, time, audio_file):
     """Update jadwal"""
     conn = get_db_connection()
     conn.execute('''
         UPDATE schedules 
-        SET name = ?, day_of_week = ?, time = ?, audio_file = ?
+        SET name = ?, days_mask = ?, time = ?, audio_file = ?
         WHERE id = ?
-    ''', (name, day_of_week, time, audio_file, schedule_id))
+    ''', (name, days_to_mask(days), time, audio_file, schedule_id))
+    _bump_schedules_version(conn)
     conn.commit()
-    conn.close()
 
 def delete_schedule(schedule_id):
     """Hapus jadwal"""
     conn = get_db_connection()
     conn.execute('DELETE FROM schedules WHERE id = ?', (schedule_id,))
+    _bump_schedules_version(conn)
     conn.commit()
-    conn.close()
 
 def toggle_schedule(schedule_id):
     """Toggle status aktif/non-aktif jadwal"""
@@ -142,31 +725,441 @@ def toggle_schedule(schedule_id):
         SET is_active = CASE WHEN is_active = 1 THEN 0 ELSE 1 END
         WHERE id = ?
     ''', (schedule_id,))
+    _bump_schedules_version(conn)
     conn.commit()
-    conn.close()
+
+# ===== FUNGSI UNTUK PROFIL JADWAL =====
+
+def get_active_profile_id():
+    """Profil default (setting active_profile), dipakai jika tidak ada aturan tanggal"""
+    try:
+        return int(get_setting('active_profile') or DEFAULT_PROFILE_ID)
+    except ValueError:
+        return DEFAULT_PROFILE_ID
+
+def get_profiles():
+    """Semua profil beserta jumlah jadwalnya"""
+    conn = get_db_connection()
+    profiles = conn.execute('''
+        SELECT p.*, COUNT(s.id) AS schedule_count
+        FROM schedule_profiles p
+        LEFT JOIN schedules s ON s.profile_id = p.id
+        GROUP BY p.id
+        ORDER BY p.id
+    ''').fetchall()
+    return [dict(p) for p in profiles]
+
+def get_profile(profile_id):
+    """Mengambil satu profil (None jika tidak ada)"""
+    conn = get_db_connection()
+    profile = conn.execute(
+        'SELECT * FROM schedule_profiles WHERE id = ?', (profile_id,)
+    ).fetchone()
+    return dict(profile) if profile else None
+
+def add_profile(name, description='', copy_from=None):
+    """
+    Menambah profil baru, opsional menyalin semua jadwal dari profil lain
+    Raises:
+        sqlite3.IntegrityError: jika nama profil sudah dipakai
+    """
+    conn = get_db_connection()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        cursor = conn.execute(
+            'INSERT INTO schedule_profiles (name, description) VALUES (?, ?)',
+            (name, description)
+        )
+        profile_id = cursor.lastrowid
+        if copy_from:
+            conn.execute('''
+                INSERT INTO schedules (name, days_mask, time, audio_file, is_active, profile_id)
+                SELECT name, days_mask, time, audio_file, is_active, ?
+                FROM schedules WHERE profile_id = ?
+            ''', (profile_id, copy_from))
+        _bump_schedules_version(conn)
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    return profile_id
+
+def update_profile(profile_id, name, description=''):
+    """Update nama/deskripsi profil"""
+    conn = get_db_connection()
+    conn.execute(
+        'UPDATE schedule_profiles SET name = ?, description = ? WHERE id = ?',
+        (name, description, profile_id)
+    )
+    _bump_schedules_version(conn)
+    conn.commit()
+
+def delete_profile(profile_id):
+    """
+    Hapus profil beserta jadwal dan entri kalendernya
+    Profil default tidak bisa dihapus
+    """
+    if profile_id == DEFAULT_PROFILE_ID:
+        raise ValueError('Profil default tidak bisa dihapus')
+    conn = get_db_connection()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        conn.execute('DELETE FROM schedules WHERE profile_id = ?', (profile_id,))
+        conn.execute('DELETE FROM schedule_exceptions WHERE profile_id = ?', (profile_id,))
+        conn.execute('DELETE FROM schedule_profiles WHERE id = ?', (profile_id,))
+        _bump_schedules_version(conn)
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    if get_active_profile_id() == profile_id:
+        update_setting('active_profile', str(DEFAULT_PROFILE_ID))
+
+# ===== FUNGSI UNTUK PENGECUALIAN JADWAL =====
+
+EXCEPTION_KINDS = ('skip', 'extra', 'profile')
+EXCEPTION_FIELDS = ['date', 'end_date', 'kind', 'schedule_id', 'profile_id',
+                    'time', 'audio_file', 'name', 'note']
+
+def validate_exception(data):
+    """
+    Validasi satu entri kalender
+    - skip: jadwal (atau semua jadwal jika schedule_id kosong) tidak
+      berbunyi dari date sampai end_date
+    - extra: bel tambahan satu kali di setiap tanggal dalam rentang,
+      wajib time dan audio_file
+    - profile: profile_id dipakai otomatis dari date sampai end_date
+    skip dan extra dengan profile_id hanya berlaku saat profil itu aktif
+    Returns:
+        tuple: (entri yang sudah dinormalisasi, list error)
+    """
+    errors = []
+    kind = str(data.get('kind') or 'skip').strip().lower()
+    if kind not in EXCEPTION_KINDS:
+        errors.append(f"kind harus salah satu dari {', '.join(EXCEPTION_KINDS)}")
+    
+    dates = {}
+    for field in ('date', 'end_date'):
+        value = str(data.get(field) or '').strip()
+        if field == 'end_date' and not value:
+            dates[field] = dates.get('date')
+            continue
+        try:
+            dates[field] = datetime.strptime(value, '%Y-%m-%d').strftime('%Y-%m-%d')
+        except ValueError:
+            errors.append(f"{field} harus format YYYY-MM-DD: '{value}'")
+            dates[field] = None
+    if dates['date'] and dates['end_date'] and dates['end_date'] < dates['date']:
+        errors.append('end_date tidak boleh sebelum date')
+    
+    ids = {}
+    for field in ('schedule_id', 'profile_id'):
+        value = data.get(field)
+        ids[field] = None
+        if value in ('', None):
+            continue
+        try:
+            ids[field] = int(value)
+        except (ValueError, TypeError):
+            errors.append(f"{field} tidak valid: '{value}'")
+    schedule_id = ids['schedule_id']
+    profile_id = ids['profile_id']
+    if kind == 'profile':
+        if profile_id is None:
+            errors.append('profile_id wajib diisi untuk aturan profil')
+        elif get_profile(profile_id) is None:
+            errors.append(f"Profil {profile_id} tidak ditemukan")
+        schedule_id = None
+    
+    time_str = str(data.get('time') or '').strip() or None
+    audio_file = str(data.get('audio_file') or '').strip() or None
+    name = str(data.get('name') or '').strip() or None
+    if kind == 'extra':
+        try:
+            time_str = normalize_time(time_str or '')
+        except ValueError as e:
+            errors.append(str(e))
+        if not audio_file:
+            errors.append('audio_file wajib diisi untuk bel tambahan')
+        schedule_id = None
+    
+    return {
+        'date': dates['date'],
+        'end_date': dates['end_date'],
+        'kind': kind,
+        'schedule_id': schedule_id,
+        'profile_id': profile_id,
+        'time': time_str if kind == 'extra' else None,
+        'audio_file': audio_file if kind == 'extra' else None,
+        'name': name,
+        'note': str(data.get('note') or '').strip()
+    }, errors
+
+def add_schedule_exception(date, schedule_id=None, note='', end_date=None,
+                           kind='skip', time=None, audio_file=None, name=None,
+                           profile_id=None):
+    """
+    Menambah entri kalender: libur/pengecualian (kind='skip') untuk satu
+    jadwal atau semua jadwal (schedule_id None) dari date sampai end_date,
+    bel tambahan satu kali (kind='extra'), atau aturan profil (kind='profile')
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO schedule_exceptions
+            (date, end_date, kind, schedule_id, profile_id, time, audio_file, name, note)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (date, end_date or date, kind, schedule_id, profile_id, time, audio_file,
+          name, note))
+    _bump_schedules_version(conn)
+    conn.commit()
+    return cursor.lastrowid
+
+def bulk_add_schedule_exceptions(exceptions, replace=False):
+    """
+    Import kalender (mis. satu semester libur) dalam satu transaksi
+    Args:
+        exceptions: list dict yang sudah divalidasi (validate_exception)
+        replace: hapus semua entri kalender lama terlebih dahulu
+    Returns:
+        int: jumlah entri yang diimport
+    """
+    conn = get_db_connection()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        if replace:
+            conn.execute('DELETE FROM schedule_exceptions')
+        conn.executemany('''
+            INSERT INTO schedule_exceptions
+                (date, end_date, kind, schedule_id, profile_id, time, audio_file, name, note)
+            VALUES (:date, :end_date, :kind, :schedule_id, :profile_id, :time,
+                    :audio_file, :name, :note)
+        ''', exceptions)
+        _bump_schedules_version(conn)
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    return len(exceptions)
+
+def get_schedule_exceptions(date_from=None):
+    """Mengambil entri kalender (opsional yang masih berlaku mulai tanggal tertentu)"""
+    conn = get_db_connection()
+    if date_from:
+        return conn.execute(
+            'SELECT * FROM schedule_exceptions WHERE end_date >= ? ORDER BY date, id',
+            (date_from,)
+        ).fetchall()
+    return conn.execute('SELECT * FROM schedule_exceptions ORDER BY date, id').fetchall()
+
+def delete_schedule_exception(exception_id):
+    """Hapus entri kalender"""
+    conn = get_db_connection()
+    conn.execute('DELETE FROM schedule_exceptions WHERE id = ?', (exception_id,))
+    _bump_schedules_version(conn)
+    conn.commit()
+
+# ===== LEDGER BEL =====
+
+# Waktu bunyi disimpan dalam waktu lokal, sama dengan jam di jadwal
+LEDGER_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+LEDGER_KEEP_DAYS = 14
+
+def ledger_id(schedule_id, exception_id=None):
+    """
+    Key bel di ledger: schedule_id untuk jadwal mingguan, -exception_id
+    untuk bel tambahan dari kalender (id jadwal selalu positif)
+    """
+    if schedule_id is not None:
+        return schedule_id
+    return -exception_id if exception_id is not None else None
+
+def record_bell_fire(schedule_id, fire_at, status):
+    """
+    Catat bahwa bel (schedule_id, fire_at) sudah ditangani; schedule_id
+    adalah ledger_id() (negatif untuk bel tambahan)
+    Status: success, failed, cancelled atau missed
+    """
+    conn = get_db_connection()
+    conn.execute('''
+        INSERT OR REPLACE INTO bell_ledger (schedule_id, fire_at, status)
+        VALUES (?, ?, ?)
+    ''', (schedule_id, fire_at.strftime(LEDGER_TIME_FORMAT), status))
+    conn.commit()
+
+def get_last_bell_fire():
+    """Waktu bel terakhir di ledger (datetime) atau None jika ledger kosong"""
+    conn = get_db_connection()
+    row = conn.execute('SELECT MAX(fire_at) AS fire_at FROM bell_ledger').fetchone()
+    if row['fire_at'] is None:
+        return None
+    return datetime.strptime(row['fire_at'], LEDGER_TIME_FORMAT)
+
+def get_bell_fires(start, end):
+    """Set (schedule_id, fire_at) di ledger untuk rentang waktu [start, end]"""
+    conn = get_db_connection()
+    rows = conn.execute('''
+        SELECT schedule_id, fire_at FROM bell_ledger
+        WHERE fire_at BETWEEN ? AND ?
+    ''', (start.strftime(LEDGER_TIME_FORMAT), end.strftime(LEDGER_TIME_FORMAT))).fetchall()
+    return {(row['schedule_id'], row['fire_at']) for row in rows}
+
+def prune_bell_ledger(before):
+    """Hapus entri ledger sebelum waktu tertentu"""
+    conn = get_db_connection()
+    cursor = conn.execute(
+        'DELETE FROM bell_ledger WHERE fire_at < ?',
+        (before.strftime(LEDGER_TIME_FORMAT),)
+    )
+    conn.commit()
+    return cursor.rowcount
+
+# ===== LEADER LEASE & PERINTAH KE LEADER =====
+
+def try_acquire_lease(name, owner, ttl, state=None):
+    """
+    Ambil atau perpanjang lease; berhasil jika lease kosong, sudah
+    kedaluwarsa, atau memang milik owner ini
+    Returns:
+        bool: True jika owner memegang lease sampai now + ttl
+    """
+    now = time.time()
+    conn = get_db_connection()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        row = conn.execute(
+            'SELECT owner, expires_at FROM leader_lease WHERE name = ?', (name,)
+        ).fetchone()
+        if row and row['owner'] != owner and row['expires_at'] > now:
+            conn.rollback()
+            return False
+        conn.execute('''
+            INSERT INTO leader_lease (name, owner, expires_at, acquired_at, state)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (name) DO UPDATE SET
+                owner = excluded.owner,
+                expires_at = excluded.expires_at,
+                acquired_at = CASE WHEN leader_lease.owner = excluded.owner
+                                   THEN leader_lease.acquired_at
+                                   ELSE excluded.acquired_at END,
+                state = excluded.state
+        ''', (name, owner, now + ttl, now, json.dumps(state) if state is not None else None))
+        conn.commit()
+        return True
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+
+def release_lease(name, owner):
+    """Lepas lease (hanya jika masih dipegang owner) supaya follower langsung mengambil alih"""
+    conn = get_db_connection()
+    conn.execute('DELETE FROM leader_lease WHERE name = ? AND owner = ?', (name, owner))
+    conn.commit()
+
+def get_lease(name):
+    """Lease saat ini sebagai dict (state sudah di-decode) atau None"""
+    conn = get_db_connection()
+    row = conn.execute('SELECT * FROM leader_lease WHERE name = ?', (name,)).fetchone()
+    if row is None:
+        return None
+    lease = dict(row)
+    lease['state'] = json.loads(lease['state']) if lease['state'] else None
+    return lease
+
+def add_leader_command(command, payload=None):
+    """Kirim perintah ke proses leader (dieksekusi pada poll berikutnya)"""
+    conn = get_db_connection()
+    conn.execute(
+        'INSERT INTO leader_commands (command, payload, created_at) VALUES (?, ?, ?)',
+        (command, json.dumps(payload or {}), time.time())
+    )
+    conn.commit()
+
+def take_leader_commands(max_age):
+    """
+    Ambil lalu hapus semua perintah dalam satu transaksi
+    Perintah yang lebih tua dari max_age detik dibuang (mis. play audio
+    yang dikirim saat belum ada leader)
+    Returns:
+        list: tuple (command, payload dict)
+    """
+    conn = get_db_connection()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        rows = conn.execute(
+            'SELECT id, command, payload, created_at FROM leader_commands ORDER BY id'
+        ).fetchall()
+        if rows:
+            conn.execute('DELETE FROM leader_commands WHERE id <= ?', (rows[-1]['id'],))
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    horizon = time.time() - max_age
+    return [
+        (row['command'], json.loads(row['payload'] or '{}'))
+        for row in rows if row['created_at'] >= horizon
+    ]
 
 # ===== FUNGSI UNTUK AUDIO FILES =====
 
-def add_audio_file(filename, display_name, file_path, duration=0):
-    """Menambah file audio ke database"""
+def add_audio_file(filename, display_name, file_path, duration=0, metadata=None):
+    """
+    Menambah file audio ke database
+    metadata: hasil audio_meta.probe() (duration di dalamnya dipakai jika ada)
+    """
+    metadata = metadata or {}
     conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute('''
-        INSERT INTO audio_files (filename, display_name, file_path, duration)
-        VALUES (?, ?, ?, ?)
-    ''', (filename, display_name, file_path, duration))
+        INSERT INTO audio_files (filename, display_name, file_path, duration,
+                                 format, sample_rate, channels, bitrate, file_size, file_mtime)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (filename, display_name, file_path, metadata.get('duration', duration),
+          metadata.get('format'), metadata.get('sample_rate'), metadata.get('channels'),
+          metadata.get('bitrate'), metadata.get('file_size'), metadata.get('file_mtime')))
+    _bump_audio_version(conn)
     conn.commit()
     audio_id = cursor.lastrowid
-    conn.close()
     return audio_id
 
+def get_audio_file(audio_id):
+    """Mengambil satu file audio berdasarkan ID"""
+    conn = get_db_connection()
+    return conn.execute('SELECT * FROM audio_files WHERE id = ?', (audio_id,)).fetchone()
+
+def update_audio_metadata(audio_id, metadata):
+    """Simpan hasil audio_meta.probe() untuk satu file audio"""
+    conn = get_db_connection()
+    conn.execute('''
+        UPDATE audio_files
+        SET duration = ?, format = ?, sample_rate = ?, channels = ?, bitrate = ?,
+            file_size = ?, file_mtime = ?
+        WHERE id = ?
+    ''', (metadata['duration'], metadata['format'], metadata['sample_rate'],
+          metadata['channels'], metadata['bitrate'], metadata['file_size'],
+          metadata['file_mtime'], audio_id))
+    _bump_audio_version(conn)
+    conn.commit()
+
 def get_all_audio_files():
     """Mengambil semua file audio"""
     conn = get_db_connection()
     audio_files = conn.execute('SELECT * FROM audio_files ORDER BY uploaded_at DESC').fetchall()
-    conn.close()
     return audio_files
 
+def get_audio_durations():
+    """Durasi audio per filename (detik, 0 jika belum diketahui)"""
+    conn = get_db_connection()
+    rows = conn.execute('SELECT filename, duration FROM audio_files').fetchall()
+    return {row['filename']: row['duration'] or 0 for row in rows}
+
+def get_audio_duration(filename):
+    """Durasi satu file audio (detik, 0 jika belum diketahui)"""
+    conn = get_db_connection()
+    row = conn.execute('SELECT duration FROM audio_files WHERE filename = ?', (filename,)).fetchone()
+    return (row['duration'] or 0) if row else 0
+
 def delete_audio_file(audio_id):
     """Hapus file audio dari database dan disk"""
     conn = get_db_connection()
@@ -177,52 +1170,589 @@ def delete_audio_file(audio_id):
             os.remove(audio['file_path'])
         # Hapus dari database
         conn.execute('DELETE FROM audio_files WHERE id = ?', (audio_id,))
+        _bump_audio_version(conn)
         conn.commit()
-    conn.close()
 
 # ===== FUNGSI UNTUK PLAY LOGS =====
 
-def add_play_log(schedule_id, audio_file, status, notes=''):
-    """Menambah log pemutaran"""
+# Kolom timing (migrasi 5); waktu disimpan dalam UTC dengan milidetik
+PLAY_LOG_TIMING_COLUMNS = [
+    ('scheduled_at', 'TEXT'),
+    ('callback_at', 'TEXT'),
+    ('audio_start_at', 'TEXT'),
+    ('latency_ms', 'REAL'),
+    ('backend', 'TEXT'),
+]
+
+PLAY_LOG_INSERT = '''
+    INSERT INTO play_logs (schedule_id, audio_file, played_at, status, notes,
+                           scheduled_at, callback_at, audio_start_at, latency_ms, backend)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+def _write_play_logs(rows):
+    """Menulis beberapa log sekaligus dalam satu transaksi"""
     conn = get_db_connection()
-    conn.execute('''
-        INSERT INTO play_logs (schedule_id, audio_file, status, notes)
-        VALUES (?, ?, ?, ?)
-    ''', (schedule_id, audio_file, status, notes))
-    conn.commit()
-    conn.close()
+    try:
+        conn.executemany(PLAY_LOG_INSERT, rows)
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+
+class PlayLogWriter:
+    """
+    Background writer untuk play_logs
+    Log dimasukkan ke antrian (bounded) lalu ditulis per batch saat
+    jumlahnya mencapai batch_size atau setelah flush_interval detik,
+    sehingga thread scheduler tidak menunggu commit/fsync
+    """
+    
+    def __init__(self, max_queue=1000, batch_size=50, flush_interval=1.0,
+                 enqueue_timeout=0.5):
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self._thread = None
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'enqueued': 0,
+            'written': 0,
+            'batches': 0,
+            'errors': 0,
+            'blocked': 0,          # submit harus menunggu karena antrian penuh
+            'overflow_writes': 0,  # antrian tetap penuh, ditulis langsung
+            'max_depth': 0,
+            'last_batch_size': 0,
+            'last_flush_ms': 0.0
+        }
+    
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+    
+    def start(self):
+        """Menjalankan thread writer"""
+        if self.is_running():
+            return
+        self._thread = threading.Thread(target=self._run, name='play-log-writer')
+        self._thread.daemon = True
+        self._thread.start()
+    
+    def submit(self, row):
+        """Masukkan satu log ke antrian"""
+        try:
+            self.queue.put_nowait(row)
+        except queue.Full:
+            self._bump('blocked')
+            try:
+                self.queue.put(row, timeout=self.enqueue_timeout)
+            except queue.Full:
+                # Backpressure: jangan buang log, tulis langsung di thread pemanggil
+                self._bump('overflow_writes')
+                _write_play_logs([row])
+                return
+        
+        depth = self.queue.qsize()
+        with self._stats_lock:
+            self._stats['enqueued'] += 1
+            if depth > self._stats['max_depth']:
+                self._stats['max_depth'] = depth
+    
+    def flush(self, timeout=5.0):
+        """Tunggu sampai semua log di antrian sudah ditulis"""
+        if not self.is_running():
+            return False
+        done = threading.Event()
+        try:
+            self.queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+    
+    def stop(self, timeout=5.0):
+        """Flush semua log lalu hentikan thread writer"""
+        if not self.is_running():
+            return
+        self.queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+        release_db_connection()
+    
+    def get_stats(self):
+        """Metrik antrian dan batch"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['depth'] = self.queue.qsize()
+        stats['capacity'] = self.max_queue
+        stats['running'] = self.is_running()
+        return stats
+    
+    def _bump(self, key, amount=1):
+        with self._stats_lock:
+            self._stats[key] += amount
+    
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = []
+            waiters = []
+            try:
+                item = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            
+            # Kumpulkan item sampai batch penuh atau interval habis
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is None:
+                    stopping = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    batch.append(item)
+                
+                if stopping or waiters or len(batch) >= self.batch_size:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            
+            if stopping:
+                # Ambil semua sisa antrian sebelum berhenti
+                while True:
+                    try:
+                        item = self.queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if isinstance(item, threading.Event):
+                        waiters.append(item)
+                    elif item is not None:
+                        batch.append(item)
+            
+            if batch:
+                self._write_batch(batch)
+            for waiter in waiters:
+                waiter.set()
+        
+        release_db_connection()
+    
+    def _write_batch(self, batch):
+        started = time.perf_counter()
+        for start in range(0, len(batch), self.batch_size):
+            chunk = batch[start:start + self.batch_size]
+            try:
+                _write_play_logs(chunk)
+                self._bump('written', len(chunk))
+            except sqlite3.Error as e:
+                self._bump('errors', len(chunk))
+                print(f"❌ Error writing play logs: {e}")
+        with self._stats_lock:
+            self._stats['batches'] += 1
+            self._stats['last_batch_size'] = len(batch)
+            self._stats['last_flush_ms'] = round((time.perf_counter() - started) * 1000, 2)
+
+
+# Global log writer instance
+play_log_writer = PlayLogWriter()
+
+def start_log_writer():
+    """Jalankan background log writer (flush otomatis saat proses keluar)"""
+    if play_log_writer.is_running():
+        return
+    play_log_writer.start()
+    atexit.register(play_log_writer.stop)
+
+def stop_log_writer():
+    """Flush dan hentikan background log writer"""
+    play_log_writer.stop()
+
+def format_log_time(value):
+    """datetime lokal/aware -> string UTC dengan milidetik untuk kolom timing"""
+    if value is None:
+        return None
+    return value.astimezone(timezone.utc).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+
+def add_play_log(schedule_id, audio_file, status, notes='', timing=None):
+    """
+    Menambah log pemutaran
+    Jika log writer berjalan, log diantrikan dan ditulis per batch;
+    jika tidak, langsung ditulis ke database
+    Args:
+        timing: dict opsional untuk bel terjadwal dengan key scheduled_at,
+                callback_at, audio_start_at (datetime), latency_ms, backend
+    """
+    # Sama dengan CURRENT_TIMESTAMP (UTC), diambil saat event terjadi
+    played_at = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+    timing = timing or {}
+    row = (schedule_id, audio_file, played_at, status, notes,
+           format_log_time(timing.get('scheduled_at')),
+           format_log_time(timing.get('callback_at')),
+           format_log_time(timing.get('audio_start_at')),
+           timing.get('latency_ms'),
+           timing.get('backend'))
+    if play_log_writer.is_running():
+        play_log_writer.submit(row)
+    else:
+        _write_play_logs([row])
 
 def get_recent_logs(limit=50):
     """Mengambil log pemutaran terbaru"""
+    logs, _ = get_logs_page(limit)
+    return logs
+
+LOG_SELECT = '''
+    SELECT l.*, s.name as schedule_name
+    FROM play_logs l
+    LEFT JOIN schedules s ON l.schedule_id = s.id
+'''
+
+def encode_log_cursor(log):
+    """Cursor pagination dari (played_at, id) sebuah log"""
+    raw = f"{log['played_at']}|{log['id']}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_log_cursor(cursor):
+    """
+    Kebalikan dari encode_log_cursor
+    Raises:
+        ValueError: jika cursor tidak valid
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        played_at, log_id = base64.urlsafe_b64decode(padded).decode().rsplit('|', 1)
+        return played_at, int(log_id)
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+def _log_filters(status=None, schedule_id=None, date_from=None, date_to=None):
+    """
+    Membuat klausa WHERE untuk filter log
+    date_from/date_to dalam format YYYY-MM-DD (inklusif, hari lokal; played_at
+    disimpan dalam UTC, batasnya sama dengan get_daily_stats)
+    """
+    clauses = []
+    params = []
+    if status:
+        clauses.append('l.status = ?')
+        params.append(status)
+    if schedule_id is not None:
+        clauses.append('l.schedule_id = ?')
+        params.append(schedule_id)
+    if date_from:
+        start, _ = _local_day_bounds(datetime.strptime(date_from, '%Y-%m-%d').date())
+        clauses.append('l.played_at >= ?')
+        params.append(start)
+    if date_to:
+        _, end = _local_day_bounds(datetime.strptime(date_to, '%Y-%m-%d').date())
+        clauses.append('l.played_at < ?')
+        params.append(end)
+    return clauses, params
+
+def get_logs_page(limit=50, cursor=None, status=None, schedule_id=None,
+                  date_from=None, date_to=None):
+    """
+    Mengambil satu halaman log (terbaru dulu) dengan keyset pagination
+    Args:
+        cursor: nilai next_cursor dari halaman sebelumnya
+    Returns:
+        tuple: (logs, next_cursor) - next_cursor None jika sudah habis
+    """
+    clauses, params = _log_filters(status, schedule_id, date_from, date_to)
+    if cursor:
+        clauses.append('(l.played_at, l.id) < (?, ?)')
+        params.extend(decode_log_cursor(cursor))
+    
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
     conn = get_db_connection()
-    logs = conn.execute('''
-        SELECT l.*, s.name as schedule_name
-        FROM play_logs l
-        LEFT JOIN schedules s ON l.schedule_id = s.id
-        ORDER BY l.played_at DESC
+    logs = conn.execute(f'''
+        {LOG_SELECT}
+        {where}
+        ORDER BY l.played_at DESC, l.id DESC
         LIMIT ?
-    ''', (limit,)).fetchall()
-    conn.close()
-    return logs
+    ''', params + [limit + 1]).fetchall()
+    
+    next_cursor = None
+    if len(logs) > limit:
+        logs = logs[:limit]
+        next_cursor = encode_log_cursor(logs[-1])
+    return logs, next_cursor
+
+def iter_logs(status=None, schedule_id=None, date_from=None, date_to=None,
+              chunk_size=500):
+    """
+    Generator semua log (terlama dulu) untuk export
+    Memakai koneksi sendiri dan fetchmany, jadi memori tetap konstan
+    berapapun jumlah barisnya
+    """
+    clauses, params = _log_filters(status, schedule_id, date_from, date_to)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+    conn = _create_connection()
+    try:
+        cursor = conn.execute(f'''
+            {LOG_SELECT}
+            {where}
+            ORDER BY l.played_at, l.id
+        ''', params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            for row in rows:
+                yield row
+    finally:
+        conn.close()
+
+# ===== RETENTION & ROLLUP PLAY LOGS =====
+
+ARCHIVE_DIR = 'database/archive'
+
+def _local_day_bounds(day):
+    """
+    Batas satu hari lokal dalam format played_at (UTC)
+    Returns:
+        tuple: (start, end) string 'YYYY-MM-DD HH:MM:SS', end eksklusif
+    """
+    start = datetime.combine(day, datetime.min.time()).astimezone(timezone.utc)
+    end = datetime.combine(day + timedelta(days=1), datetime.min.time()).astimezone(timezone.utc)
+    fmt = '%Y-%m-%d %H:%M:%S'
+    return start.strftime(fmt), end.strftime(fmt)
+
+def _rolled_through():
+    """Hari terakhir yang sudah masuk rollup (date) atau None"""
+    value = get_setting('log_rollup_through')
+    return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+
+def rollup_play_logs(through_day=None):
+    """
+    Rollup play_logs ke play_log_daily untuk setiap hari yang sudah lewat
+    dan belum di-rollup. Satu transaksi pendek per hari.
+    Args:
+        through_day: hari terakhir yang di-rollup (default: kemarin)
+    Returns:
+        int: jumlah hari yang di-rollup
+    """
+    through_day = through_day or (datetime.now().date() - timedelta(days=1))
+    conn = get_db_connection()
+    
+    last = _rolled_through()
+    if last is None:
+        first = conn.execute('SELECT MIN(played_at) AS first FROM play_logs').fetchone()['first']
+        if first is None:
+            return 0
+        first_utc = datetime.strptime(first[:19], '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+        day = first_utc.astimezone().date()
+    else:
+        day = last + timedelta(days=1)
+    
+    rolled = 0
+    while day <= through_day:
+        start, end = _local_day_bounds(day)
+        conn.execute('DELETE FROM play_log_daily WHERE day = ?', (day.isoformat(),))
+        conn.execute('''
+            INSERT INTO play_log_daily (day, schedule_id, audio_file, status, count)
+            SELECT ?, COALESCE(schedule_id, 0), audio_file, status, COUNT(*)
+            FROM play_logs
+            WHERE played_at >= ? AND played_at < ?
+            GROUP BY COALESCE(schedule_id, 0), audio_file, status
+        ''', (day.isoformat(), start, end))
+        conn.commit()
+        update_setting('log_rollup_through', day.isoformat())
+        day += timedelta(days=1)
+        rolled += 1
+    return rolled
+
+def _archive_play_logs(rows):
+    """Tambahkan log ke file arsip gzip NDJSON per bulan"""
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    by_month = {}
+    for row in rows:
+        by_month.setdefault(row['played_at'][:7], []).append(row)
+    for month, month_rows in by_month.items():
+        path = os.path.join(ARCHIVE_DIR, f"play_logs_{month}.ndjson.gz")
+        with gzip.open(path, 'at', encoding='utf-8') as f:
+            for row in month_rows:
+                f.write(json.dumps(dict(row)) + '\n')
+
+def prune_play_logs(before, batch_size=500, archive=False, pause=0.05):
+    """
+    Hapus play_logs dengan played_at < before (string UTC) per batch kecil,
+    supaya write lock tidak ditahan lama
+    Returns:
+        int: jumlah baris yang dihapus
+    """
+    conn = get_db_connection()
+    deleted = 0
+    while True:
+        rows = conn.execute('''
+            SELECT * FROM play_logs
+            WHERE played_at < ?
+            ORDER BY played_at, id
+            LIMIT ?
+        ''', (before, batch_size)).fetchall()
+        if not rows:
+            break
+        if archive:
+            _archive_play_logs(rows)
+        ids = [row['id'] for row in rows]
+        conn.execute(
+            f"DELETE FROM play_logs WHERE id IN ({','.join('?' * len(ids))})", ids
+        )
+        conn.commit()
+        deleted += len(ids)
+        time.sleep(pause)
+    return deleted
+
+def run_log_retention():
+    """
+    Job retention harian: rollup hari yang sudah lewat, lalu hapus (atau
+    arsipkan) log mentah yang lebih tua dari log_retention_days
+    Log hanya dihapus jika harinya sudah masuk rollup
+    """
+    rolled = rollup_play_logs()
+    prune_bell_ledger(datetime.now() - timedelta(days=LEDGER_KEEP_DAYS))
+    
+    retention_days = int(get_setting('log_retention_days') or 0)
+    last = _rolled_through()
+    if retention_days <= 0 or last is None:
+        return {'rolled_days': rolled, 'pruned': 0}
+    
+    horizon = min(datetime.now().date() - timedelta(days=retention_days),
+                  last + timedelta(days=1))
+    before, _ = _local_day_bounds(horizon)
+    pruned = prune_play_logs(before, archive=get_setting('log_archive') == '1')
+    if rolled or pruned:
+        print(f"🧹 Log retention: {rolled} hari di-rollup, {pruned} log dihapus")
+    return {'rolled_days': rolled, 'pruned': pruned}
+
+def get_daily_stats(date_from, date_to):
+    """
+    Statistik pemutaran per hari (YYYY-MM-DD, inklusif)
+    Hari yang sudah di-rollup dibaca dari play_log_daily, sisanya
+    (biasanya hari ini) dihitung dari play_logs
+    Returns:
+        list: dict {day, status, count}
+    """
+    conn = get_db_connection()
+    stats = [dict(row) for row in conn.execute('''
+        SELECT day, status, SUM(count) AS count
+        FROM play_log_daily
+        WHERE day >= ? AND day <= ?
+        GROUP BY day, status
+    ''', (date_from, date_to)).fetchall()]
+    
+    live_from = datetime.strptime(date_from, '%Y-%m-%d').date()
+    last = _rolled_through()
+    if last is not None:
+        live_from = max(live_from, last + timedelta(days=1))
+    live_to = datetime.strptime(date_to, '%Y-%m-%d').date()
+    if live_from <= live_to:
+        start, _ = _local_day_bounds(live_from)
+        _, end = _local_day_bounds(live_to)
+        stats.extend(dict(row) for row in conn.execute('''
+            SELECT date(played_at, 'localtime') AS day, status, COUNT(*) AS count
+            FROM play_logs
+            WHERE played_at >= ? AND played_at < ?
+            GROUP BY day, status
+        ''', (start, end)).fetchall())
+    
+    stats.sort(key=lambda row: (row['day'], row['status']))
+    return stats
 
 # ===== FUNGSI UNTUK SETTINGS =====
 
-def get_setting(key):
-    """Mengambil nilai setting"""
+def load_settings_cache():
+    """Memuat semua settings dari database ke cache memori"""
+    global _settings_cache
     conn = get_db_connection()
-    result = conn.execute('SELECT value FROM settings WHERE key = ?', (key,)).fetchone()
-    conn.close()
-    return result['value'] if result else None
+    rows = conn.execute('SELECT key, value FROM settings').fetchall()
+    with _settings_lock:
+        _settings_cache = {row['key']: row['value'] for row in rows}
+    return dict(_settings_cache)
 
-def update_setting(key, value):
-    """Update setting"""
+def refresh_settings_cache():
+    """
+    Muat ulang cache dari database (perubahan dari proses lain) dan
+    panggil subscriber untuk setiap key yang nilainya berubah
+    Returns:
+        list: key yang berubah
+    """
+    global _settings_cache
     conn = get_db_connection()
-    conn.execute('''
-        INSERT OR REPLACE INTO settings (key, value, updated_at)
-        VALUES (?, ?, CURRENT_TIMESTAMP)
-    ''', (key, value))
-    conn.commit()
-    conn.close()
+    rows = conn.execute('SELECT key, value FROM settings').fetchall()
+    fresh = {row['key']: row['value'] for row in rows}
+    with _settings_lock:
+        old = _settings_cache or {}
+        _settings_cache = fresh
+        changed = [key for key, value in fresh.items() if old.get(key) != value]
+        listeners = [(key, list(_settings_listeners.get(key, ()))) for key in changed]
+    
+    for key, callbacks in listeners:
+        for callback in callbacks:
+            try:
+                callback(key, fresh[key])
+            except Exception as e:
+                print(f"❌ Error in setting listener for '{key}': {e}")
+    return changed
+
+def get_setting(key):
+    """Mengambil nilai setting (dari cache, tanpa query ke database)"""
+    if _settings_cache is None:
+        load_settings_cache()
+    return _settings_cache.get(key)
+
+def get_all_settings():
+    """Mengambil salinan semua settings dari cache"""
+    if _settings_cache is None:
+        load_settings_cache()
+    with _settings_lock:
+        return dict(_settings_cache)
+
+def update_setting(key, value):
+    """
+    Update setting
+    Database dan cache diupdate di bawah lock yang sama, lalu semua
+    subscriber untuk key ini dipanggil jika nilainya berubah
+    """
+    if _settings_cache is None:
+        load_settings_cache()
+    with _settings_lock:
+        conn = get_db_connection()
+        conn.execute('''
+            INSERT OR REPLACE INTO settings (key, value, updated_at)
+            VALUES (?, ?, CURRENT_TIMESTAMP)
+        ''', (key, value))
+        conn.commit()
+        old_value = _settings_cache.get(key)
+        _settings_cache[key] = value
+        listeners = list(_settings_listeners.get(key, ()))
+    
+    if old_value != value:
+        for callback in listeners:
+            try:
+                callback(key, value)
+            except Exception as e:
+                print(f"❌ Error in setting listener for '{key}': {e}")
+
+def subscribe_setting(key, callback):
+    """
+    Daftarkan callback(key, value) yang dipanggil saat setting berubah
+    Returns:
+        function: panggil untuk berhenti berlangganan
+    """
+    with _settings_lock:
+        _settings_listeners.setdefault(key, []).append(callback)
+    
+    def unsubscribe():
+        with _settings_lock:
+            if callback in _settings_listeners.get(key, []):
+                _settings_listeners[key].remove(callback)
+    return unsubscribe
 
 # Script untuk testing jika file ini dijalankan langsung
 if __name__ == '__main__':
@@ -0,0 +1,347 @@
+"""
+Dispatcher Module untuk School Bell System
+Engine alternatif untuk BellScheduler: satu thread dengan min-heap waktu
+bel berikutnya, tidur sampai entri paling awal lalu membunyikan semua
+bel yang jatuh tempo pada saat itu sekaligus
+Selain bel, heap juga memegang timer (sekali jalan atau harian) untuk
+bel tambahan, pre-warm dan job maintenance, jadi engine ini tidak butuh
+APScheduler dan bisa dijalankan dengan jam virtual (lihat run_until)
+"""
+
+import heapq
+import itertools
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import clock
+import database
+import latency
+import timeline
+
+# Tidur panjang dipecah supaya lompatan jam sistem (NTP) cepat terlihat
+MAX_SLEEP = 30.0
+# Selisih wall clock vs monotonic selama satu tidur yang dianggap lompatan jam
+CLOCK_STEP_THRESHOLD = 0.5
+
+
+def next_occurrence(schedule, after):
+    """
+    Waktu bunyi berikutnya (datetime) untuk jadwal setelah waktu after
+    Returns:
+        datetime atau None jika jadwal tidak punya hari
+    """
+    days = database.mask_to_days(schedule['days_mask'])
+    if not days:
+        return None
+    second = timeline.parse_seconds(schedule['time'])
+    midnight = datetime.combine(after.date(), datetime.min.time())
+    for offset in range(8):
+        day = midnight + timedelta(days=offset)
+        if day.weekday() not in days:
+            continue
+        at = day + timedelta(seconds=second)
+        if at > after:
+            return at
+    return None
+
+
+def next_daily(hour, minute, second, after):
+    """Waktu harian berikutnya (jam:menit:detik) setelah after"""
+    at = after.replace(hour=hour, minute=minute, second=second, microsecond=0)
+    if at <= after:
+        at += timedelta(days=1)
+    return at
+
+
+class Timer:
+    """
+    Entri heap non-jadwal: func(*args) dipanggil sekali pada waktunya
+    - daily: (jam, menit, detik) untuk timer yang diulang setiap hari
+    - missed: dipanggil (dengan args yang sama) menggantikan func jika
+      terlambat lebih dari misfire_grace_time; None = selalu dijalankan
+    """
+
+    def __init__(self, func, args=(), daily=None, missed=None):
+        self.func = func
+        self.args = tuple(args)
+        self.daily = daily
+        self.missed = missed
+
+
+class HeapDispatcher:
+    """
+    Min-heap berisi satu entri per jadwal: [fire_at, seq, key, payload]
+    (payload = dict jadwal atau Timer; key = schedule_id atau nama timer)
+    Semantik misfire mengikuti APScheduler: bel yang terlambat lebih dari
+    misfire_grace_time detik dilewati (dilaporkan ke missed_callback jika
+    ada), dan run yang tertinggal digabung (coalesce) menjadi satu
+    Thread tidur dengan timeout monotonic (maks MAX_SLEEP) lalu selalu
+    menghitung ulang sisa waktu dari wall clock sebelum membunyikan bel,
+    jadi lompatan jam sistem dikoreksi dan tercatat di get_stats()
+    """
+
+    def __init__(self, fire_callback, misfire_grace_time=1, max_workers=10,
+                 missed_callback=None):
+        self.fire_callback = fire_callback
+        self.missed_callback = missed_callback
+        self.misfire_grace_time = misfire_grace_time
+        self.executor = ThreadPoolExecutor(max_workers=max_workers,
+                                           thread_name_prefix='bell-dispatch')
+        self._heap = []
+        self._entries = {}  # key -> entri aktif di heap
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+        # Offset bel (wall clock saat dispatch - waktu jadwal) untuk verifikasi
+        self._offsets = deque(maxlen=500)
+        self._fires = 0
+        self._clock_steps = 0
+        self._last_clock_step = None
+
+    def start(self):
+        """
+        Menjalankan thread dispatcher
+        Dengan jam virtual tidak ada thread; waktu dimajukan lewat run_until()
+        """
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        if clock.is_virtual():
+            return
+        self._thread = threading.Thread(target=self._run, name='bell-dispatcher')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Menghentikan thread dispatcher dan executor"""
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread:
+            self._thread.join(5)
+            self._thread = None
+        self.executor.shutdown(wait=False)
+
+    def load(self, schedules, now=None):
+        """Ganti seluruh jadwal di heap dengan jadwal baru (satu kali swap, timer tetap)"""
+        # Heap dibangun di bawah lock: jika dilepas, bel/timer yang dijalankan
+        # thread dispatcher di antaranya akan kembali dengan deadline lama
+        with self._cond:
+            now = now or clock.now()
+            entries = {key: entry for key, entry in self._entries.items()
+                       if isinstance(entry[3], Timer)}
+            for schedule in schedules:
+                entry = self._make_entry(schedule, now)
+                if entry:
+                    entries[schedule['id']] = entry
+            heap = list(entries.values())
+            heapq.heapify(heap)
+            self._heap = heap
+            self._entries = entries
+            self._cond.notify()
+
+    def add(self, schedule, now=None):
+        """Tambah atau ganti satu jadwal"""
+        entry = self._make_entry(schedule, now or clock.now())
+        if entry is None:
+            self.remove(schedule['id'])
+            return False
+        self._push(schedule['id'], entry)
+        return True
+
+    def call_at(self, key, when, func, args=(), missed=None):
+        """Timer sekali jalan pada datetime when (menggantikan timer dengan key sama)"""
+        self._push(key, [when.timestamp(), next(self._seq), key, Timer(func, args, missed=missed)])
+
+    def call_daily(self, key, hour, minute, func, second=0, args=()):
+        """Timer harian pada jam:menit:detik"""
+        at = next_daily(hour, minute, second, clock.now())
+        timer = Timer(func, args, daily=(hour, minute, second))
+        self._push(key, [at.timestamp(), next(self._seq), key, timer])
+
+    def remove(self, key):
+        """Hapus satu jadwal atau timer dari heap"""
+        with self._cond:
+            return self._cancel(key)
+
+    def timer_keys(self, prefix=''):
+        """Key timer aktif yang diawali prefix"""
+        with self._cond:
+            return [key for key, entry in self._entries.items()
+                    if isinstance(entry[3], Timer) and str(key).startswith(prefix)]
+
+    def next_run_time(self, key):
+        """Waktu bunyi berikutnya untuk jadwal/timer (datetime) atau None"""
+        entry = self._entries.get(key)
+        return datetime.fromtimestamp(entry[0]) if entry else None
+
+    def next_fire_time(self):
+        """Waktu entri paling awal (jadwal atau timer) atau None"""
+        with self._cond:
+            self._drop_cancelled()
+            return datetime.fromtimestamp(self._heap[0][0]) if self._heap else None
+
+    def get_stats(self):
+        """Jumlah bel, percentile offset dispatch (ms) dan lompatan jam yang terdeteksi"""
+        with self._cond:
+            offsets = sorted(self._offsets)
+            stats = {
+                'fires': self._fires,
+                'clock_steps': self._clock_steps,
+                'last_clock_step': self._last_clock_step
+            }
+        stats['offset_ms'] = {'samples': len(offsets)}
+        for pct in latency.PERCENTILES:
+            stats['offset_ms'][f'p{pct}'] = latency.percentile(offsets, pct)
+        stats['offset_ms']['min'] = offsets[0] if offsets else None
+        stats['offset_ms']['max'] = offsets[-1] if offsets else None
+        return stats
+
+    def pending(self):
+        """Semua jadwal aktif urut waktu: list (datetime, schedule)"""
+        with self._cond:
+            entries = sorted(e for e in self._heap if isinstance(e[3], dict))
+        return [(datetime.fromtimestamp(e[0]), e[3]) for e in entries]
+
+    def run_until(self, until):
+        """
+        Jalankan semua entri sampai datetime until secara sinkron (jam virtual):
+        jam dipindah ke waktu tiap entri lalu callback dipanggil langsung
+        di thread ini, jadi urutan dan hasilnya deterministik
+        Returns:
+            int: jumlah callback yang dipanggil
+        """
+        until_ts = until.timestamp()
+        calls = 0
+        while True:
+            with self._cond:
+                self._drop_cancelled()
+                if not self._heap or self._heap[0][0] > until_ts:
+                    break
+                fire_ts = max(self._heap[0][0], clock.timestamp())
+                if clock.is_virtual():
+                    clock.active_clock.set(datetime.fromtimestamp(fire_ts))
+                due = self._dispatch_due(fire_ts)
+            for callback, args in due:
+                callback(*args)
+                calls += 1
+        if clock.is_virtual() and clock.timestamp() < until_ts:
+            clock.active_clock.set(until)
+        return calls
+
+    def _push(self, key, entry):
+        with self._cond:
+            self._cancel(key)
+            self._entries[key] = entry
+            heapq.heappush(self._heap, entry)
+            # Bangunkan thread jika entri ini menjadi yang paling awal
+            if self._heap[0] is entry:
+                self._cond.notify()
+
+    def _make_entry(self, schedule, now):
+        at = next_occurrence(schedule, now)
+        if at is None:
+            return None
+        return [at.timestamp(), next(self._seq), schedule['id'], schedule]
+
+    def _cancel(self, key):
+        # Lazy deletion: entri ditandai batal dan dibuang saat sampai di puncak heap
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        entry[3] = None
+        return True
+
+    def _drop_cancelled(self):
+        while self._heap and self._heap[0][3] is None:
+            heapq.heappop(self._heap)
+
+    def _run(self):
+        with self._cond:
+            while self._running:
+                self._drop_cancelled()
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+
+                wall = clock.timestamp()
+                delay = self._heap[0][0] - wall
+                if delay > 0:
+                    # Condition.wait memakai clock monotonic untuk timeout;
+                    # sesudahnya sisa waktu dihitung ulang dari wall clock
+                    mono = clock.monotonic()
+                    self._cond.wait(min(delay, MAX_SLEEP))
+                    self._check_clock_step(wall, mono)
+                    continue
+
+                for callback, args in self._dispatch_due(wall):
+                    self.executor.submit(callback, *args)
+
+    def _check_clock_step(self, wall_before, mono_before):
+        """Bandingkan waktu berlalu versi wall clock dan monotonic (dipanggil dengan _cond terkunci)"""
+        step = (clock.timestamp() - wall_before) - (clock.monotonic() - mono_before)
+        if abs(step) < CLOCK_STEP_THRESHOLD:
+            return
+        self._clock_steps += 1
+        self._last_clock_step = {
+            'at': clock.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'seconds': round(step, 3)
+        }
+        print(f"⏱️  Jam sistem melompat {step:+.3f}s - jadwal dihitung ulang dari wall clock")
+
+    def _dispatch_due(self, now_ts):
+        """
+        Pop semua entri yang jatuh tempo (dipanggil dengan _cond terkunci)
+        Returns:
+            list: (callback, args) untuk dijalankan bersamaan
+        """
+        due = []
+        while self._heap and self._heap[0][0] <= now_ts:
+            entry = heapq.heappop(self._heap)
+            payload = entry[3]
+            if payload is None:
+                continue
+            due.append((entry[0], entry[2], payload))
+
+            # Jadwalkan kemunculan berikutnya (run yang tertinggal digabung)
+            del self._entries[entry[2]]
+            after = datetime.fromtimestamp(max(now_ts, entry[0]))
+            if isinstance(payload, Timer):
+                next_entry = None
+                if payload.daily:
+                    at = next_daily(*payload.daily, after)
+                    next_entry = [at.timestamp(), next(self._seq), entry[2], payload]
+            else:
+                next_entry = self._make_entry(payload, after)
+            if next_entry:
+                self._entries[entry[2]] = next_entry
+                heapq.heappush(self._heap, next_entry)
+
+        calls = []
+        for fire_ts, key, payload in due:
+            lateness = now_ts - fire_ts
+            late = lateness > self.misfire_grace_time
+            if isinstance(payload, Timer):
+                if late and payload.missed:
+                    calls.append((payload.missed, payload.args))
+                else:
+                    calls.append((payload.func, payload.args))
+                continue
+
+            self._fires += 1
+            self._offsets.append(round(lateness * 1000, 3))
+            callback = self.fire_callback
+            if late:
+                print(f"⚠️  Run time of '{payload['name']}' was missed by "
+                      f"{lateness:.1f}s - dilewati")
+                if self.missed_callback is None:
+                    continue
+                callback = self.missed_callback
+            calls.append((callback, (
+                payload['id'], payload['audio_file'], payload['name'],
+                datetime.fromtimestamp(fire_ts)
+            )))
+        return calls
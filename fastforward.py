@@ -0,0 +1,251 @@
+"""
+Fast-forward Harness untuk School Bell System
+Menjalankan scheduler (engine heap) dengan jam virtual di salinan
+database, jadi satu minggu jadwal selesai dalam hitungan detik. Bel yang
+benar-benar dibunyikan dibandingkan dengan hasil simulate.py sehingga
+firing, libur dan catch-up bisa dicek otomatis (exit code 1 jika ada
+selisih). --bench mengukur overhead dispatch per bel
+
+CLI:
+    python fastforward.py --start 2026-11-02 --days 7
+    python fastforward.py --start 2026-11-02 --outage 2026-11-03T07:40 30
+    python fastforward.py --bench 5000
+
+Regression test (fixture tetap, tanpa selisih): python -m unittest discover -s tests
+"""
+
+import os
+
+# Harness jalan di CI/server tanpa sound card
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import argparse
+import json
+import random
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+import clock
+import database
+import scheduler
+import simulate
+from dispatcher import HeapDispatcher
+
+RANG_STATUSES = ('success', 'failed')
+
+
+def prepare_database(source=None):
+    """
+    Salin database ke file sementara dan kosongkan log, ledger dan lease
+    supaya hasil harness hanya berisi bel dari run ini
+    Returns:
+        str: path database salinan
+    """
+    source = source or database.DATABASE_PATH
+    workdir = tempfile.mkdtemp(prefix='school_bell_ff_')
+    path = os.path.join(workdir, 'school_bell.db')
+    shutil.copy(source, path)
+    # Koneksi di pool masih menunjuk database lama
+    database.close_all_connections()
+    database.DATABASE_PATH = path
+    database.init_db()
+    database.invalidate_schedules()
+    conn = database.get_db_connection()
+    for table in ('play_logs', 'bell_ledger', 'leader_lease', 'leader_commands'):
+        conn.execute(f'DELETE FROM {table}')
+    conn.commit()
+    return path
+
+
+def read_fires():
+    """Hasil bel terjadwal dari play_logs: list dict (at, schedule_id, audio_file, status)"""
+    conn = database.get_db_connection()
+    rows = conn.execute('''
+        SELECT schedule_id, audio_file, status, scheduled_at FROM play_logs
+        WHERE scheduled_at IS NOT NULL
+        ORDER BY scheduled_at, id
+    ''').fetchall()
+    fires = []
+    for row in rows:
+        at = datetime.strptime(row['scheduled_at'], '%Y-%m-%d %H:%M:%S.%f')
+        at = at.replace(tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+        fires.append({
+            'at': at,
+            'schedule_id': row['schedule_id'],
+            'audio_file': row['audio_file'],
+            'status': row['status']
+        })
+    return fires
+
+
+def run(start, days=7, outages=()):
+    """
+    Fast-forward scheduler dari tengah malam tanggal start selama N hari
+    Args:
+        outages: list (datetime mulai, menit) saat scheduler dimatikan;
+                 setelahnya scheduler dijalankan ulang dan ledger direkonsiliasi
+    Returns:
+        dict: jumlah bel per status, selisih dengan simulasi, waktu eksekusi
+    """
+    begin = datetime.combine(start, datetime.min.time())
+    end = begin + timedelta(days=days) - timedelta(seconds=1)
+    previous_clock = clock.set_clock(clock.VirtualClock(begin))
+    started = time.perf_counter()
+    try:
+        bell_scheduler = scheduler.init_scheduler('heap')
+        windows = []
+        for outage_start, minutes in sorted(outages):
+            outage_end = outage_start + timedelta(minutes=minutes)
+            bell_scheduler.dispatcher.run_until(outage_start)
+            print(f"🔌 Scheduler mati {outage_start:%Y-%m-%d %H:%M} ({minutes} menit)")
+            scheduler.stop_scheduler()
+            clock.active_clock.set(outage_end)
+            bell_scheduler = scheduler.init_scheduler('heap')
+            windows.append((outage_start, outage_end))
+        bell_scheduler.dispatcher.run_until(end)
+        scheduler.stop_scheduler()
+    finally:
+        clock.set_clock(previous_clock)
+    elapsed = time.perf_counter() - started
+
+    fires = read_fires()
+    expected = simulate.simulate(start, end.date(), include_events=True)['events']
+    return compare(fires, expected, windows, elapsed)
+
+
+def compare(fires, expected, windows, elapsed):
+    """Bandingkan bel yang berbunyi dengan simulasi; bel di jendela outage boleh missed"""
+    def in_outage(at):
+        return any(window_start < at <= window_end for window_start, window_end in windows)
+
+    def key(at, audio_file):
+        return (at.replace(microsecond=0), audio_file)
+
+    rang = {key(f['at'], f['audio_file']): f for f in fires if f['status'] in RANG_STATUSES}
+    wanted = {key(datetime.fromisoformat(e['at']), e['audio_file']): e for e in expected}
+
+    missing = [
+        {'at': at.isoformat(), 'audio_file': audio_file, 'name': wanted[(at, audio_file)]['name']}
+        for at, audio_file in sorted(set(wanted) - set(rang)) if not in_outage(at)
+    ]
+    unexpected = [
+        {'at': at.isoformat(), 'audio_file': audio_file, 'status': rang[(at, audio_file)]['status']}
+        for at, audio_file in sorted(set(rang) - set(wanted))
+    ]
+    statuses = {}
+    for fire in fires:
+        statuses[fire['status']] = statuses.get(fire['status'], 0) + 1
+
+    return {
+        'expected': len(wanted),
+        'statuses': statuses,
+        'outage_missed': sum(1 for f in fires if f['status'] == 'missed' and in_outage(f['at'])),
+        'missing': missing,
+        'unexpected': unexpected,
+        'elapsed_ms': round(elapsed * 1000, 1),
+        'ms_per_fire': round(elapsed * 1000 / len(fires), 3) if fires else None
+    }
+
+
+def bench(count=1000, days=7, seed=1):
+    """
+    Overhead dispatch murni: count jadwal acak (tiap hari kerja) di
+    HeapDispatcher dengan jam virtual dan callback kosong
+    Returns:
+        dict: jumlah bel dan mikrodetik per bel
+    """
+    rng = random.Random(seed)
+    begin = datetime.combine(datetime.now().date(), datetime.min.time())
+    previous_clock = clock.set_clock(clock.VirtualClock(begin))
+    try:
+        fired = []
+        dispatcher = HeapDispatcher(lambda *args: fired.append(args[0]))
+        dispatcher.load([
+            {
+                'id': index,
+                'name': f'bench_{index}',
+                'audio_file': 'bench.wav',
+                'days_mask': 0b11111,
+                'time': f'{rng.randrange(24):02d}:{rng.randrange(60):02d}'
+            }
+            for index in range(count)
+        ])
+        dispatcher.start()
+        started = time.perf_counter()
+        dispatcher.run_until(begin + timedelta(days=days))
+        elapsed = time.perf_counter() - started
+        dispatcher.stop()
+    finally:
+        clock.set_clock(previous_clock)
+    return {
+        'schedules': count,
+        'days': days,
+        'fires': len(fired),
+        'elapsed_ms': round(elapsed * 1000, 1),
+        'us_per_fire': round(elapsed * 1e6 / len(fired), 2) if fired else None
+    }
+
+
+def parse_outage(values):
+    try:
+        return datetime.fromisoformat(values[0]), int(values[1])
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'Outage tidak valid: {" ".join(values)}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Fast-forward scheduler dengan jam virtual')
+    parser.add_argument('--start', type=simulate.parse_date,
+                        default=datetime.now().date(), help='Tanggal mulai (YYYY-MM-DD)')
+    parser.add_argument('--days', type=int, default=7, help='Jumlah hari')
+    parser.add_argument('--db', help='Database sumber (default: database aplikasi)')
+    parser.add_argument('--outage', nargs=2, action='append', default=[],
+                        metavar=('MULAI', 'MENIT'),
+                        help='Matikan scheduler, mis. 2026-11-03T07:40 30 (boleh berulang)')
+    parser.add_argument('--bench', type=int, metavar='JADWAL',
+                        help='Hanya benchmark overhead dispatch dengan N jadwal')
+    parser.add_argument('--json', action='store_true', help='Output JSON')
+    args = parser.parse_args(argv)
+
+    if args.bench:
+        result = bench(args.bench, args.days)
+        if args.json:
+            print(json.dumps(result, indent=2))
+        else:
+            print(f"\n⏱️  {result['fires']} bel dari {result['schedules']} jadwal "
+                  f"({result['days']} hari) dalam {result['elapsed_ms']} ms "
+                  f"= {result['us_per_fire']} µs/bel")
+        return 0
+
+    try:
+        outages = [parse_outage(values) for values in args.outage]
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+    path = prepare_database(args.db)
+    print(f"📁 Database harness: {path}")
+    result = run(args.start, args.days, outages)
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"\n⏩ Fast-forward {args.start} + {args.days} hari")
+        print("=" * 60)
+        print(f"🔔 Bel diharapkan : {result['expected']}")
+        for status, total in sorted(result['statuses'].items()):
+            print(f"   {status:<14}: {total}")
+        if outages:
+            print(f"🔌 Missed saat outage: {result['outage_missed']}")
+        print(f"⏱️  Waktu eksekusi  : {result['elapsed_ms']} ms "
+              f"({result['ms_per_fire']} ms/bel)")
+        print(f"\n❓ Tidak berbunyi ({len(result['missing'])}):")
+        for item in result['missing']:
+            print(f"  {item['at']}  {item['name']} ({item['audio_file']})")
+        print(f"\n❗ Tidak diharapkan ({len(result['unexpected'])}):")
+        for item in result['unexpected']:
+            print(f"  {item['at']}  {item['audio_file']} ({item['status']})")
+    return 1 if result['missing'] or result['unexpected'] else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,90 @@
+"""
+Latency Module untuk School Bell System
+Mencatat keterlambatan bel (waktu jadwal -> callback -> audio mulai)
+dan menyimpan histogram bergulir per backend audio untuk p50/p95/p99
+"""
+
+import threading
+from collections import deque
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile dari list yang sudah terurut"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+class LatencyStats:
+    """
+    Jendela bergulir (N bel terakhir) per backend untuk dua pengukuran:
+    - dispatch_ms: waktu jadwal sampai callback bel dipanggil
+    - start_ms: waktu jadwal sampai audio mulai diputar
+    """
+
+    def __init__(self, window=500):
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples = {}  # backend -> {'dispatch_ms': deque, 'start_ms': deque}
+        self._counts = {}
+
+    def record(self, backend, dispatch_ms, start_ms=None):
+        """Catat satu bel; start_ms None jika audio tidak diputar"""
+        with self._lock:
+            samples = self._samples.get(backend)
+            if samples is None:
+                samples = {
+                    'dispatch_ms': deque(maxlen=self.window),
+                    'start_ms': deque(maxlen=self.window)
+                }
+                self._samples[backend] = samples
+                self._counts[backend] = 0
+            samples['dispatch_ms'].append(dispatch_ms)
+            if start_ms is not None:
+                samples['start_ms'].append(start_ms)
+            self._counts[backend] += 1
+
+    def get_stats(self):
+        """Ringkasan per backend: jumlah, p50/p95/p99, min dan max (ms)"""
+        with self._lock:
+            snapshot = {
+                backend: {name: sorted(values) for name, values in samples.items()}
+                for backend, samples in self._samples.items()
+            }
+            counts = dict(self._counts)
+
+        stats = {}
+        for backend, samples in snapshot.items():
+            summary = {'total': counts[backend], 'window': self.window}
+            for name, values in samples.items():
+                entry = {'samples': len(values)}
+                for pct in PERCENTILES:
+                    entry[f'p{pct}'] = percentile(values, pct)
+                entry['min'] = values[0] if values else None
+                entry['max'] = values[-1] if values else None
+                summary[name] = entry
+            stats[backend] = summary
+        return stats
+
+    def reset(self):
+        """Kosongkan semua sampel"""
+        with self._lock:
+            self._samples = {}
+            self._counts = {}
+
+
+# Global instance
+latency_stats = LatencyStats()
+
+
+def record(backend, dispatch_ms, start_ms=None):
+    """Helper function untuk mencatat latency satu bel"""
+    latency_stats.record(backend, dispatch_ms, start_ms)
+
+
+def get_stats():
+    """Helper function untuk ringkasan latency"""
+    return latency_stats.get_stats()
@@ -0,0 +1,175 @@
+"""
+Leader Election Module untuk School Bell System
+Saat aplikasi berjalan dengan beberapa worker (gunicorn -w N), hanya satu
+proses yang boleh menjalankan scheduler dan memutar audio. Proses tersebut
+memegang lease di tabel leader_lease dan memperpanjangnya secara berkala;
+proses lain (follower) hanya melayani HTTP/WebSocket dan meneruskan
+perintah (putar audio, reload jadwal, ...) lewat tabel leader_commands
+"""
+
+import atexit
+import os
+import socket
+import threading
+import time
+import uuid
+import database
+
+LEASE_NAME = 'scheduler'
+LEASE_TTL = 10          # detik; leader yang mati diambil alih setelah ini
+RENEW_INTERVAL = 2      # detik antar perpanjangan/percobaan ambil lease
+COMMAND_POLL_INTERVAL = 0.5
+COMMAND_MAX_AGE = 30    # perintah lebih tua dari ini dibuang
+
+
+class LeaderElection:
+    """
+    Lease berbasis baris SQLite (BEGIN IMMEDIATE, jadi aman antar proses)
+    on_elected dipanggil saat proses ini menjadi leader, on_demoted saat
+    lease hilang (mis. proses sempat macet lebih lama dari ttl)
+    """
+
+    def __init__(self, on_elected=None, on_demoted=None, name=LEASE_NAME,
+                 ttl=LEASE_TTL, renew_interval=RENEW_INTERVAL,
+                 poll_interval=COMMAND_POLL_INTERVAL, state_callback=None):
+        self.name = name
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.ttl = ttl
+        self.renew_interval = renew_interval
+        self.poll_interval = poll_interval
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.state_callback = state_callback
+        self.handlers = {}
+        self.is_leader = False
+        self.lease_expires = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def register(self, command, handler):
+        """Daftarkan handler untuk perintah yang dikirim follower ke leader"""
+        self.handlers[command] = handler
+
+    def holds_lease(self):
+        """True jika proses ini leader dan lease-nya belum kedaluwarsa"""
+        return self.is_leader and time.time() < self.lease_expires
+
+    def start(self):
+        """Coba ambil lease sekali secara langsung, lalu jalankan thread election"""
+        self._tick()
+        self._thread = threading.Thread(target=self._run, name='leader-election')
+        self._thread.daemon = True
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Hentikan election dan lepas lease supaya follower cepat mengambil alih"""
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(5)
+        if self.is_leader:
+            self._set_leader(False)
+            try:
+                database.release_lease(self.name, self.owner)
+            except Exception as e:
+                print(f"❌ Error melepas lease: {e}")
+
+    def _run(self):
+        next_renew = time.monotonic() + self.renew_interval
+        while not self._stop.wait(self.poll_interval if self.is_leader else self.renew_interval):
+            try:
+                if not self.is_leader or time.monotonic() >= next_renew:
+                    self._tick()
+                    next_renew = time.monotonic() + self.renew_interval
+                if self.is_leader:
+                    self._process_commands()
+                else:
+                    # Follower tetap mengikuti perubahan settings dari proses lain
+                    database.refresh_settings_cache()
+            except Exception as e:
+                print(f"❌ Error leader election: {e}")
+                if self.is_leader and time.time() >= self.lease_expires:
+                    self._set_leader(False)
+
+    def _tick(self):
+        """Ambil/perpanjang lease dan panggil callback jika status berubah"""
+        state = self.state_callback() if self.is_leader and self.state_callback else None
+        acquired = database.try_acquire_lease(self.name, self.owner, self.ttl, state)
+        if acquired:
+            self.lease_expires = time.time() + self.ttl
+        if acquired != self.is_leader:
+            self._set_leader(acquired)
+
+    def _set_leader(self, leader):
+        self.is_leader = leader
+        if leader:
+            print(f"👑 Proses ini menjadi leader ({self.owner})")
+            callback = self.on_elected
+        else:
+            self.lease_expires = 0.0
+            print(f"🪑 Proses ini menjadi follower ({self.owner})")
+            callback = self.on_demoted
+        if callback:
+            try:
+                callback()
+            except Exception as e:
+                print(f"❌ Error leader callback: {e}")
+        if leader:
+            # Perintah yang masuk saat belum ada leader (yang masih baru saja)
+            self._process_commands()
+
+    def _process_commands(self):
+        """Jalankan perintah dari follower; settings dimuat ulang lebih dulu"""
+        database.refresh_settings_cache()
+        commands = database.take_leader_commands(COMMAND_MAX_AGE)
+        for command, payload in commands:
+            handler = self.handlers.get(command)
+            if handler is None:
+                print(f"⚠️  Perintah leader tidak dikenal: {command}")
+                continue
+            try:
+                handler(**payload)
+            except Exception as e:
+                print(f"❌ Error perintah leader '{command}': {e}")
+        if commands:
+            # Publikasikan state baru (mis. audio mulai diputar) tanpa menunggu renew
+            self._tick()
+
+
+# Global election instance (None = election tidak dipakai, proses tunggal)
+election = None
+
+
+def start_election(on_elected=None, on_demoted=None, state_callback=None):
+    """
+    Buat leader election untuk proses ini
+    Daftarkan handler perintah dulu, lalu panggil start()
+    """
+    global election
+    election = LeaderElection(on_elected, on_demoted, state_callback=state_callback)
+    return election
+
+
+def is_leader():
+    """True jika proses ini leader, atau election tidak dipakai"""
+    return election is None or election.is_leader
+
+
+def is_follower():
+    """True jika election berjalan dan proses ini bukan leader"""
+    return election is not None and not election.is_leader
+
+
+def submit(command, **payload):
+    """Kirim perintah ke leader"""
+    database.add_leader_command(command, payload)
+
+
+def get_leader_state():
+    """State terakhir yang dipublikasikan leader (mis. status audio) atau None"""
+    lease = database.get_lease(LEASE_NAME)
+    if lease is None or lease['expires_at'] < time.time():
+        return None
+    return lease['state']
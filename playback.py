@@ -0,0 +1,382 @@
+"""
+Playback Queue Module untuk School Bell System
+Semua pemutaran audio di proses leader lewat satu antrian prioritas dan
+satu thread playback, supaya pengumuman manual tidak memotong bel (atau
+sebaliknya) tanpa aturan yang jelas
+
+Kelas prioritas (tinggi -> rendah): emergency, scheduled, announcement, music
+Kebijakan per kelas (setting playback_policy_<kelas>) saat audio lain
+sedang diputar:
+- preempt: hentikan audio yang prioritasnya sama atau lebih rendah lalu
+           langsung putar; jika yang diputar lebih tinggi, ikut antre
+- queue:   antre sampai audio sekarang selesai
+- drop:    dibuang jika ada audio yang sedang diputar atau antre
+Satu request boleh berisi beberapa file (mis. chime, pesan, chime) yang
+diputar berurutan tanpa jeda (pygame Channel.queue untuk audio di cache)
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+import audio_player
+import clock
+import database
+import latency
+
+PRIORITIES = ('emergency', 'scheduled', 'announcement', 'music')
+PLAYBACK_POLICIES = ('preempt', 'queue', 'drop')
+DEFAULT_POLICIES = {
+    'emergency': 'preempt',
+    'scheduled': 'preempt',
+    'announcement': 'queue',
+    'music': 'drop'
+}
+# Interval cek status player selama audio diputar (detik)
+POLL_INTERVAL = 0.02
+
+# State akhir request; started_at terisi jika audio sempat diputar
+FINAL_STATES = ('done', 'preempted', 'dropped', 'failed', 'cancelled')
+
+
+def get_policy(priority):
+    """Kebijakan untuk kelas prioritas dari settings (default DEFAULT_POLICIES)"""
+    policy = database.get_setting(f'playback_policy_{priority}')
+    return policy if policy in PLAYBACK_POLICIES else DEFAULT_POLICIES[priority]
+
+
+class PlaybackRequest:
+    """Satu item antrian: satu file atau urutan file yang diputar berurutan"""
+
+    def __init__(self, paths, priority, label, seq):
+        self.paths = list(paths)
+        self.priority = priority
+        self.rank = PRIORITIES.index(priority)
+        self.label = label
+        self.seq = seq
+        self.state = 'queued'
+        self.index = -1  # bagian yang terakhir diberikan ke player
+        self.submitted_at = clock.now()
+        self.started_at = None
+        self.wait_ms = None
+        self._submitted_mono = time.monotonic()
+        self._started = threading.Event()
+
+    def __lt__(self, other):
+        return (self.rank, self.seq) < (other.rank, other.seq)
+
+    def wait_started(self, timeout=None):
+        """
+        Tunggu sampai audio mulai diputar atau request selesai tanpa diputar
+        Returns:
+            bool: True jika audio mulai diputar
+        """
+        self._started.wait(timeout)
+        return self.started_at is not None
+
+    def to_dict(self):
+        return {
+            'label': self.label,
+            'priority': self.priority,
+            'state': self.state,
+            'files': self.paths,
+            'part': self.index + 1 if self.index >= 0 else None,
+            'submitted_at': self.submitted_at.isoformat(),
+            'wait_ms': self.wait_ms
+        }
+
+
+class PlaybackQueue:
+    """
+    Min-heap (prioritas, urutan masuk) + satu thread playback yang menjadi
+    satu-satunya pemanggil AudioPlayer.play/stop. Thread dibuat saat request
+    pertama masuk (hanya di proses leader)
+    """
+
+    def __init__(self, player, window=500):
+        self.player = player
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        # Serialisasi pemanggilan player (play/stop/queue); urutan lock:
+        # _player_lock lalu _cond, tidak pernah sebaliknya
+        self._player_lock = threading.Lock()
+        self._current = None
+        self._running = False
+        self._thread = None
+        self._max_depth = 0
+        self._counts = {p: {'submitted': 0, 'played': 0, 'preempted': 0,
+                            'dropped': 0, 'failed': 0, 'cancelled': 0}
+                        for p in PRIORITIES}
+        self._waits = {p: deque(maxlen=window) for p in PRIORITIES}
+
+    def submit(self, paths, priority='announcement', label=None):
+        """
+        Masukkan request ke antrian sesuai kebijakan kelasnya
+        Args:
+            paths: path file audio atau list path (diputar berurutan)
+        Returns:
+            PlaybackRequest: state 'queued' atau 'dropped'
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f'Prioritas tidak valid: {priority}')
+        if isinstance(paths, str):
+            paths = [paths]
+        if not paths:
+            raise ValueError('Tidak ada file audio')
+
+        with self._cond:
+            request = PlaybackRequest(paths, priority, label, next(self._seq))
+            self._counts[priority]['submitted'] += 1
+            busy = self._current is not None or self._heap
+            if busy and get_policy(priority) == 'drop':
+                self._finish(request, 'dropped')
+                print(f"🔇 {label or paths[0]}: dibuang (audio lain sedang diputar)")
+                return request
+
+            heapq.heappush(self._heap, request)
+            self._max_depth = max(self._max_depth, len(self._heap))
+            self._ensure_thread()
+            self._cond.notify()
+        return request
+
+    def stop(self, clear=True):
+        """Hentikan audio sekarang; clear=True juga mengosongkan antrian"""
+        with self._cond:
+            if clear:
+                while self._heap:
+                    self._finish(heapq.heappop(self._heap), 'cancelled')
+            if self._current:
+                self._finish(self._current, 'cancelled')
+                self._current = None
+            self._cond.notify()
+        with self._player_lock:
+            self.player.stop()
+
+    def cancel(self, request):
+        """
+        Batalkan request yang belum mulai diputar (masih antre atau sedang
+        di-decode)
+        Returns:
+            bool: True jika dibatalkan
+        """
+        with self._cond:
+            if request.started_at is not None or request.state in FINAL_STATES:
+                return False
+            if request in self._heap:
+                self._heap.remove(request)
+                heapq.heapify(self._heap)
+            elif self._current is request:
+                self._current = None
+            self._finish(request, 'cancelled')
+            self._cond.notify()
+            return True
+
+    def shutdown(self):
+        """Hentikan thread playback (proses tidak lagi menjadi leader)"""
+        self.stop()
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread:
+            self._thread.join(2)
+            self._thread = None
+
+    def snapshot(self):
+        """Audio yang sedang diputar dan isi antrian (urut prioritas)"""
+        with self._cond:
+            return {
+                'current': self._current.to_dict() if self._current else None,
+                'queue': [r.to_dict() for r in sorted(self._heap)]
+            }
+
+    def get_stats(self):
+        """Kedalaman antrian dan counter + percentile waktu tunggu (ms) per kelas"""
+        with self._cond:
+            stats = {
+                'depth': len(self._heap),
+                'max_depth': self._max_depth,
+                'playing': self._current.priority if self._current else None,
+                'policies': {p: get_policy(p) for p in PRIORITIES},
+                'classes': {}
+            }
+            for priority in PRIORITIES:
+                waits = sorted(self._waits[priority])
+                entry = dict(self._counts[priority])
+                entry['wait_ms'] = {'samples': len(waits)}
+                for pct in latency.PERCENTILES:
+                    entry['wait_ms'][f'p{pct}'] = latency.percentile(waits, pct)
+                entry['wait_ms']['max'] = waits[-1] if waits else None
+                stats['classes'][priority] = entry
+        return stats
+
+    def _ensure_thread(self):
+        if self._running:
+            return
+        self.player.init_mixer()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='playback')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._running:
+                    return
+            try:
+                self._step()
+            except Exception as e:
+                print(f"❌ Error playback: {e}")
+                with self._cond:
+                    if self._current:
+                        self._finish(self._current, 'failed')
+                        self._current = None
+
+    def _step(self):
+        """
+        Satu langkah thread playback. _cond hanya dipegang untuk membaca dan
+        mengubah antrian; decode dan pemanggilan player berjalan di luar lock
+        (diserialisasi dengan _player_lock), jadi submit() tidak pernah
+        menunggu decode audio
+        """
+        with self._cond:
+            current = self._current
+            if current is None:
+                if not self._heap:
+                    self._cond.wait()
+                    return
+                current = self._current = heapq.heappop(self._heap)
+                start = True
+            else:
+                start = False
+                top = self._heap[0] if self._heap else None
+                if top and get_policy(top.priority) == 'preempt' and top.rank <= current.rank:
+                    print(f"⏭️  {current.label or current.paths[0]} dipotong oleh "
+                          f"{top.label or top.paths[0]} ({top.priority})")
+                    self._finish(current, 'preempted')
+                    self._current = None
+                    preempted = True
+                else:
+                    preempted = False
+
+        if start:
+            self._start(current)
+            return
+        if preempted:
+            with self._player_lock:
+                self.player.stop()
+            return
+
+        with self._player_lock:
+            playing = self._advance(current)
+        with self._cond:
+            if self._current is not current:
+                return  # dihentikan/dipotong selama cek di atas
+            if playing:
+                self._cond.wait(POLL_INTERVAL)
+            else:
+                self._finish(current, 'done')
+                self._current = None
+
+    def _start(self, request):
+        """Decode bagian-bagian request lalu mulai memutar bagian pertama"""
+        # Urutan: decode semua bagian dulu supaya bisa diantrekan tanpa jeda
+        if len(request.paths) > 1:
+            for path in request.paths:
+                self.player.prepare(path)
+                with self._cond:
+                    if self._current is not request:
+                        return
+                    top = self._heap[0] if self._heap else None
+                    if top and top.rank < request.rank:
+                        # Prioritas lebih tinggi masuk selama decode: request ini
+                        # belum diputar, kembalikan ke antrian (urutannya tetap)
+                        heapq.heappush(self._heap, request)
+                        self._current = None
+                        return
+
+        with self._player_lock:
+            with self._cond:
+                if self._current is not request:
+                    return
+            # stop() yang masuk setelah cek ini menunggu _player_lock, jadi
+            # audio yang terlanjur diputar tetap dihentikan
+            started = self._play_next(request)
+        with self._cond:
+            stale = self._current is not request
+            if not stale and started:
+                self._mark_started(request)
+            elif not stale:
+                self._finish(request, 'failed')
+                self._current = None
+        if stale and started:
+            # Dibatalkan (cancel) tepat saat mulai diputar
+            with self._player_lock:
+                self.player.stop()
+
+    def _advance(self, request):
+        """
+        Lanjutkan urutan file untuk request yang sedang diputar
+        (dipanggil dengan _player_lock terkunci)
+        Returns:
+            bool: True selama request masih diputar
+        """
+        if self.player.has_queued():
+            return True
+        has_next = request.index + 1 < len(request.paths)
+        if self.player.is_audio_playing():
+            # Antrekan bagian berikutnya di channel yang sama (tanpa jeda)
+            if has_next and self.player.queue_next(request.paths[request.index + 1]):
+                request.index += 1
+            return True
+        return has_next and self._play_next(request)
+
+    def _play_next(self, request):
+        """Putar bagian berikutnya; bagian yang gagal dilewati"""
+        while request.index + 1 < len(request.paths):
+            request.index += 1
+            if self.player.play(request.paths[request.index]):
+                return True
+        return False
+
+    def _mark_started(self, request):
+        request.state = 'playing'
+        request.started_at = clock.now()
+        request.wait_ms = round((time.monotonic() - request._submitted_mono) * 1000, 3)
+        self._counts[request.priority]['played'] += 1
+        self._waits[request.priority].append(request.wait_ms)
+        request._started.set()
+
+    def _finish(self, request, state):
+        request.state = state
+        if state != 'done':
+            self._counts[request.priority][state] += 1
+        request._started.set()
+
+
+# Global playback queue instance
+playback_queue = PlaybackQueue(audio_player.audio_player)
+
+def play(paths, priority='announcement', label=None):
+    """Helper function untuk memutar audio lewat antrian prioritas"""
+    return playback_queue.submit(paths, priority, label)
+
+def stop():
+    """Helper function untuk stop audio dan kosongkan antrian"""
+    playback_queue.stop()
+
+def cancel(request):
+    """Helper function untuk membatalkan request yang belum diputar"""
+    return playback_queue.cancel(request)
+
+def shutdown():
+    """Helper function untuk menghentikan thread playback"""
+    playback_queue.shutdown()
+
+def get_stats():
+    """Helper function untuk metrik antrian playback"""
+    stats = playback_queue.get_stats()
+    stats.update(playback_queue.snapshot())
+    return stats
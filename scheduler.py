@@ -1,45 +1,395 @@
 """
 Scheduler Module untuk School Bell System
 Menggunakan APScheduler untuk menjalankan bel otomatis sesuai jadwal
+(atau HeapDispatcher jika setting scheduler_engine = 'heap')
+Waktu dibaca dari clock, jadi engine heap bisa dijalankan dengan jam virtual
 """
 
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
-from datetime import datetime
+from apscheduler.events import EVENT_JOB_MISSED
+from apscheduler.executors.pool import ThreadPoolExecutor
+from datetime import timedelta
+import os
+import threading
+import clock
 import database
 import audio_player
+import latency
+import leader
+import playback
+import timeline
+from dispatcher import HeapDispatcher
+
+# Batas tunggu audio bel mulai diputar lewat antrian playback (detik)
+PLAY_START_TIMEOUT = 5
+
+
+class _BellRun:
+    """Job bel APScheduler dengan scheduled_run_time sebagai kwarg scheduled_at"""
+    
+    def __init__(self, job, run_time):
+        self._job = job
+        self.kwargs = dict(job.kwargs, scheduled_at=run_time.astimezone().replace(tzinfo=None))
+    
+    def __getattr__(self, name):
+        return getattr(self._job, name)
+    
+    def __str__(self):
+        return str(self._job)
+
+
+class BellExecutor(ThreadPoolExecutor):
+    """
+    Executor APScheduler yang meneruskan waktu jadwal ke job CronTrigger;
+    fungsi job tidak menerima scheduled_run_time, dan menghitungnya dari jam
+    saat callback salah tanggal jika bel terlambat melewati tengah malam
+    """
+    
+    def _do_submit_job(self, job, run_times):
+        if job.id.startswith('schedule_'):
+            # coalesce=True: run_times hanya berisi run terakhir
+            job = _BellRun(job, run_times[-1])
+        return super()._do_submit_job(job, run_times)
+
 
 class BellScheduler:
     """Class untuk menangani penjadwalan bel sekolah"""
     
-    def __init__(self):
-        """Initialize background scheduler"""
-        self.scheduler = BackgroundScheduler()
+    def __init__(self, engine=None):
+        """
+        Initialize background scheduler
+        Args:
+            engine: 'apscheduler' (satu CronTrigger per jadwal) atau 'heap'
+                    (satu timer untuk semua jadwal); default dari setting.
+                    Dengan jam virtual selalu 'heap'
+        """
+        self.scheduler = BackgroundScheduler(executors={'default': BellExecutor()})
         self.scheduler.start()
         self.jobs = {}
-        print("⏰ Scheduler initialized")
+        self.job_specs = {}  # schedule_id -> spesifikasi job terakhir (untuk diff)
+        # job_id -> (run_date, args) job sekali jalan APScheduler; job date yang
+        # terlewat sudah dibuang sebelum listener EVENT_JOB_MISSED dipanggil
+        self.date_job_args = {}
+        self._lock = threading.RLock()
+        
+        self.engine = engine or database.get_setting('scheduler_engine') or 'apscheduler'
+        if clock.is_virtual():
+            # APScheduler selalu memakai jam sistem
+            self.engine = 'heap'
+        
+        # Bel yang terlambat <= catchup_grace detik tetap dibunyikan,
+        # lebih dari itu dicatat sebagai missed
+        self.catchup_grace = self._read_catchup_grace()
+        self._unsubscribe_catchup = database.subscribe_setting(
+            'catchup_grace_seconds', self._on_catchup_grace_changed
+        )
+        
+        self.dispatcher = None
+        if self.engine == 'heap':
+            self.dispatcher = HeapDispatcher(
+                self._play_scheduled_bell,
+                misfire_grace_time=self.catchup_grace,
+                missed_callback=self._record_missed
+            )
+            self.dispatcher.start()
+        else:
+            self.scheduler.add_listener(self._on_job_missed, EVENT_JOB_MISSED)
+        
+        # Job maintenance harian: rollup dan retention play_logs
+        self._add_daily_job('log_retention', self._run_log_retention, 2, 30)
+        
+        # Profil jadwal: dicek ulang tengah malam dan saat profil default diganti
+        self.active_profile = None
+        self._add_daily_job('profile_switch', self._run_profile_check, 0, 0, second=1)
+        self._unsubscribe_profile = database.subscribe_setting(
+            'active_profile', lambda key, value: self.check_profile()
+        )
+        
+        # Holiday mode diikuti lewat subscription, bukan dibaca tiap bel
+        self.holiday_mode = database.get_setting('holiday_mode') == '1'
+        self._unsubscribe_holiday = database.subscribe_setting(
+            'holiday_mode', self._on_holiday_mode_changed
+        )
+        
+        # Pre-warm: audio bel berikutnya di-decode beberapa detik sebelum waktunya
+        self.prewarm = None
+        self._unsubscribe_prewarm = database.subscribe_setting(
+            'prewarm_lead_seconds', lambda key, value: self.schedule_prewarm()
+        )
+        print(f"⏰ Scheduler initialized (engine: {self.engine})")
+    
+    @staticmethod
+    def _read_catchup_grace():
+        try:
+            return max(1, int(database.get_setting('catchup_grace_seconds') or 60))
+        except ValueError:
+            return 60
+    
+    def _on_catchup_grace_changed(self, key, value):
+        """Callback saat setting catchup_grace_seconds berubah"""
+        self.catchup_grace = self._read_catchup_grace()
+        if self.dispatcher:
+            self.dispatcher.misfire_grace_time = self.catchup_grace
+            return
+        with self._lock:
+            for schedule_id in list(self.jobs):
+                try:
+                    self.scheduler.modify_job(f"schedule_{schedule_id}",
+                                              misfire_grace_time=self.catchup_grace)
+                except Exception:
+                    pass
+    
+    def _add_daily_job(self, job_id, func, hour, minute, second=0):
+        """Job harian (timer dispatcher di engine heap, CronTrigger di APScheduler)"""
+        if self.dispatcher:
+            self.dispatcher.call_daily(job_id, hour, minute, func, second=second)
+            return
+        self.scheduler.add_job(
+            func=func,
+            trigger=CronTrigger(hour=hour, minute=minute, second=second),
+            id=job_id,
+            replace_existing=True
+        )
+    
+    def _add_date_job(self, job_id, run_date, func, args, misfire_grace_time=None):
+        """
+        Job sekali jalan; misfire_grace_time None = tetap dijalankan walau
+        terlambat, selain itu yang terlambat dicatat lewat _record_missed
+        """
+        if self.dispatcher:
+            missed = self._record_missed if misfire_grace_time is not None else None
+            self.dispatcher.call_at(job_id, run_date, func, args, missed=missed)
+            return
+        if misfire_grace_time is not None:
+            # Buang catatan job lama (sudah jalan atau sudah dicatat missed)
+            cutoff = clock.now() - timedelta(days=1)
+            self.date_job_args = {k: v for k, v in self.date_job_args.items()
+                                  if v[0] >= cutoff}
+            self.date_job_args[job_id] = (run_date, args)
+        self.scheduler.add_job(
+            func=func,
+            trigger='date',
+            run_date=run_date,
+            args=args,
+            id=job_id,
+            replace_existing=True,
+            misfire_grace_time=misfire_grace_time
+        )
+    
+    def _remove_date_job(self, job_id):
+        if self.dispatcher:
+            self.dispatcher.remove(job_id)
+            return
+        self.date_job_args.pop(job_id, None)
+        try:
+            self.scheduler.remove_job(job_id)
+        except Exception:
+            pass
+    
+    def _date_job_ids(self, prefix):
+        if self.dispatcher:
+            return self.dispatcher.timer_keys(prefix)
+        return [job.id for job in self.scheduler.get_jobs() if job.id.startswith(prefix)]
+    
+    def _on_holiday_mode_changed(self, key, value):
+        """Callback saat setting holiday_mode berubah"""
+        self.holiday_mode = value == '1'
+        print(f"🏖️  Holiday mode: {'aktif' if self.holiday_mode else 'nonaktif'}")
         
     def load_schedules(self):
         """
-        Load semua jadwal dari database dan daftarkan ke scheduler
+        Sinkronkan job scheduler dengan jadwal di database
+        Hanya job yang berubah yang ditambah/diubah/dihapus, jadi job lain
+        tetap terdaftar selama reload
         Fungsi ini dipanggil saat:
         - Aplikasi pertama kali jalan
-        - Ada perubahan jadwal (tambah/edit/delete)
+        - Ada perubahan banyak jadwal sekaligus (import)
         """
-        # Hapus semua job yang ada
-        self.clear_all_jobs()
+        # Ambil jadwal aktif profil hari ini dari timeline (semua profil sudah dikompilasi)
+        compiled = timeline.get_timeline()
+        profile_id = compiled.profile_for(clock.now().date())
+        desired = {s['id']: s for s in compiled.all_schedules(profile_id)}
         
-        # Ambil semua jadwal aktif dari database
-        schedules = database.get_all_schedules()
+        if self.dispatcher:
+            # Heap dibangun ulang penuh lalu di-swap sekaligus
+            with self._lock:
+                self.dispatcher.load(desired.values())
+                self.jobs = dict(desired)
+                self.job_specs = {sid: self._job_spec(s) for sid, s in desired.items()}
+                self.active_profile = profile_id
+            print(f"✅ Loaded {len(self.jobs)} active schedules "
+                  f"(heap dispatcher, profil {profile_id})")
+            self.sync_extra_bells()
+            self.schedule_prewarm()
+            return
         
-        loaded_count = 0
-        for schedule in schedules:
-            if schedule['is_active']:
-                success = self.add_job(schedule)
-                if success:
-                    loaded_count += 1
+        # Scheduler di-pause selama diff supaya pergantian profil terlihat atomik
+        self.scheduler.pause()
+        try:
+            changed, removed = self._diff_jobs(desired)
+            self.active_profile = profile_id
+        finally:
+            self.scheduler.resume()
+        
+        print(f"✅ Loaded {len(self.jobs)} active schedules "
+              f"({changed} added/updated, {removed} removed, profil {profile_id})")
+        self.sync_extra_bells()
+        self.schedule_prewarm()
+    
+    def _diff_jobs(self, desired):
+        """Tambah/ubah/hapus hanya job yang berbeda dari jadwal yang diinginkan"""
+        with self._lock:
+            removed = 0
+            for schedule_id in list(self.jobs):
+                if schedule_id not in desired:
+                    self.remove_job(schedule_id)
+                    removed += 1
+            
+            changed = 0
+            for schedule_id, schedule in desired.items():
+                if self.job_specs.get(schedule_id) == self._job_spec(schedule):
+                    continue
+                if self.add_job(schedule):
+                    changed += 1
+        return changed, removed
+    
+    def check_profile(self):
+        """
+        Ganti jadwal jika profil yang berlaku hari ini berbeda dengan yang
+        sedang dimuat (dipanggil tengah malam dan saat aturan profil berubah)
+        """
+        profile_id = timeline.get_timeline().profile_for(clock.now().date())
+        if profile_id == self.active_profile:
+            return False
+        print(f"🔀 Ganti profil jadwal: {self.active_profile} -> {profile_id}")
+        self.load_schedules()
+        return True
+    
+    def _run_profile_check(self):
+        """Job tengah malam untuk aktivasi profil berdasarkan tanggal"""
+        try:
+            self.check_profile()
+        except Exception as e:
+            print(f"❌ Error ganti profil: {e}")
+        finally:
+            database.release_db_connection()
+    
+    def sync_schedule(self, schedule_id):
+        """
+        Sinkronkan satu jadwal setelah tambah/edit/hapus/toggle
+        Jadwal yang sudah tidak ada, nonaktif, atau bukan milik profil
+        yang sedang dimuat dihapus dari scheduler
+        """
+        schedule = database.get_schedule(schedule_id)
+        with self._lock:
+            if schedule is None or not schedule['is_active'] or \
+                    schedule['profile_id'] != self.active_profile:
+                if schedule_id in self.jobs:
+                    self.remove_job(schedule_id)
+                result = False
+            elif self.job_specs.get(schedule_id) == self._job_spec(schedule):
+                result = True
+            else:
+                result = self.add_job(schedule)
+        # Bel berikutnya bisa berubah karena jadwal ini
+        self.schedule_prewarm()
+        return result
+    
+    def sync_extra_bells(self):
+        """
+        Sinkronkan bel tambahan dari kalender sebagai job sekali jalan
+        (jumlahnya kecil, satu job per bel)
+        """
+        desired = {}
+        for at, item in timeline.get_timeline().extra_bells(clock.now()):
+            desired[f"extra_{item['exception_id']}_{at.strftime('%Y%m%d%H%M')}"] = (at, item)
         
-        print(f"✅ Loaded {loaded_count} active schedules")
+        with self._lock:
+            existing = set(self._date_job_ids('extra_'))
+            for job_id in existing - set(desired):
+                self._remove_date_job(job_id)
+            for job_id, (at, item) in desired.items():
+                if job_id in existing:
+                    continue
+                self._add_date_job(
+                    job_id, at, self._play_scheduled_bell,
+                    [None, item['audio_file'], item['name'], at, item['exception_id']],
+                    misfire_grace_time=self.catchup_grace
+                )
+        if desired:
+            print(f"➕ {len(desired)} bel tambahan terjadwal")
+    
+    def schedule_prewarm(self):
+        """
+        Jadwalkan pre-warm audio untuk semua bel pada waktu berikutnya,
+        prewarm_lead_seconds sebelum waktunya (langsung jika bel sudah lebih
+        dekat dari itu)
+        """
+        now = clock.now()
+        upcoming = timeline.get_timeline().next_slot(now)
+        if upcoming is None:
+            self._remove_date_job('audio_prewarm')
+            return
+        
+        at, schedules = upcoming
+        try:
+            lead = int(database.get_setting('prewarm_lead_seconds') or 30)
+        except ValueError:
+            lead = 30
+        run_date = max(now, at - timedelta(seconds=lead))
+        bells = [(schedule['id'], schedule['audio_file'], schedule['name'])
+                 for schedule in schedules]
+        self._add_date_job('audio_prewarm', run_date, self._prewarm_audio, [bells, at])
+    
+    def _prewarm_audio(self, bells, at):
+        """
+        Baca dan decode audio semua bel berikutnya (tiap file sekali);
+        file yang hilang dilaporkan sekarang
+        Args:
+            bells: list (schedule_id, audio_file, schedule_name) pada waktu at
+        """
+        try:
+            ready_files = {}
+            status = []
+            for schedule_id, audio_file, schedule_name in bells:
+                if audio_file not in ready_files:
+                    audio_path = f"static/audio/{audio_file}"
+                    ready_files[audio_file] = bool(
+                        os.path.exists(audio_path) and audio_player.prepare_audio(audio_path)
+                    )
+                ready = ready_files[audio_file]
+                status.append({
+                    'schedule_id': schedule_id,
+                    'name': schedule_name,
+                    'audio_file': audio_file,
+                    'ready': ready
+                })
+                if ready:
+                    print(f"🎧 Audio siap untuk {schedule_name} ({at.strftime('%H:%M')}): {audio_file}")
+                    continue
+                
+                print(f"⚠️  Audio untuk {schedule_name} ({at.strftime('%H:%M')}) "
+                      f"tidak ditemukan/gagal di-decode: {audio_file}")
+                database.add_play_log(
+                    schedule_id,
+                    audio_file,
+                    'warning',
+                    f"Pre-check gagal: file audio tidak siap untuk bel {at.strftime('%Y-%m-%d %H:%M')}"
+                )
+            self.prewarm = {
+                'at': at.strftime('%Y-%m-%d %H:%M:%S'),
+                'ready': all(ready_files.values()),
+                'bells': status
+            }
+        finally:
+            database.release_db_connection()
+    
+    @staticmethod
+    def _job_spec(schedule):
+        """Field jadwal yang menentukan trigger dan argumen job"""
+        return (schedule['days_mask'], schedule['time'],
+                schedule['audio_file'], schedule['name'])
     
     def add_job(self, schedule):
         """
@@ -49,37 +399,35 @@ class BellScheduler:
         Returns:
             bool: True jika sukses
         """
+        if self.dispatcher:
+            if not self.dispatcher.add(schedule):
+                print(f"❌ Jadwal tanpa hari: {schedule['name']}")
+                return False
+            self.jobs[schedule['id']] = schedule
+            self.job_specs[schedule['id']] = self._job_spec(schedule)
+            print(f"  📅 {schedule['name']} - {database.format_days(schedule['days_mask'])} {schedule['time']}")
+            return True
+        
         try:
             schedule_id = schedule['id']
-            day_of_week = schedule['day_of_week']
-            time_str = schedule['time']  # Format: HH:MM
+            days = database.mask_to_days(schedule['days_mask'])
+            time_str = schedule['time']  # Format: HH:MM atau HH:MM:SS
             audio_file = schedule['audio_file']
             
             # Parse time
-            hour, minute = map(int, time_str.split(':'))
+            seconds = timeline.parse_seconds(time_str)
+            hour, minute, second = seconds // 3600, seconds // 60 % 60, seconds % 60
             
-            # Mapping hari ke number (0=Monday, 6=Sunday)
-            day_mapping = {
-                'Senin': 0,
-                'Selasa': 1,
-                'Rabu': 2,
-                'Kamis': 3,
-                'Jumat': 4,
-                'Sabtu': 5,
-                'Minggu': 6
-            }
-            
-            day_num = day_mapping.get(day_of_week)
-            
-            if day_num is None:
-                print(f"❌ Invalid day: {day_of_week}")
+            if not days:
+                print(f"❌ Jadwal tanpa hari: {schedule['name']}")
                 return False
             
-            # Buat cron trigger (ini yang bikin schedule jalan otomatis)
+            # Satu cron trigger untuk semua hari jadwal (0=Monday, 6=Sunday)
             trigger = CronTrigger(
-                day_of_week=day_num,
+                day_of_week=','.join(str(day) for day in days),
                 hour=hour,
-                minute=minute
+                minute=minute,
+                second=second
             )
             
             # Tambahkan job ke scheduler
@@ -88,11 +436,14 @@ class BellScheduler:
                 trigger=trigger,
                 args=[schedule_id, audio_file, schedule['name']],
                 id=f"schedule_{schedule_id}",
-                replace_existing=True
+                replace_existing=True,
+                misfire_grace_time=self.catchup_grace,
+                coalesce=True
             )
             
             self.jobs[schedule_id] = job
-            print(f"  📅 {schedule['name']} - {day_of_week} {time_str}")
+            self.job_specs[schedule_id] = self._job_spec(schedule)
+            print(f"  📅 {schedule['name']} - {database.format_days(schedule['days_mask'])} {time_str}")
             
             return True
             
@@ -100,45 +451,231 @@ class BellScheduler:
             print(f"❌ Error adding job: {e}")
             return False
     
-    def _play_scheduled_bell(self, schedule_id, audio_file, schedule_name):
+    def _play_scheduled_bell(self, schedule_id, audio_file, schedule_name, scheduled_at=None,
+                             exception_id=None):
         """
         Function yang dipanggil otomatis saat jadwal tiba
         (Internal function - dipanggil oleh scheduler)
+        scheduled_at: untuk job CronTrigger diisi BellExecutor saat dijalankan
+        exception_id: entri kalender untuk bel tambahan (schedule_id None)
         """
-        print(f"\n{'='*60}")
-        print(f"🔔 WAKTU BEL: {schedule_name}")
-        print(f"⏰ Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        print(f"🎵 Audio: {audio_file}")
-        print(f"{'='*60}\n")
+        callback_at = clock.now()
+        if leader.election and not leader.election.holds_lease():
+            # Proses sempat macet dan lease mungkin sudah diambil proses lain
+            print(f"⚠️  {schedule_name}: proses ini tidak memegang lease leader - bel dilewati")
+            return
+        try:
+            status = self._ring_bell(schedule_id, audio_file, schedule_name,
+                                     scheduled_at, callback_at)
+            # Ledger ditulis setelah audio mulai supaya tidak menambah latency
+            self._record_ledger(schedule_id, scheduled_at, status, exception_id)
+            self.schedule_prewarm()
+        finally:
+            # Thread worker APScheduler dipakai ulang, kembalikan koneksi ke pool
+            database.release_db_connection()
+    
+    def _record_ledger(self, schedule_id, fire_at, status, exception_id=None):
+        key = database.ledger_id(schedule_id, exception_id)
+        if key is None:
+            return
+        try:
+            database.record_bell_fire(key, fire_at, status)
+        except Exception as e:
+            print(f"❌ Error menulis bell ledger: {e}")
+    
+    def _record_missed(self, schedule_id, audio_file, schedule_name, scheduled_at,
+                       exception_id=None):
+        """Catat bel yang terlambat melebihi batas catch-up sebagai missed"""
+        try:
+            late = (clock.now() - scheduled_at).total_seconds()
+            print(f"⚠️  Bel terlewat: {schedule_name} "
+                  f"({scheduled_at.strftime('%Y-%m-%d %H:%M')}, terlambat {late:.0f}s)")
+            database.add_play_log(
+                schedule_id,
+                audio_file,
+                'missed',
+                f'Terlambat {late:.0f}s (batas catch-up {self.catchup_grace}s)',
+                {'scheduled_at': scheduled_at, 'backend': audio_player.audio_player.backend}
+            )
+            self._record_ledger(schedule_id, scheduled_at, 'missed', exception_id)
+        finally:
+            database.release_db_connection()
+    
+    def _on_job_missed(self, event):
+        """Listener APScheduler untuk job yang melewati misfire_grace_time"""
+        job_id = event.job_id
+        if job_id.startswith('schedule_'):
+            schedule_id = int(job_id[len('schedule_'):])
+            spec = self.job_specs.get(schedule_id)
+            if spec is None:
+                return
+            args = (schedule_id, spec[2], spec[3], None, None)
+        elif job_id.startswith('extra_'):
+            # Job date sudah dihapus APScheduler, argumen diambil dari catatan
+            entry = self.date_job_args.pop(job_id, None)
+            if entry is None:
+                return
+            args = entry[1]
+        else:
+            return
+        scheduled_at = event.scheduled_run_time.astimezone().replace(tzinfo=None)
+        self._record_missed(*args[:3], scheduled_at, args[4])
+    
+    def reconcile_missed_bells(self, now=None, max_days=7):
+        """
+        Rekonsiliasi saat startup: bel antara entri terakhir di ledger dan
+        sekarang yang belum tercatat dibunyikan (jika masih dalam batas
+        catch-up) atau dicatat sebagai missed
+        Returns:
+            dict: jumlah bel yang di-catch-up dan yang missed
+        """
+        now = now or clock.now()
+        last = database.get_last_bell_fire()
+        if last is None:
+            # Ledger masih kosong (instalasi baru), belum ada acuan
+            return {'caught_up': 0, 'missed': 0}
+        
+        start = max(last, now - timedelta(days=max_days))
+        handled = database.get_bell_fires(start, now)
+        due = {}
+        for at, schedule in timeline.get_timeline().occurrences(start, now):
+            # Bel tambahan dari kalender ikut direkonsiliasi (key -exception_id)
+            bell_id = database.ledger_id(schedule['id'], schedule.get('exception_id'))
+            key = (bell_id, at.strftime(database.LEDGER_TIME_FORMAT))
+            if key not in handled:
+                due[key] = (at, schedule)
+        
+        caught_up = missed = 0
+        latest = {}
+        for (bell_id, _), (at, schedule) in due.items():
+            # Catch-up digabung: per jadwal hanya kemunculan terakhir yang bisa berbunyi
+            if (now - at).total_seconds() <= self.catchup_grace:
+                previous = latest.get(bell_id)
+                if previous:
+                    self._record_missed(*self._bell_args(*previous))
+                    missed += 1
+                latest[bell_id] = (at, schedule)
+            else:
+                self._record_missed(*self._bell_args(at, schedule))
+                missed += 1
+        
+        for at, schedule in latest.values():
+            print(f"⏪ Catch-up bel: {schedule['name']} ({at.strftime('%H:%M')})")
+            args = self._bell_args(at, schedule)
+            if clock.is_virtual():
+                # Jam virtual: dijalankan langsung supaya hasil harness deterministik
+                self._play_scheduled_bell(*args)
+            else:
+                threading.Thread(target=self._play_scheduled_bell, args=args, daemon=True).start()
+            caught_up += 1
+        
+        if caught_up or missed:
+            print(f"📒 Rekonsiliasi ledger: {caught_up} catch-up, {missed} missed")
+        return {'caught_up': caught_up, 'missed': missed}
+    
+    @staticmethod
+    def _bell_args(at, schedule):
+        """Argumen _play_scheduled_bell/_record_missed untuk satu kemunculan timeline"""
+        return (schedule['id'], schedule['audio_file'], schedule['name'], at,
+                schedule.get('exception_id'))
+    
+    def _ring_bell(self, schedule_id, audio_file, schedule_name, scheduled_at, callback_at):
+        """
+        Cek holiday mode, putar audio, lalu catat ke log beserta timing bel
+        Returns:
+            str: status bel (success, failed, cancelled)
+        """
+        backend = audio_player.audio_player.backend
+        timing = {
+            'scheduled_at': scheduled_at,
+            'callback_at': callback_at,
+            'backend': backend
+        }
+        dispatch_ms = (callback_at - scheduled_at).total_seconds() * 1000
+        
+        # Cek kalender libur/pengecualian (bel tambahan tidak punya schedule_id)
+        if schedule_id is not None and \
+                timeline.get_timeline().is_skipped(scheduled_at.date(), schedule_id):
+            print(f"📅 {schedule_name}: libur/dikecualikan untuk hari ini - bel dibatalkan")
+            database.add_play_log(
+                schedule_id,
+                audio_file,
+                'cancelled',
+                'Holiday or schedule exception for today',
+                timing
+            )
+            return 'cancelled'
         
         # Cek holiday mode
-        holiday_mode = database.get_setting('holiday_mode')
-        if holiday_mode == '1':
-            print("🏖️  Holiday mode aktif - bel dibatalkan")
+        if self.holiday_mode:
+            print(f"🏖️  {schedule_name}: holiday mode aktif - bel dibatalkan")
             database.add_play_log(
                 schedule_id, 
                 audio_file, 
                 'cancelled', 
-                'Holiday mode active'
+                'Holiday mode active',
+                timing
             )
-            return
+            return 'cancelled'
         
-        # Play audio
+        # Play audio dulu, baru print/log supaya tidak menambah latency
+        # Antrian playback memutuskan preempt/antre/buang (kelas 'scheduled');
+        # tunggu sampai audio benar-benar mulai untuk mencatat latency
         audio_path = f"static/audio/{audio_file}"
-        success = audio_player.play_audio(audio_path)
+        request = playback.play(audio_path, 'scheduled', schedule_name)
+        timed_out = False
+        if not request.wait_started(PLAY_START_TIMEOUT):
+            # Belum mulai (antrian sibuk/thread playback macet): batalkan
+            # supaya bel tidak berbunyi terlambat tanpa tercatat, dan job ini
+            # tetap lanjut ke ledger serta pre-warm bel berikutnya
+            timed_out = playback.cancel(request)
+            if timed_out:
+                print(f"⏳ {schedule_name}: audio tidak mulai dalam {PLAY_START_TIMEOUT}s - dibatalkan")
+        success = request.started_at is not None
+        audio_start_at = request.started_at or clock.now()
+        
+        print(f"\n{'='*60}")
+        print(f"🔔 WAKTU BEL: {schedule_name}")
+        print(f"⏰ Jadwal: {scheduled_at.strftime('%Y-%m-%d %H:%M:%S')} "
+              f"(callback +{dispatch_ms:.1f} ms)")
+        print(f"🎵 Audio: {audio_file}")
+        print(f"{'='*60}\n")
         
         # Log ke database
         if success:
-            database.add_play_log(schedule_id, audio_file, 'success')
-            print("✅ Audio berhasil diputar")
+            start_ms = (audio_start_at - scheduled_at).total_seconds() * 1000
+            timing['audio_start_at'] = audio_start_at
+            timing['latency_ms'] = round(start_ms, 3)
+            latency.record(backend, dispatch_ms, start_ms)
+            database.add_play_log(schedule_id, audio_file, 'success', '', timing)
+            print(f"✅ Audio berhasil diputar (+{start_ms:.1f} ms, {backend})")
+            return 'success'
         else:
+            latency.record(backend, dispatch_ms)
+            if request.state == 'failed':
+                notes = 'Audio file not found or error playing'
+            elif timed_out:
+                notes = f'Playback queue: not started within {PLAY_START_TIMEOUT}s'
+            else:
+                notes = f'Playback queue: {request.state}'
             database.add_play_log(
                 schedule_id, 
                 audio_file, 
                 'failed', 
-                'Audio file not found or error playing'
+                notes,
+                timing
             )
             print("❌ Gagal memutar audio")
+            return 'failed'
+    
+    def _run_log_retention(self):
+        """Job harian untuk rollup dan pembersihan play_logs"""
+        try:
+            database.run_log_retention()
+        except Exception as e:
+            print(f"❌ Error log retention: {e}")
+        finally:
+            database.release_db_connection()
     
     def remove_job(self, schedule_id):
         """
@@ -148,18 +685,32 @@ class BellScheduler:
         """
         job_id = f"schedule_{schedule_id}"
         try:
-            self.scheduler.remove_job(job_id)
-            if schedule_id in self.jobs:
-                del self.jobs[schedule_id]
+            if self.dispatcher:
+                if not self.dispatcher.remove(schedule_id):
+                    return False
+            else:
+                self.scheduler.remove_job(job_id)
+            self.jobs.pop(schedule_id, None)
+            self.job_specs.pop(schedule_id, None)
             print(f"🗑️  Removed job: {job_id}")
             return True
         except:
             return False
     
     def clear_all_jobs(self):
-        """Menghapus semua jobs (biasanya sebelum reload)"""
-        self.scheduler.remove_all_jobs()
+        """Menghapus semua job jadwal bel"""
+        if self.dispatcher:
+            self.dispatcher.load([])
+            self.jobs = {}
+            self.job_specs = {}
+            return
+        for schedule_id in list(self.jobs):
+            try:
+                self.scheduler.remove_job(f"schedule_{schedule_id}")
+            except Exception:
+                pass
         self.jobs = {}
+        self.job_specs = {}
     
     def get_next_run_time(self, schedule_id):
         """
@@ -169,6 +720,8 @@ class BellScheduler:
         Returns:
             datetime: waktu eksekusi berikutnya
         """
+        if self.dispatcher:
+            return self.dispatcher.next_run_time(schedule_id)
         job_id = f"schedule_{schedule_id}"
         job = self.scheduler.get_job(job_id)
         if job:
@@ -177,6 +730,14 @@ class BellScheduler:
     
     def list_jobs(self):
         """List semua jobs yang aktif (untuk debugging)"""
+        if self.dispatcher:
+            pending = self.dispatcher.pending()
+            print(f"\n📋 Heap Dispatcher ({len(pending)} jadwal):")
+            print("-" * 70)
+            for at, schedule in pending:
+                print(f"{at}  schedule_{schedule['id']}  {schedule['name']}")
+            print("-" * 70)
+            return
         jobs = self.scheduler.get_jobs()
         print(f"\n📋 Active Jobs ({len(jobs)}):")
         print("-" * 70)
@@ -186,40 +747,158 @@ class BellScheduler:
             print(f"Trigger: {job.trigger}")
             print("-" * 70)
     
-    def shutdown(self):
-        """Shutdown scheduler (dipanggil saat aplikasi ditutup)"""
+    def shutdown(self, close_resources=True):
+        """
+        Shutdown scheduler (dipanggil saat aplikasi ditutup)
+        Args:
+            close_resources: False jika proses tetap berjalan sebagai follower
+                             (log writer dan koneksi database tetap dipakai)
+        """
+        self._unsubscribe_holiday()
+        self._unsubscribe_prewarm()
+        self._unsubscribe_catchup()
+        self._unsubscribe_profile()
+        if self.dispatcher:
+            self.dispatcher.stop()
         self.scheduler.shutdown()
+        if close_resources:
+            database.stop_log_writer()
+            database.close_all_connections()
         print("🛑 Scheduler shutdown")
 
 
 # Global scheduler instance (singleton pattern)
 bell_scheduler = None
 
-def init_scheduler():
+def init_scheduler(engine=None):
     """
     Initialize global scheduler
     Panggil fungsi ini saat aplikasi start
+    Args:
+        engine: 'apscheduler' atau 'heap' (default dari setting scheduler_engine)
     """
     global bell_scheduler
-    bell_scheduler = BellScheduler()
+    bell_scheduler = BellScheduler(engine)
     bell_scheduler.load_schedules()
+    bell_scheduler.reconcile_missed_bells()
     return bell_scheduler
 
+def stop_scheduler():
+    """Hentikan scheduler tanpa menutup database (proses turun menjadi follower)"""
+    global bell_scheduler
+    if bell_scheduler:
+        bell_scheduler.shutdown(close_resources=False)
+        bell_scheduler = None
+
 def reload_schedules():
     """
     Reload semua jadwal dari database
     Panggil setiap kali ada perubahan jadwal
+    Di proses follower, perintah diteruskan ke leader
     """
     if bell_scheduler:
         bell_scheduler.load_schedules()
+    elif leader.is_follower():
+        leader.submit('reload_schedules')
+    else:
+        print("⚠️  Scheduler belum diinisialisasi")
+
+def sync_schedule(schedule_id):
+    """
+    Sinkronkan satu jadwal ke scheduler
+    Panggil setelah tambah/edit/hapus/toggle satu jadwal
+    """
+    if bell_scheduler:
+        bell_scheduler.sync_schedule(schedule_id)
+    elif leader.is_follower():
+        leader.submit('sync_schedule', schedule_id=schedule_id)
     else:
         print("⚠️  Scheduler belum diinisialisasi")
 
+def sync_calendar():
+    """
+    Sinkronkan bel tambahan setelah kalender libur/bel tambahan berubah
+    (libur sendiri dicek langsung dari timeline saat bel berbunyi)
+    """
+    if bell_scheduler:
+        if not bell_scheduler.check_profile():
+            bell_scheduler.sync_extra_bells()
+            bell_scheduler.schedule_prewarm()
+    elif leader.is_follower():
+        leader.submit('sync_calendar')
+    else:
+        print("⚠️  Scheduler belum diinisialisasi")
+
+def activate_profile(profile_id):
+    """
+    Jadikan profil sebagai profil default; scheduler langsung berganti
+    jika hari ini tidak ada aturan profil berdasarkan tanggal
+    """
+    database.update_setting('active_profile', str(profile_id))
+
 def get_scheduler():
     """Get scheduler instance"""
     return bell_scheduler
 
 
+# ===== LEADER ELECTION (multi-worker) =====
+
+def _on_elected():
+    init_scheduler()
+    audio_player.init_mixer()
+    audio_player.set_volume(int(database.get_setting('volume') or 80))
+    audio_player.set_cache_size(int(database.get_setting('audio_cache_mb') or 128))
+
+def _on_demoted():
+    playback.shutdown()
+    audio_player.close_mixer()
+    stop_scheduler()
+
+def _leader_state():
+    """State yang dipublikasikan leader untuk dibaca follower"""
+    return {
+        'is_playing': audio_player.is_playing(),
+        'current_file': audio_player.audio_player.current_file,
+        'engine': bell_scheduler.engine if bell_scheduler else None,
+        'active_profile': bell_scheduler.active_profile if bell_scheduler else None,
+        'audio_cache': audio_player.get_cache_stats(),
+        'playback': playback.get_stats(),
+        'backend': audio_player.audio_player.backend,
+        'latency': latency.get_stats(),
+        'dispatcher': bell_scheduler.dispatcher.get_stats()
+                      if bell_scheduler and bell_scheduler.dispatcher else None,
+        'prewarm': bell_scheduler.prewarm if bell_scheduler else None
+    }
+
+def _play_command(audio_path=None, audio_paths=None, priority='announcement', label=None):
+    """Handler perintah play dari follower (satu file atau urutan file)"""
+    playback.play(audio_paths or audio_path, priority, label)
+
+def _from_follower(function):
+    """Handler perintah jadwal: proses follower sudah mengubah database"""
+    def handler(**payload):
+        database.invalidate_schedules()
+        function(**payload)
+    return handler
+
+def start_leader_election():
+    """
+    Jalankan scheduler hanya di proses leader
+    Panggil fungsi ini (bukan init_scheduler) saat aplikasi berjalan
+    dengan beberapa worker; proses follower meneruskan perintah ke leader
+    """
+    election = leader.start_election(_on_elected, _on_demoted, _leader_state)
+    election.register('reload_schedules', _from_follower(reload_schedules))
+    election.register('sync_schedule', _from_follower(sync_schedule))
+    election.register('sync_calendar', _from_follower(sync_calendar))
+    election.register('play', _play_command)
+    election.register('stop', playback.stop)
+    election.register('invalidate_audio',
+                      lambda audio_path: audio_player.invalidate_audio(audio_path))
+    election.start()
+    return election
+
+
 # Testing jika file dijalankan langsung
 if __name__ == '__main__':
     print("🧪 Testing Scheduler...")
@@ -227,6 +906,7 @@ if __name__ == '__main__':
     
     # Initialize database dulu
     database.init_db()
+    database.start_log_writer()
     
     # Initialize scheduler
     scheduler = init_scheduler()
@@ -9,54 +9,29 @@ print("\nAdding sample schedules...")
 # Sample schedules untuk Senin-Jumat
 days = ['Senin', 'Selasa', 'Rabu', 'Kamis', 'Jumat']
 
-for day in days:
-    # Bel Masuk
-    database.add_schedule(
-        name=f"Bel Masuk - {day}",
-        day_of_week=day,
-        time="07:00",
-        audio_file="sample_bell_in.mp3"
-    )
-    
-    # Bel Istirahat 1
-    database.add_schedule(
-        name=f"Bel Istirahat 1 - {day}",
-        day_of_week=day,
-        time="10:00",
-        audio_file="sample_bell_break.mp3"
-    )
-    
-    # Bel Masuk Kelas setelah Istirahat 1
-    database.add_schedule(
-        name=f"Bel Masuk Kelas - {day}",
-        day_of_week=day,
-        time="10:15",
-        audio_file="sample_bell_in.mp3"
-    )
-    
-    # Bel Istirahat 2
-    database.add_schedule(
-        name=f"Bel Istirahat 2 - {day}",
-        day_of_week=day,
-        time="12:00",
-        audio_file="sample_bell_break.mp3"
-    )
-    
-    # Bel Masuk Kelas setelah Istirahat 2
-    database.add_schedule(
-        name=f"Bel Masuk Kelas 2 - {day}",
-        day_of_week=day,
-        time="12:30",
-        audio_file="sample_bell_in.mp3"
-    )
-    
-    # Bel Pulang
-    database.add_schedule(
-        name=f"Bel Pulang - {day}",
-        day_of_week=day,
-        time="15:00",
-        audio_file="sample_bell_home.mp3"
-    )
+# Jadwal harian: (nama, waktu, audio)
+daily_bells = [
+    ("Bel Masuk", "07:00", "sample_bell_in.mp3"),
+    ("Bel Istirahat 1", "10:00", "sample_bell_break.mp3"),
+    ("Bel Masuk Kelas", "10:15", "sample_bell_in.mp3"),      # setelah Istirahat 1
+    ("Bel Istirahat 2", "12:00", "sample_bell_break.mp3"),
+    ("Bel Masuk Kelas 2", "12:30", "sample_bell_in.mp3"),    # setelah Istirahat 2
+    ("Bel Pulang", "15:00", "sample_bell_home.mp3"),
+]
+
+# Satu baris per bel, berlaku Senin-Jumat (bitmask hari)
+schedules = []
+for name, time, audio_file in daily_bells:
+    schedule, _ = database.validate_schedule({
+        'name': name,
+        'days': days,
+        'time': time,
+        'audio_file': audio_file
+    })
+    schedules.append(schedule)
+
+# Simpan semua jadwal dalam satu transaksi
+database.bulk_import_schedules(schedules)
 
 print(f"\nSample schedules added for {', '.join(days)}")
 
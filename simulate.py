@@ -0,0 +1,219 @@
+"""
+Simulation Module untuk School Bell System
+Dry-run jadwal untuk rentang tanggal: semua bel (jadwal mingguan, profil,
+libur, bel tambahan) dijabarkan dari timeline yang dikompilasi, tanpa
+menyentuh APScheduler, lalu dicek bentrok (audio yang masih berbunyi saat
+bel berikutnya mulai, memakai durasi audio) dan celah panjang
+
+CLI:
+    python simulate.py 2026-07-13 2027-06-30 [--profile 2] [--events] [--json]
+"""
+
+import argparse
+import json
+import time
+from collections import defaultdict
+from datetime import date as date_type, datetime, timedelta
+import conflicts
+import database
+import timeline
+
+MAX_SIMULATION_DAYS = 400
+DEFAULT_MAX_GAP_MINUTES = 120
+
+
+def build_timeline(date_from, profile_id=None):
+    """
+    Timeline khusus simulasi: semua entri kalender yang masih berlaku di
+    rentang (bukan hanya 30 hari terakhir seperti timeline scheduler)
+    Args:
+        profile_id: paksa satu profil untuk semua tanggal (aturan profil
+                    diabaikan), untuk menguji profil sebelum dipakai
+    """
+    schedules = database.get_all_schedules()
+    exceptions = database.get_schedule_exceptions(date_from.isoformat())
+    if profile_id is None:
+        default_profile = database.get_active_profile_id()
+    else:
+        default_profile = profile_id
+        exceptions = [e for e in exceptions if e['kind'] != 'profile']
+    return timeline.ScheduleTimeline(schedules, exceptions, default_profile=default_profile)
+
+
+def simulate(date_from, date_to, profile_id=None, max_gap_minutes=DEFAULT_MAX_GAP_MINUTES,
+             include_events=False):
+    """
+    Jabarkan semua bel dari date_from sampai date_to (inklusif)
+    Returns:
+        dict: ringkasan per hari, bentrok (audio tumpang tindih), celah
+              lebih dari max_gap_minutes antar bel di hari yang sama, hari
+              sekolah tanpa bel, dan (opsional) daftar semua bel
+    Raises:
+        ValueError: jika rentang tidak valid/terlalu panjang atau profil tidak ada
+    """
+    if date_to < date_from:
+        raise ValueError('Tanggal akhir tidak boleh sebelum tanggal awal')
+    if (date_to - date_from).days + 1 > MAX_SIMULATION_DAYS:
+        raise ValueError(f'Rentang simulasi maksimal {MAX_SIMULATION_DAYS} hari')
+    if profile_id is not None and database.get_profile(profile_id) is None:
+        raise ValueError('Profil tidak ditemukan')
+
+    started = time.perf_counter()
+    compiled = build_timeline(date_from, profile_id)
+    durations = database.get_audio_durations()
+    # occurrences() mulai setelah start: bel 00:00:00 tetap ikut, 23:59:xx kemarin tidak
+    start = datetime.combine(date_from, datetime.min.time()) - timedelta(microseconds=1)
+    end = datetime.combine(date_to, datetime.max.time())
+
+    by_day = defaultdict(list)
+    for at, schedule in compiled.occurrences(start, end):
+        by_day[at.date()].append((at, schedule))
+
+    days = []
+    events = []
+    overlaps = []
+    gaps = []
+    empty_days = []
+    max_gap = timedelta(minutes=max_gap_minutes)
+    day = date_from
+    while day <= date_to:
+        bells = by_day.get(day, [])
+        day_profile = compiled.profile_for(day)
+        holiday = compiled.is_holiday(day)
+        days.append({
+            'date': day.isoformat(),
+            'day': database.DAY_NAMES[day.weekday()],
+            'profile_id': day_profile,
+            'holiday': holiday,
+            'bells': len(bells)
+        })
+        # Hari yang biasanya ada bel (menurut profil hari itu) tapi kosong
+        if not bells and not holiday and compiled.day_schedules(day.weekday(), day_profile):
+            empty_days.append(day.isoformat())
+
+        previous = None
+        playing = None  # (selesai, schedule) audio yang berakhir paling akhir
+        for at, schedule in bells:
+            if include_events:
+                events.append(_event(at, schedule, day_profile))
+            if previous is not None and at - previous > max_gap:
+                gaps.append({
+                    'date': day.isoformat(),
+                    'from': _clock_time(previous),
+                    'to': _clock_time(at),
+                    'minutes': int((at - previous).total_seconds() // 60)
+                })
+            ends = at + timedelta(seconds=conflicts.bell_duration(durations, schedule['audio_file']))
+            if playing is not None and at < playing[0]:
+                overlaps.append({
+                    'at': at.isoformat(),
+                    'overlap_seconds': round((min(ends, playing[0]) - at).total_seconds(), 1),
+                    'schedules': [_label(playing[1]), _label(schedule)]
+                })
+            if playing is None or ends > playing[0]:
+                playing = (ends, schedule)
+            previous = at
+        day += timedelta(days=1)
+
+    result = {
+        'from': date_from.isoformat(),
+        'to': date_to.isoformat(),
+        'profile_id': profile_id,
+        'total_bells': sum(item['bells'] for item in days),
+        'school_days': sum(1 for item in days if item['bells']),
+        'holidays': sum(1 for item in days if item['holiday']),
+        'days': days,
+        'conflicts': overlaps,
+        'gaps': gaps,
+        'empty_days': empty_days,
+        'elapsed_ms': 0.0
+    }
+    if include_events:
+        result['events'] = events
+    result['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 2)
+    return result
+
+
+def _event(at, schedule, profile_id):
+    return {
+        'at': at.isoformat(),
+        'date': at.date().isoformat(),
+        'time': _clock_time(at),
+        'schedule_id': schedule['id'],
+        'name': schedule['name'],
+        'audio_file': schedule['audio_file'],
+        'profile_id': None if schedule.get('extra') else profile_id,
+        'extra': bool(schedule.get('extra'))
+    }
+
+
+def _clock_time(at):
+    """Jam bel 'HH:MM', atau 'HH:MM:SS' jika jadwal memakai detik"""
+    return at.strftime('%H:%M:%S' if at.second else '%H:%M')
+
+
+def _label(schedule):
+    return {
+        'schedule_id': schedule['id'],
+        'name': schedule['name'],
+        'audio_file': schedule['audio_file']
+    }
+
+
+def parse_date(value):
+    """'YYYY-MM-DD' ke date (ValueError jika format salah)"""
+    try:
+        return date_type.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'Format tanggal tidak valid: {value} (YYYY-MM-DD)')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Simulasi (dry-run) jadwal bel')
+    parser.add_argument('date_from', type=parse_date, help='Tanggal awal (YYYY-MM-DD)')
+    parser.add_argument('date_to', type=parse_date, help='Tanggal akhir (YYYY-MM-DD)')
+    parser.add_argument('--profile', type=int, help='Paksa satu profil untuk semua tanggal')
+    parser.add_argument('--max-gap', type=int, default=DEFAULT_MAX_GAP_MINUTES,
+                        help='Celah antar bel (menit) yang dilaporkan')
+    parser.add_argument('--events', action='store_true', help='Tampilkan semua bel')
+    parser.add_argument('--json', action='store_true', help='Output JSON')
+    args = parser.parse_args(argv)
+
+    database.init_db()
+    try:
+        result = simulate(args.date_from, args.date_to, args.profile, args.max_gap,
+                          include_events=args.events)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return 0
+
+    print(f"\n🧪 Simulasi {result['from']} s/d {result['to']}")
+    print("=" * 60)
+    print(f"🔔 Total bel      : {result['total_bells']}")
+    print(f"🏫 Hari sekolah   : {result['school_days']}")
+    print(f"🏖️  Hari libur     : {result['holidays']}")
+    print(f"⏱️  Waktu simulasi : {result['elapsed_ms']} ms")
+
+    if args.events:
+        print("\n📋 Bel:")
+        for event in result['events']:
+            print(f"  {event['date']} {event['time']}  {event['name']} ({event['audio_file']})")
+
+    print(f"\n⚠️  Bentrok ({len(result['conflicts'])}):")
+    for conflict in result['conflicts']:
+        names = ', '.join(item['name'] for item in conflict['schedules'])
+        print(f"  {conflict['at']}  {names}")
+    print(f"\n⏳ Celah > {args.max_gap} menit ({len(result['gaps'])}):")
+    for gap in result['gaps']:
+        print(f"  {gap['date']} {gap['from']} - {gap['to']} ({gap['minutes']} menit)")
+    print(f"\n📭 Hari sekolah tanpa bel ({len(result['empty_days'])}):")
+    for day in result['empty_days']:
+        print(f"  {day}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -17,19 +17,24 @@ function playAnnouncement() {
             'Content-Type': 'application/json'
         },
         body: JSON.stringify({
-            audio_file: audioFile
+            audio_file: audioFile,
+            priority: document.getElementById('prioritySelect').value
         })
     })
     .then(response => response.json())
     .then(result => {
         if (result.success) {
-            showNotification('Audio sedang diputar', 'success');
+            if (result.state === 'queued') {
+                showNotification('Audio masuk antrian, diputar setelah audio sekarang selesai', 'info');
+            } else {
+                showNotification('Audio sedang diputar', 'success');
+            }
             updatePlayingStatus(true, audioSelect.options[audioSelect.selectedIndex].text);
             
             // Start checking status
             startStatusCheck();
         } else {
-            showNotification('Gagal memutar audio', 'danger');
+            showNotification('Gagal memutar audio' + (result.error ? ': ' + result.error : ''), 'danger');
         }
     })
     .catch(error => {
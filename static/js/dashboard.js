@@ -52,7 +52,7 @@ function loadNextSchedule() {
                         <div class="col-md-9">
                             <h4>${schedule.name}</h4>
                             <p class="mb-1">
-                                <i class="bi bi-calendar"></i> <strong>${data.current_day}</strong>
+                                <i class="bi bi-calendar"></i> <strong>${schedule.day || data.current_day}</strong>
                                 <i class="bi bi-clock ms-3"></i> <strong>${schedule.time}</strong>
                             </p>
                             <p class="mb-0 text-muted">
@@ -65,7 +65,7 @@ function loadNextSchedule() {
                 nextScheduleInfo.innerHTML = `
                     <div class="text-center text-muted py-3">
                         <i class="bi bi-calendar-x" style="font-size: 3rem;"></i>
-                        <p class="mt-2 mb-0">Tidak ada jadwal berikutnya hari ini</p>
+                        <p class="mt-2 mb-0">Tidak ada jadwal berikutnya</p>
                     </div>
                 `;
             }
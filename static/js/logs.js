@@ -1,18 +1,67 @@
 // Logs JavaScript
 
+const LOG_PAGE_SIZE = 100;
+let loadedLogs = [];
+let nextLogCursor = null;
+
+// Query string dari form filter
+function getLogFilterParams() {
+    const params = new URLSearchParams();
+    const status = document.getElementById('filterStatus')?.value;
+    const dateFrom = document.getElementById('filterDateFrom')?.value;
+    const dateTo = document.getElementById('filterDateTo')?.value;
+
+    if (status) params.set('status', status);
+    if (dateFrom) params.set('date_from', dateFrom);
+    if (dateTo) params.set('date_to', dateTo);
+    return params;
+}
+
+function fetchLogPage(cursor) {
+    const params = getLogFilterParams();
+    params.set('limit', LOG_PAGE_SIZE);
+    if (cursor) params.set('cursor', cursor);
+
+    return fetch(`/api/logs?${params.toString()}`)
+        .then(response => {
+            nextLogCursor = response.headers.get('X-Next-Cursor');
+            return response.json();
+        });
+}
+
 function loadLogs() {
-    fetch('/api/logs?limit=100')
-        .then(response => response.json())
+    fetchLogPage(null)
         .then(logs => {
-            updateLogTable(logs);
-            updateStatistics(logs);
+            loadedLogs = logs;
+            updateLogTable(loadedLogs);
+            updateLoadMoreButton();
         })
         .catch(error => console.error('Error loading logs:', error));
+    loadStatistics();
+}
+
+function loadMoreLogs() {
+    if (!nextLogCursor) return;
+
+    fetchLogPage(nextLogCursor)
+        .then(logs => {
+            loadedLogs = loadedLogs.concat(logs);
+            updateLogTable(loadedLogs);
+            updateLoadMoreButton();
+        })
+        .catch(error => console.error('Error loading more logs:', error));
+}
+
+function updateLoadMoreButton() {
+    const button = document.getElementById('loadMoreLogs');
+    if (button) {
+        button.classList.toggle('d-none', !nextLogCursor);
+    }
 }
 
 function updateLogTable(logs) {
     const tbody = document.getElementById('logsTableBody');
-    
+
     if (logs.length === 0) {
         tbody.innerHTML = `
             <tr>
@@ -21,7 +70,7 @@ function updateLogTable(logs) {
         `;
         return;
     }
-    
+
     tbody.innerHTML = logs.map(log => {
         let statusBadge = '';
         if (log.status === 'success') {
@@ -32,28 +81,46 @@ function updateLogTable(logs) {
             statusBadge = '<span class="badge bg-info"><i class="bi bi-hand-index"></i> Manual</span>';
         } else if (log.status === 'cancelled') {
             statusBadge = '<span class="badge bg-warning"><i class="bi bi-dash-circle"></i> Dibatalkan</span>';
+        } else if (log.status === 'missed') {
+            statusBadge = '<span class="badge bg-secondary"><i class="bi bi-clock-history"></i> Terlewat</span>';
+        } else if (log.status === 'warning') {
+            statusBadge = '<span class="badge bg-warning text-dark"><i class="bi bi-exclamation-triangle"></i> Peringatan</span>';
         }
-        
+
         return `
             <tr>
                 <td>${log.played_at}</td>
                 <td>${log.schedule_name || '<span class="badge bg-info">Manual</span>'}</td>
                 <td>${log.audio_file}</td>
-                <td>${statusBadge}</td>
+                <td>${statusBadge}${log.latency_ms != null ? ` <small class="text-muted">+${Math.round(log.latency_ms)} ms</small>` : ''}</td>
                 <td><small class="text-muted">${log.notes || '-'}</small></td>
             </tr>
         `;
     }).join('');
 }
 
-function updateStatistics(logs) {
-    const successCount = logs.filter(log => log.status === 'success').length;
-    const failedCount = logs.filter(log => log.status === 'failed').length;
-    const manualCount = logs.filter(log => log.status === 'manual_play').length;
-    
-    document.getElementById('successCount').textContent = successCount;
-    document.getElementById('failedCount').textContent = failedCount;
-    document.getElementById('manualCount').textContent = manualCount;
+// Statistik dibaca dari rollup harian (30 hari terakhir)
+function loadStatistics() {
+    fetch('/api/logs/daily?days=30')
+        .then(response => response.json())
+        .then(data => {
+            const totals = data.totals || {};
+            document.getElementById('successCount').textContent = totals.success || 0;
+            document.getElementById('failedCount').textContent = totals.failed || 0;
+            document.getElementById('manualCount').textContent = totals.manual_play || 0;
+        })
+        .catch(error => console.error('Error loading statistics:', error));
+}
+
+function applyLogFilters(event) {
+    event.preventDefault();
+    loadLogs();
+}
+
+function exportLogs(format) {
+    const params = getLogFilterParams();
+    params.set('format', format);
+    window.location.href = `/api/logs/export?${params.toString()}`;
 }
 
 function refreshLogs() {
@@ -64,5 +131,9 @@ function refreshLogs() {
 // Load logs saat halaman dimuat
 document.addEventListener('DOMContentLoaded', loadLogs);
 
-// Auto refresh setiap 30 detik
-setInterval(loadLogs, 30000);
+// Auto refresh setiap 30 detik (hanya jika masih di halaman pertama)
+setInterval(() => {
+    if (loadedLogs.length <= LOG_PAGE_SIZE) {
+        loadLogs();
+    }
+}, 30000);
@@ -3,23 +3,31 @@
 let isEditMode = false;
 let editScheduleId = null;
 
-function saveSchedule() {
+function saveSchedule(force = false) {
     const name = document.getElementById('scheduleName').value;
-    const dayOfWeek = document.getElementById('scheduleDayOfWeek').value;
+    const days = Array.from(document.querySelectorAll('.schedule-day:checked'))
+        .map(input => parseInt(input.value, 10));
     const time = document.getElementById('scheduleTime').value;
     const audioFile = document.getElementById('scheduleAudioFile').value;
     
-    if (!name || !dayOfWeek || !time || !audioFile) {
+    if (!name || days.length === 0 || !time || !audioFile) {
         showNotification('Mohon lengkapi semua field', 'warning');
         return;
     }
     
     const data = {
         name: name,
-        day_of_week: dayOfWeek,
+        days: days,
         time: time,
         audio_file: audioFile
     };
+    const profileSelect = document.getElementById('profileSelect');
+    if (profileSelect && !isEditMode) {
+        data.profile_id = parseInt(profileSelect.value, 10);
+    }
+    if (force) {
+        data.force = true;
+    }
     
     const url = isEditMode ? `/api/schedules/${editScheduleId}` : '/api/schedules';
     const method = isEditMode ? 'PUT' : 'POST';
@@ -38,6 +46,9 @@ function saveSchedule() {
                 isEditMode ? 'Jadwal berhasil diupdate' : 'Jadwal berhasil ditambahkan',
                 'success'
             );
+            if (result.conflicts && result.conflicts.length > 0) {
+                showNotification(`Jadwal bentrok dengan: ${formatConflicts(result.conflicts)}`, 'warning');
+            }
             
             // Close modal
             const modal = bootstrap.Modal.getInstance(document.getElementById('addScheduleModal'));
@@ -52,6 +63,13 @@ function saveSchedule() {
             setTimeout(() => {
                 location.reload();
             }, 1000);
+        } else if (result.conflicts && !force) {
+            // conflict_policy=reject: simpan hanya jika pengguna setuju
+            if (confirm(`Jadwal bentrok dengan: ${formatConflicts(result.conflicts)}\nTetap simpan?`)) {
+                saveSchedule(true);
+            }
+        } else {
+            showNotification(result.error || 'Gagal menyimpan jadwal', 'danger');
         }
     })
     .catch(error => {
@@ -60,6 +78,41 @@ function saveSchedule() {
     });
 }
 
+function formatConflicts(conflicts) {
+    return conflicts
+        .map(c => `${c.name} (${c.time}, ${c.days.join(', ')})`)
+        .join('; ');
+}
+
+function selectProfile(profileId) {
+    window.location.href = `/schedules?profile_id=${profileId}`;
+}
+
+function activateProfile(profileId) {
+    if (!confirm('Jadikan profil ini sebagai jadwal aktif?')) {
+        return;
+    }
+    
+    fetch(`/api/profiles/${profileId}/activate`, {
+        method: 'POST'
+    })
+    .then(response => response.json())
+    .then(result => {
+        if (result.success) {
+            showNotification('Profil jadwal diaktifkan', 'success');
+            setTimeout(() => {
+                location.reload();
+            }, 1000);
+        } else {
+            showNotification(result.error || 'Gagal mengaktifkan profil', 'danger');
+        }
+    })
+    .catch(error => {
+        console.error('Error activating profile:', error);
+        showNotification('Gagal mengaktifkan profil', 'danger');
+    });
+}
+
 function editSchedule(scheduleId) {
     // Ambil data schedule
     fetch('/api/schedules')
@@ -70,7 +123,9 @@ function editSchedule(scheduleId) {
             if (schedule) {
                 // Set form values
                 document.getElementById('scheduleName').value = schedule.name;
-                document.getElementById('scheduleDayOfWeek').value = schedule.day_of_week;
+                document.querySelectorAll('.schedule-day').forEach(input => {
+                    input.checked = schedule.days.includes(parseInt(input.value, 10));
+                });
                 document.getElementById('scheduleTime').value = schedule.time;
                 document.getElementById('scheduleAudioFile').value = schedule.audio_file;
                 
@@ -0,0 +1,82 @@
+"""
+Regression test scheduler lewat fast-forward harness
+Satu minggu jadwal tetap (bel harian, libur satu hari, bel tambahan Sabtu)
+dijalankan dengan jam virtual; setiap bel harus berbunyi tepat sesuai
+simulate.py, tanpa bel yang hilang atau tidak diharapkan
+
+Jalankan dari root project:
+    python -m unittest discover -s tests
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from datetime import date, datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import database
+import fastforward
+
+# File audio yang ikut di repo (scheduler memutar dari static/audio)
+AUDIO_FILE = 'Arab_Jam_1_Mulai_20251111_010925.mp3'
+START = date(2026, 11, 2)  # Senin
+WEEKDAYS = ['Senin', 'Selasa', 'Rabu', 'Kamis', 'Jumat']
+
+
+def build_fixture(path):
+    """Database baru berisi jadwal fixture untuk minggu START"""
+    database.close_all_connections()
+    database.DATABASE_PATH = path
+    database.init_db()
+    for name, time in (('Bel Masuk', '07:00'), ('Bel Istirahat', '10:00'),
+                       ('Bel Masuk Kelas', '10:15:30'), ('Bel Pulang', '15:00')):
+        database.add_schedule(name, WEEKDAYS, time, AUDIO_FILE)
+    # Rabu libur, Sabtu ada satu bel tambahan
+    database.add_schedule_exception('2026-11-04', note='Libur fixture')
+    database.add_schedule_exception('2026-11-07', kind='extra', time='09:00',
+                                    audio_file=AUDIO_FILE, name='Bel Tambahan')
+    database.close_all_connections()
+
+
+class FastForwardTest(unittest.TestCase):
+
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._database_path = database.DATABASE_PATH
+        os.chdir(ROOT)
+        self._workdir = tempfile.TemporaryDirectory(prefix='school_bell_test_')
+        fixture = os.path.join(self._workdir.name, 'fixture.db')
+        build_fixture(fixture)
+        fastforward.prepare_database(fixture)
+
+    def tearDown(self):
+        database.close_all_connections()
+        database.DATABASE_PATH = self._database_path
+        database.invalidate_schedules()
+        os.chdir(self._cwd)
+        self._workdir.cleanup()
+
+    def test_week_matches_simulation(self):
+        result = fastforward.run(START, days=7)
+
+        # 4 bel x 4 hari sekolah + 1 bel tambahan; 4 bel hari Rabu dibatalkan
+        self.assertEqual(result['expected'], 17)
+        self.assertEqual(result['missing'], [])
+        self.assertEqual(result['unexpected'], [])
+        self.assertEqual(result['statuses'], {'success': 17, 'cancelled': 4})
+
+    def test_outage_over_extra_bell(self):
+        # Scheduler mati 30 menit melewati bel tambahan Sabtu 09:00
+        result = fastforward.run(START, days=7, outages=[(datetime(2026, 11, 7, 8, 50), 30)])
+
+        self.assertEqual(result['missing'], [])
+        self.assertEqual(result['unexpected'], [])
+        self.assertEqual(result['outage_missed'], 1)
+        self.assertEqual(result['statuses'], {'success': 16, 'cancelled': 4, 'missed': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
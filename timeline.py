@@ -0,0 +1,434 @@
+"""
+Timeline Module untuk School Bell System
+Jadwal mingguan yang sudah dikompilasi di memori, dipakai bersama oleh
+scheduler, /api/status dan API client untuk lookup jadwal berikutnya
+"""
+
+import bisect
+import heapq
+import itertools
+import threading
+from datetime import date as date_type, datetime, timedelta
+import clock
+import database
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+MAX_LOOKAHEAD_DAYS = 366
+
+
+def parse_seconds(time_str):
+    """Konversi 'HH:MM' atau 'HH:MM:SS' ke detik sejak tengah malam"""
+    parts = [int(part) for part in time_str.split(':')]
+    return parts[0] * 3600 + parts[1] * 60 + (parts[2] if len(parts) > 2 else 0)
+
+
+def parse_minute(time_str):
+    """Konversi 'HH:MM[:SS]' ke menit sejak tengah malam (detik dibuang)"""
+    return parse_seconds(time_str) // 60
+
+
+def minute_of_day(now):
+    """Menit sejak tengah malam untuk datetime"""
+    return now.hour * 60 + now.minute
+
+
+def second_of_day(now):
+    """Detik sejak tengah malam untuk datetime"""
+    return now.hour * 3600 + now.minute * 60 + now.second
+
+
+def seconds_until(second, now):
+    """Detik dari now sampai detik-ke-N hari ini (0 jika sudah lewat)"""
+    return max(0, second - second_of_day(now))
+
+
+class IntervalIndex:
+    """
+    Rentang tanggal (ordinal, inklusif) yang digabung menjadi interval
+    terurut tanpa overlap, sehingga lookup cukup satu bisect
+    """
+
+    def __init__(self, ranges=()):
+        merged = []
+        for start, end in sorted(ranges):
+            if merged and start <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        self.starts = [start for start, _ in merged]
+        self.ends = [end for _, end in merged]
+
+    def __len__(self):
+        return len(self.starts)
+
+    def find(self, ordinal):
+        """Ordinal akhir interval yang memuat ordinal, atau None"""
+        index = bisect.bisect_right(self.starts, ordinal) - 1
+        if index >= 0 and ordinal <= self.ends[index]:
+            return self.ends[index]
+        return None
+
+
+class RangeMap:
+    """
+    Rentang tanggal (ordinal, inklusif) -> nilai, untuk aturan profil
+    Jika rentang overlap, rentang yang ditambahkan belakangan menang
+    """
+
+    def __init__(self, ranges=()):
+        ranges = list(ranges)
+        points = sorted({start for start, _, _ in ranges} | {end + 1 for _, end, _ in ranges})
+        self.starts = []
+        self.values = []
+        for point in points:
+            value = None
+            for start, end, candidate in ranges:
+                if start <= point <= end:
+                    value = candidate
+            if self.values and self.values[-1] == value:
+                continue
+            self.starts.append(point)
+            self.values.append(value)
+
+    def __len__(self):
+        return sum(1 for value in self.values if value is not None)
+
+    def get(self, ordinal, default=None):
+        """Nilai untuk ordinal tanggal, atau default jika tidak ada rentang"""
+        index = bisect.bisect_right(self.starts, ordinal) - 1
+        if index < 0 or self.values[index] is None:
+            return default
+        return self.values[index]
+
+
+class ProfileTimeline:
+    """
+    Jadwal aktif satu profil per hari (0 = Senin) dalam bentuk array terurut:
+    detik sejak tengah malam dan referensi jadwal yang paralel,
+    sehingga jadwal berikutnya bisa dicari dengan bisect
+    """
+
+    def __init__(self, profile_id, schedules=()):
+        self.profile_id = profile_id
+        self.seconds = [[] for _ in range(7)]
+        self.schedules = [[] for _ in range(7)]
+
+        self.active = []
+        entries = [[] for _ in range(7)]
+        for schedule in schedules:
+            if not schedule['is_active']:
+                continue
+            item = dict(schedule)
+            item['second'] = parse_seconds(item['time'])
+            item['minute'] = item['second'] // 60
+            self.active.append(item)
+            # Satu jadwal bisa berlaku di beberapa hari (days_mask)
+            for day in database.mask_to_days(schedule['days_mask']):
+                entries[day].append(item)
+
+        for day, items in enumerate(entries):
+            items.sort(key=lambda item: (item['second'], item['id']))
+            self.seconds[day] = [item['second'] for item in items]
+            self.schedules[day] = items
+
+    def __len__(self):
+        return len(self.active)
+
+
+class ScheduleTimeline:
+    """
+    Semua profil jadwal yang sudah dikompilasi plus kalender (libur, bel
+    tambahan, aturan profil per tanggal). Pindah profil cukup memilih
+    ProfileTimeline lain, tidak perlu kompilasi ulang
+    """
+
+    def __init__(self, schedules, exceptions=(), version=0,
+                 default_profile=database.DEFAULT_PROFILE_ID):
+        self.version = version
+        self.default_profile = default_profile
+
+        by_profile = {default_profile: []}
+        self.schedule_profiles = {}
+        for schedule in schedules:
+            profile_id = schedule.get('profile_id', database.DEFAULT_PROFILE_ID)
+            by_profile.setdefault(profile_id, []).append(schedule)
+            self.schedule_profiles[schedule['id']] = profile_id
+        self.profiles = {
+            profile_id: ProfileTimeline(profile_id, items)
+            for profile_id, items in by_profile.items()
+        }
+
+        exceptions = [dict(exception) for exception in exceptions]
+        for exception in exceptions:
+            exception['start'] = date_type.fromisoformat(exception['date']).toordinal()
+            exception['end'] = date_type.fromisoformat(
+                exception.get('end_date') or exception['date']
+            ).toordinal()
+
+        # Aturan profil dulu, karena libur/bel tambahan per profil bergantung padanya
+        self.profile_rules = RangeMap(
+            (exception['start'], exception['end'], exception['profile_id'])
+            for exception in sorted(exceptions, key=lambda e: e['id'])
+            if exception.get('kind') == 'profile' and exception['profile_id'] in self.profiles
+        )
+
+        # Kalender: libur semua jadwal, libur per profil, libur per jadwal, bel tambahan
+        holidays = []
+        profile_holidays = {}
+        skips = {}
+        extras = []
+        for exception in exceptions:
+            kind = exception.get('kind') or 'skip'
+            start, end = exception['start'], exception['end']
+            profile_id = exception.get('profile_id')
+            if kind == 'extra':
+                extras.extend(self._extra_bells(exception, start, end))
+            elif kind != 'skip':
+                continue
+            elif exception['schedule_id'] is not None:
+                skips.setdefault(exception['schedule_id'], []).append((start, end))
+            elif profile_id is not None:
+                profile_holidays.setdefault(profile_id, []).append((start, end))
+            else:
+                holidays.append((start, end))
+        self.holidays = IntervalIndex(holidays)
+        self.profile_holidays = {
+            profile_id: IntervalIndex(ranges) for profile_id, ranges in profile_holidays.items()
+        }
+        self.schedule_skips = {
+            schedule_id: IntervalIndex(ranges) for schedule_id, ranges in skips.items()
+        }
+        extras.sort(key=lambda extra: (extra[0], extra[1]['exception_id']))
+        self.extra_times = [at for at, _ in extras]
+        self.extras = extras
+
+    def _extra_bells(self, exception, start, end):
+        """Bel tambahan satu kali untuk setiap tanggal dalam rentang (dan profilnya)"""
+        item = {
+            'id': None,
+            'exception_id': exception['id'],
+            'name': exception.get('name') or 'Bel tambahan',
+            'time': exception['time'],
+            'audio_file': exception['audio_file'],
+            'second': parse_seconds(exception['time']),
+            'minute': parse_minute(exception['time']),
+            'days_mask': 0,
+            'is_active': 1,
+            'extra': True
+        }
+        for ordinal in range(start, end + 1):
+            profile_id = exception.get('profile_id')
+            if profile_id is not None and self._profile_for_ordinal(ordinal) != profile_id:
+                continue
+            at = datetime.combine(date_type.fromordinal(ordinal), datetime.min.time())
+            yield at + timedelta(seconds=item['second']), item
+
+    def _profile_for_ordinal(self, ordinal):
+        return self.profile_rules.get(ordinal, self.default_profile)
+
+    def profile_for(self, date):
+        """Profil yang berlaku pada tanggal tertentu (aturan tanggal atau default)"""
+        return self._profile_for_ordinal(date.toordinal())
+
+    def profile(self, profile_id=None):
+        """ProfileTimeline untuk profil tertentu (default: profil hari ini)"""
+        if profile_id is None:
+            profile_id = self.profile_for(clock.now().date())
+        return self.profiles.get(profile_id) or ProfileTimeline(profile_id)
+
+    def __len__(self):
+        return len(self.profile())
+
+    def all_schedules(self, profile_id=None):
+        """Semua jadwal aktif satu profil (satu entri per jadwal, walau berlaku di banyak hari)"""
+        return self.profile(profile_id).active
+
+    def day_schedules(self, day, profile_id=None):
+        """Jadwal aktif untuk satu hari (urut waktu)"""
+        return self.profile(profile_id).schedules[day]
+
+    def next_on_day(self, day, second, profile_id=None):
+        """Jadwal pertama di hari tersebut setelah detik-ke-N, atau None"""
+        profile = self.profile(profile_id)
+        index = bisect.bisect_right(profile.seconds[day], second)
+        if index < len(profile.schedules[day]):
+            return profile.schedules[day][index]
+        return None
+
+    def split_day(self, day, second, profile_id=None):
+        """
+        Bagi jadwal hari tersebut menjadi yang sudah lewat (< second)
+        dan yang akan datang (>= second)
+        """
+        profile = self.profile(profile_id)
+        index = bisect.bisect_left(profile.seconds[day], second)
+        return profile.schedules[day][:index], profile.schedules[day][index:]
+
+    def is_skipped(self, date, schedule_id):
+        """
+        Cek apakah jadwal tidak berbunyi pada tanggal tertentu (O(log n)):
+        libur, pengecualian jadwal, atau jadwal bukan milik profil hari itu
+        """
+        ordinal = date.toordinal()
+        if self.holidays.find(ordinal) is not None:
+            return True
+        profile_id = self._profile_for_ordinal(ordinal)
+        if schedule_id in self.schedule_profiles and \
+                self.schedule_profiles[schedule_id] != profile_id:
+            return True
+        return self._is_skipped_in_profile(ordinal, profile_id, schedule_id)
+
+    def _is_skipped_in_profile(self, ordinal, profile_id, schedule_id):
+        holidays = self.profile_holidays.get(profile_id)
+        if holidays is not None and holidays.find(ordinal) is not None:
+            return True
+        skips = self.schedule_skips.get(schedule_id)
+        return skips is not None and skips.find(ordinal) is not None
+
+    def is_holiday(self, date):
+        """Cek apakah tanggal termasuk libur untuk semua jadwal (atau profil hari itu)"""
+        ordinal = date.toordinal()
+        if self.holidays.find(ordinal) is not None:
+            return True
+        holidays = self.profile_holidays.get(self._profile_for_ordinal(ordinal))
+        return holidays is not None and holidays.find(ordinal) is not None
+
+    def extras_on(self, date):
+        """Bel tambahan pada tanggal tertentu (urut waktu)"""
+        midnight = datetime.combine(date, datetime.min.time())
+        lo = bisect.bisect_left(self.extra_times, midnight)
+        hi = bisect.bisect_left(self.extra_times, midnight + timedelta(days=1))
+        return [item for _, item in self.extras[lo:hi]]
+
+    def schedules_on(self, date):
+        """Bel yang berbunyi pada tanggal tertentu: jadwal profil hari itu tanpa yang libur, plus bel tambahan"""
+        profile = self.profile(self.profile_for(date))
+        items = [
+            schedule for schedule in profile.schedules[date.weekday()]
+            if not self.is_skipped(date, schedule['id'])
+        ]
+        extras = self.extras_on(date)
+        if extras:
+            items = sorted(items + extras, key=lambda item: item['second'])
+        return items
+
+    def extra_bells(self, start, end=None):
+        """Generator bel tambahan (datetime, item) setelah start sampai end"""
+        index = bisect.bisect_right(self.extra_times, start)
+        for at, item in self.extras[index:]:
+            if end is not None and at > end:
+                return
+            yield at, item
+
+    def _weekly(self, start, end):
+        """
+        Generator jadwal mingguan setelah start, hari demi hari memakai
+        profil yang berlaku; rentang libur dilompati sekaligus
+        """
+        if not any(self.profiles.values()):
+            return
+        if end is None:
+            end = start + timedelta(days=MAX_LOOKAHEAD_DAYS)
+
+        day = start.date()
+        second = second_of_day(start)
+        while True:
+            midnight = datetime.combine(day, datetime.min.time())
+            if midnight > end:
+                return
+            ordinal = day.toordinal()
+            holiday_end = self.holidays.find(ordinal)
+            if holiday_end is not None:
+                day = date_type.fromordinal(holiday_end + 1)
+                second = -1
+                continue
+
+            profile_id = self._profile_for_ordinal(ordinal)
+            profile = self.profile(profile_id)
+            weekday = day.weekday()
+            index = bisect.bisect_right(profile.seconds[weekday], second)
+            for schedule in profile.schedules[weekday][index:]:
+                at = midnight + timedelta(seconds=schedule['second'])
+                if at > end:
+                    return
+                if not self._is_skipped_in_profile(ordinal, profile_id, schedule['id']):
+                    yield at, schedule
+            day += timedelta(days=1)
+            second = -1
+
+    def occurrences(self, start, end=None):
+        """
+        Generator bel setelah start sampai end (inklusif, None = maksimal
+        MAX_LOOKAHEAD_DAYS hari) lintas hari dan profil: jadwal yang tidak
+        libur digabung dengan bel tambahan
+        Yields:
+            tuple (datetime, schedule)
+        """
+        return heapq.merge(self._weekly(start, end), self.extra_bells(start, end),
+                           key=lambda occurrence: occurrence[0])
+
+    def upcoming(self, now, count=1, max_days=366):
+        """
+        N bel berikutnya setelah now, lintas hari dan minggu,
+        melewati tanggal yang dikecualikan
+        Returns:
+            list: tuple (datetime, schedule)
+        """
+        limit = now + timedelta(days=max_days)
+        return list(itertools.islice(self.occurrences(now, limit), count))
+
+    def next_after(self, now):
+        """Bel berikutnya setelah now (lintas hari) sebagai (datetime, schedule) atau None"""
+        upcoming = self.upcoming(now, 1)
+        return upcoming[0] if upcoming else None
+
+    def next_slot(self, now, max_days=366):
+        """
+        Semua bel pada waktu berikutnya setelah now (beberapa jadwal dan
+        bel tambahan bisa berbunyi di detik yang sama)
+        Returns:
+            tuple: (datetime, list schedule) atau None
+        """
+        slot_at, slot = None, []
+        for at, schedule in self.occurrences(now, now + timedelta(days=max_days)):
+            if slot_at is not None and at != slot_at:
+                break
+            slot_at = at
+            slot.append(schedule)
+        return (slot_at, slot) if slot else None
+
+
+_timeline = None
+_timeline_lock = threading.Lock()
+
+
+def get_timeline():
+    """
+    Timeline saat ini; dikompilasi ulang hanya jika jadwal di database
+    berubah sejak kompilasi terakhir
+    """
+    global _timeline
+    version = database.get_schedules_version()
+    default_profile = database.get_active_profile_id()
+    timeline = _timeline
+    if timeline is not None and timeline.version == version and \
+            timeline.default_profile == default_profile:
+        return timeline
+
+    with _timeline_lock:
+        if _timeline is None or _timeline.version != version or \
+                _timeline.default_profile != default_profile:
+            schedules = database.get_all_schedules()
+            # Entri kalender yang sudah lama lewat tidak perlu masuk index
+            since = (clock.now().date() - timedelta(days=30)).isoformat()
+            exceptions = database.get_schedule_exceptions(since)
+            _timeline = ScheduleTimeline(schedules, exceptions, version, default_profile)
+        return _timeline
+
+
+def invalidate():
+    """Paksa kompilasi ulang pada pemanggilan get_timeline() berikutnya"""
+    global _timeline
+    with _timeline_lock:
+        _timeline = None
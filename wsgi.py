@@ -0,0 +1,12 @@
+"""
+WSGI entry point untuk gunicorn
+    gunicorn -w 4 -k eventlet -b 0.0.0.0:5000 wsgi:app
+
+Setiap worker menjalankan start_services(); hanya worker yang menjadi
+leader yang menjalankan scheduler dan memutar audio. Jangan gunakan
+--preload: thread election dan scheduler tidak ikut ter-fork ke worker
+"""
+
+from app import app, start_services
+
+start_services()